@@ -1,12 +1,23 @@
 # agents/annotator_agent/main.py
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Response, UploadFile
+import asyncio
+import os
+import sys
+import time
+import uuid
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 import uvicorn
 import cv2
 import numpy as np
 import base64
-from typing import List
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+# The agents share agents/common; each one is started from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.observability import STAGE_LATENCY, concurrency_limiter, install_health, install_metrics
 
 # --- Pydantic Models for Input/Output Data Structures ---
 
@@ -33,6 +44,32 @@ class AnnotateResponse(BaseModel):
     annotated_image_base64: str
     agent_name: str = "AnnotatorAgent/v1.0-OpenCV"
 
+class AnnotateBatchItem(BaseModel):
+    """One image of a batch; `id` is echoed back so callers can match results."""
+    id: Optional[str] = None
+    image_base64: str
+    boxes: List[BoundingBox]
+
+class AnnotateBatchRequest(BaseModel):
+    items: List[AnnotateBatchItem]
+    # Overrides ANNOTATOR_JPEG_QUALITY for this batch, e.g. lower for report thumbnails.
+    jpeg_quality: Optional[int] = Field(None, ge=1, le=100)
+
+class AnnotateBatchResult(BaseModel):
+    """Either the annotated image or the error for that one item; one bad image does not fail the batch."""
+    id: Optional[str] = None
+    annotated_image_base64: Optional[str] = None
+    error: Optional[str] = None
+
+class AnnotateBatchResponse(BaseModel):
+    results: List[AnnotateBatchResult]
+    agent_name: str = "AnnotatorAgent/v1.0-OpenCV"
+
+# Validates the JSON `boxes` form field of /annotate_raw.
+BOX_LIST_ADAPTER = TypeAdapter(List[BoundingBox])
+# Validates the JSON `boxes` form field of /annotate_batch_raw: one box list per image.
+BOX_LISTS_ADAPTER = TypeAdapter(List[List[BoundingBox]])
+
 # --- FastAPI Application Setup ---
 
 app = FastAPI(
@@ -40,88 +77,267 @@ app = FastAPI(
     description="A specialized agent that draws bounding boxes and labels on an image.",
 )
 
+AGENT_NAME = "annotator"
+
+install_metrics(app, AGENT_NAME)
+
+concurrency_slot = concurrency_limiter(AGENT_NAME, default=16)
+install_health(app, AGENT_NAME)
+
+# --- CPU Pool ---
+# Decoding, drawing and encoding are CPU-bound. They run on this pool instead of
+# the event loop; OpenCV releases the GIL, so the threads work in parallel.
+
+ANNOTATOR_WORKERS = int(os.environ.get("ANNOTATOR_WORKERS", str(os.cpu_count() or 4)))
+cpu_pool = ThreadPoolExecutor(max_workers=ANNOTATOR_WORKERS, thread_name_prefix="annotator-cpu")
+
+async def run_cpu(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool, func, *args)
+
+# Output quality of the annotated JPEGs (OpenCV's default is 95).
+JPEG_QUALITY = int(os.environ.get("ANNOTATOR_JPEG_QUALITY", "95"))
+# Largest number of images accepted by one /annotate_batch call.
+MAX_BATCH_ITEMS = int(os.environ.get("ANNOTATOR_MAX_BATCH", "64"))
+
 # --- Image Conversion Helper Functions ---
 
+def bytes_to_image(img_bytes: bytes) -> np.ndarray:
+    """Decodes encoded image bytes into an OpenCV compatible numpy array without copying them first."""
+    np_arr = np.frombuffer(img_bytes, np.uint8)
+    return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
 def base64_to_image(b64_string: str) -> np.ndarray:
     """Decodes a base64 data URL string into an OpenCV compatible numpy array."""
     if "," in b64_string:
         b64_string = b64_string.split(',')[1]
-    img_bytes = base64.b64decode(b64_string)
-    np_arr = np.frombuffer(img_bytes, np.uint8)
-    image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    return image
+    return bytes_to_image(base64.b64decode(b64_string))
 
-def image_to_base64(image: np.ndarray) -> str:
-    """Encodes an OpenCV image (numpy array) into a base64 data URL string."""
-    # Encode the image as a JPEG in memory
-    _, buffer = cv2.imencode('.jpg', image)
-    # Convert the buffer to a base64 string
-    b64_string = base64.b64encode(buffer).decode('utf-8')
+def image_to_jpeg(image: np.ndarray, quality: Optional[int] = None) -> bytes:
+    """Encodes an OpenCV image (numpy array) as JPEG bytes."""
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality or JPEG_QUALITY])
+    return buffer.tobytes()
+
+def jpeg_to_base64(jpeg_bytes: bytes) -> str:
+    """Wraps JPEG bytes in a base64 data URL string."""
+    b64_string = base64.b64encode(jpeg_bytes).decode('utf-8')
     # Prepend the data URL header
     return f"data:image/jpeg;base64,{b64_string}"
 
-# --- Main Annotation Endpoint ---
+def image_to_base64(image: np.ndarray, quality: Optional[int] = None) -> str:
+    """Encodes an OpenCV image (numpy array) into a base64 data URL string."""
+    return jpeg_to_base64(image_to_jpeg(image, quality))
+
+# --- Drawing ---
+
+BOX_COLOR = (0, 255, 0) # Green
+BOX_THICKNESS = 2
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_FONT_SCALE = 0.6
+LABEL_FONT_THICKNESS = 1
+LABEL_TEXT_COLOR = (0, 0, 0) # Black text
+
+@functools.lru_cache(maxsize=int(os.environ.get("ANNOTATOR_LABEL_CACHE_SIZE", "2048")))
+def render_label(label_text: str):
+    """
+    Pre-renders a label (text on a filled background) once per distinct text and
+    style; later boxes with the same label just copy the pixels. Returns the
+    read-only sprite and the text baseline. Thread-safe: lru_cache is, and the
+    sprites are never written to.
+    """
+    # Get the size of the text to size the background box
+    (text_width, text_height), baseline = cv2.getTextSize(label_text, LABEL_FONT, LABEL_FONT_SCALE, LABEL_FONT_THICKNESS)
+    # Background spans the text plus padding (6px above the text line, 4px below).
+    sprite = np.empty((text_height + 11, text_width + 5, 3), np.uint8)
+    sprite[:] = BOX_COLOR
+    cv2.putText(sprite, label_text, (2, text_height + 6), LABEL_FONT, LABEL_FONT_SCALE, LABEL_TEXT_COLOR, LABEL_FONT_THICKNESS)
+    sprite.setflags(write=False)
+    return sprite, baseline
+
+def paste(image: np.ndarray, sprite: np.ndarray, x: int, y: int):
+    """Copies `sprite` onto `image` with its top-left corner at (x, y), clipped to the image."""
+    height, width = sprite.shape[:2]
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + width, image.shape[1]), min(y + height, image.shape[0])
+    if left < right and top < bottom:
+        image[top:bottom, left:right] = sprite[top - y:bottom - y, left - x:right - x]
+
+def draw_boxes(image: np.ndarray, boxes: List[BoundingBox]) -> np.ndarray:
+    """Draws each bounding box and its label onto `image` in place and returns it."""
+    print(f"ANNOTATOR AGENT: Drawing {len(boxes)} boxes on the image...")
+    draw_started = time.perf_counter()
+    for b_box in boxes:
+        # Bounding box coordinates
+        x1, y1, x2, y2 = b_box.box
+
+        # Draw the rectangle on the image
+        cv2.rectangle(image, (x1, y1), (x2, y2), BOX_COLOR, BOX_THICKNESS)
+
+        # --- Draw the label with a filled background just above the box ---
+        sprite, baseline = render_label(f"{b_box.label}: {b_box.confidence:.2f}")
+        paste(image, sprite, x1, y1 - baseline - (sprite.shape[0] - 5))
+
+    STAGE_LATENCY.labels(agent=AGENT_NAME, stage="draw").observe(time.perf_counter() - draw_started)
+    return image
+
+def annotate_encoded(data, boxes: List[BoundingBox], quality: Optional[int], decode=bytes_to_image) -> Optional[bytes]:
+    """
+    Decodes, draws and re-encodes one batch image; runs on the CPU pool.
+    Returns the annotated JPEG bytes, or None if `data` is not a valid image.
+    """
+    with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="decode").time():
+        image = decode(data)
+    if image is None:
+        return None
+    draw_boxes(image, boxes)
+    with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="encode").time():
+        return image_to_jpeg(image, quality)
+
+def annotate_item(item: AnnotateBatchItem, quality: Optional[int]) -> AnnotateBatchResult:
+    try:
+        jpeg_bytes = annotate_encoded(item.image_base64, item.boxes, quality, decode=base64_to_image)
+    except Exception as e:
+        return AnnotateBatchResult(id=item.id, error=f"Failed to annotate image: {e}")
+    if jpeg_bytes is None:
+        return AnnotateBatchResult(id=item.id, error="Invalid image data.")
+    return AnnotateBatchResult(id=item.id, annotated_image_base64=jpeg_to_base64(jpeg_bytes))
+
+def annotate_raw_item(data: bytes, boxes: List[BoundingBox], quality: Optional[int]):
+    """Like annotate_item, for /annotate_batch_raw: returns (content type, JPEG bytes or error text)."""
+    try:
+        jpeg_bytes = annotate_encoded(data, boxes, quality)
+    except Exception as e:
+        return "text/plain", f"Failed to annotate image: {e}".encode()
+    if jpeg_bytes is None:
+        return "text/plain", b"Invalid image data."
+    return "image/jpeg", jpeg_bytes
+
+def multipart_mixed(parts) -> Response:
+    """A multipart/mixed response of (content type, bytes) parts; each part's Content-ID is its index."""
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for index, (content_type, content) in enumerate(parts):
+        body += (
+            f"--{boundary}\r\nContent-Type: {content_type}\r\nContent-ID: {index}\r\n"
+            f"Content-Length: {len(content)}\r\n\r\n"
+        ).encode()
+        body += content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return Response(content=bytes(body), media_type=f"multipart/mixed; boundary={boundary}")
+
+# --- Main Annotation Endpoints ---
 
 @app.post("/annotate", response_model=AnnotateResponse)
-async def draw_boxes_on_image(request: AnnotateRequest):
+async def draw_boxes_on_image(request: AnnotateRequest, _slot: None = Depends(concurrency_slot)):
     """
     This endpoint receives a base64 image and a list of bounding boxes,
     draws them on the image, and returns the annotated image as a base64 string.
+    Kept for compatibility; the supervisor uses /annotate_raw.
     """
     try:
         # Step 1: Decode the incoming image string into a usable format.
         print("ANNOTATOR AGENT: Decoding image from base64...")
-        image = base64_to_image(request.image_base64)
+        with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="decode").time():
+            image = await run_cpu(base64_to_image, request.image_base64)
         if image is None:
             raise HTTPException(status_code=400, detail="Invalid image data.")
 
-        # Step 2: Iterate through the bounding boxes and draw them.
-        print(f"ANNOTATOR AGENT: Drawing {len(request.boxes)} boxes on the image...")
-        for b_box in request.boxes:
-            # Bounding box coordinates
-            x1, y1, x2, y2 = b_box.box
-            label = b_box.label
-            confidence = b_box.confidence
-            
-            # Define color and thickness for the box
-            box_color = (0, 255, 0) # Green
-            box_thickness = 2
-            
-            # Draw the rectangle on the image
-            cv2.rectangle(image, (x1, y1), (x2, y2), box_color, box_thickness)
-            
-            # --- Draw the label with a filled background for readability ---
-            label_text = f"{label}: {confidence:.2f}"
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.6
-            font_thickness = 1
-            
-            # Get the size of the text to create a background box
-            (text_width, text_height), baseline = cv2.getTextSize(label_text, font, font_scale, font_thickness)
-            
-            # Position the background rectangle just above the bounding box
-            label_bg_y2 = y1 - baseline
-            label_bg_y1 = label_bg_y2 - text_height - 6 # Add some padding
-            
-            # Draw the filled rectangle for the label background
-            cv2.rectangle(image, (x1, label_bg_y1), (x1 + text_width + 4, label_bg_y2 + 4), box_color, -1) # -1 thickness for filled
-            
-            # Draw the text on top of the background
-            cv2.putText(image, label_text, (x1 + 2, label_bg_y2), font, font_scale, (0, 0, 0), font_thickness) # Black text
+        # Step 2: Draw the bounding boxes.
+        await run_cpu(draw_boxes, image, request.boxes)
 
         # Step 3: Encode the modified image back to base64.
         print("ANNOTATOR AGENT: Encoding annotated image to base64...")
-        annotated_image_b64 = image_to_base64(image)
+        with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="encode").time():
+            annotated_image_b64 = await run_cpu(image_to_base64, image)
 
         # Step 4: Return the structured response.
         return AnnotateResponse(annotated_image_base64=annotated_image_b64)
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_message = f"Failed to annotate image: {str(e)}"
+        print(f"ANNOTATOR AGENT: An unexpected error occurred: {error_message}")
+        raise HTTPException(status_code=500, detail=error_message)
+
+@app.post("/annotate_raw", response_class=Response)
+async def draw_boxes_on_image_raw(
+    image: UploadFile = File(...), boxes: str = Form(...), _slot: None = Depends(concurrency_slot)
+):
+    """
+    Multipart twin of /annotate: an `image` file part holding the encoded image
+    and a `boxes` part holding the JSON list of boxes. Responds with the
+    annotated JPEG bytes (image/jpeg) instead of a base64 data URL.
+    """
+    try:
+        parsed_boxes = BOX_LIST_ADAPTER.validate_json(boxes)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid boxes: {e}")
+
+    try:
+        with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="decode").time():
+            decoded = await run_cpu(bytes_to_image, await image.read())
+        if decoded is None:
+            raise HTTPException(status_code=400, detail="Invalid image data.")
+
+        await run_cpu(draw_boxes, decoded, parsed_boxes)
+
+        with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="encode").time():
+            jpeg_bytes = await run_cpu(image_to_jpeg, decoded)
+
+        return Response(content=jpeg_bytes, media_type="image/jpeg")
+
+    except HTTPException:
+        raise
     except Exception as e:
         error_message = f"Failed to annotate image: {str(e)}"
         print(f"ANNOTATOR AGENT: An unexpected error occurred: {error_message}")
         raise HTTPException(status_code=500, detail=error_message)
 
+@app.post("/annotate_batch", response_model=AnnotateBatchResponse)
+async def draw_boxes_on_images(request: AnnotateBatchRequest, _slot: None = Depends(concurrency_slot)):
+    """
+    Annotates many images in one call, e.g. every annotated view of a long
+    session for its report. Items are spread over the CPU pool and results come
+    back in request order; a failing item gets an `error` instead of an image.
+    The supervisor uses /annotate_batch_raw.
+    """
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} images per batch.")
+
+    print(f"ANNOTATOR AGENT: Annotating a batch of {len(request.items)} images...")
+    results = await asyncio.gather(*(run_cpu(annotate_item, item, request.jpeg_quality) for item in request.items))
+    return AnnotateBatchResponse(results=list(results))
+
+@app.post("/annotate_batch_raw", response_class=Response)
+async def draw_boxes_on_images_raw(
+    images: List[UploadFile] = File(...),
+    boxes: str = Form(...),
+    jpeg_quality: Optional[int] = Form(None, ge=1, le=100),
+    _slot: None = Depends(concurrency_slot),
+):
+    """
+    Multipart twin of /annotate_batch: one `images` file part per image and a
+    `boxes` part holding a JSON list with the box list of each image, in the
+    same order. Responds with multipart/mixed, one part per image in request
+    order (Content-ID is its index): the annotated JPEG (image/jpeg), or the
+    error for that one image (text/plain).
+    """
+    if len(images) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} images per batch.")
+    try:
+        box_lists = BOX_LISTS_ADAPTER.validate_json(boxes)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid boxes: {e}")
+    if len(box_lists) != len(images):
+        raise HTTPException(status_code=422, detail=f"Got {len(images)} images but {len(box_lists)} box lists.")
+
+    print(f"ANNOTATOR AGENT: Annotating a batch of {len(images)} raw images...")
+    contents = [await image.read() for image in images]
+    parts = await asyncio.gather(*(
+        run_cpu(annotate_raw_item, data, image_boxes, jpeg_quality) for data, image_boxes in zip(contents, box_lists)
+    ))
+    return multipart_mixed(parts)
 
 # This block allows running the agent directly for testing purposes.
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8005)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8005)
@@ -1,10 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Response
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from prometheus_client import Counter
 from pydantic import BaseModel
 import os
-from groq import Groq
+import sys
+from groq import AsyncGroq
 from dotenv import load_dotenv
 import json # <-- Add this import
 from fastapi.responses import JSONResponse
+
+# The agents share agents/common; each one is started from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.observability import STAGE_LATENCY, concurrency_limiter, install_health, install_metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -20,7 +31,13 @@ class CommandRequest(BaseModel):
 
 # --- Groq Client Initialization ---
 try:
-    groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+    # Async client: waiting on Groq must not block the event loop.
+    # GROQ_BASE_URL points it at the shared LLM gateway (agents/llm_gateway) when set.
+    groq_client = AsyncGroq(
+        api_key=os.environ.get("GROQ_API_KEY"),
+        base_url=os.environ.get("GROQ_BASE_URL") or None,
+        default_headers={"X-Aura-Priority": "interactive"},
+    )
 except Exception as e:
     print(f"Error initializing Groq client: {e}")
     groq_client = None
@@ -31,6 +48,13 @@ app = FastAPI(
     description="The central 'thinking' agent that parses user intent using Groq/Llama.",
 )
 
+AGENT_NAME = "command"
+
+install_metrics(app, AGENT_NAME)
+
+concurrency_slot = concurrency_limiter(AGENT_NAME, default=16)
+install_health(app, AGENT_NAME)
+
 # agents/command_agent/main.py
 
 SYSTEM_PROMPT = """
@@ -67,11 +91,109 @@ Your JSON response:
 {"action": "FETCH_PROCEDURE", "parameters": {"component_name": "GPU"}}
 """
 
+MODEL_NAME = "llama3-8b-8192"
+TEMPERATURE = 0.1
+# Changes whenever the prompt or the model settings do, so cached intents
+# never outlive the instructions that produced them.
+PROMPT_VERSION = hashlib.sha256(f"{SYSTEM_PROMPT}\0{MODEL_NAME}\0{TEMPERATURE}".encode()).hexdigest()[:12]
+
+# --- Response Cache ---
+# Retries, double-clicks and load tests send the same history and input again;
+# those are answered from an LRU of parsed intents (COMMAND_CACHE_SIZE entries,
+# each valid for COMMAND_CACHE_TTL seconds) instead of another Groq call.
+# Identical requests that arrive while the first is still waiting on Groq share
+# its answer.
+
+CACHE_LOOKUPS = Counter(
+    "aura_agent_response_cache_lookups_total", "Response cache lookups by result.", ["agent", "result"],
+)
+TOKENS_SAVED = Counter(
+    "aura_agent_llm_tokens_saved_total", "LLM tokens not spent because a cached response was served.", ["agent"],
+)
+
+def normalize_text(text: str | None) -> str:
+    return " ".join((text or "").split())
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, response, total_tokens)
+        self._entries = OrderedDict()
+        self._in_flight = {}
+
+    @staticmethod
+    def key_for(request: CommandRequest) -> str:
+        payload = json.dumps([
+            PROMPT_VERSION,
+            [[normalize_text(h.user_text_input), normalize_text(h.aura_text_response)] for h in request.history],
+            normalize_text(request.new_text),
+            request.has_image,
+        ])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, response: dict, total_tokens: int):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, response, total_tokens)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute):
+        """Returns the cached response for `key`, or awaits `compute()` -> (response, total_tokens) once."""
+        entry = self.get(key)
+        if entry is not None:
+            CACHE_LOOKUPS.labels(agent=AGENT_NAME, result="hit").inc()
+            TOKENS_SAVED.labels(agent=AGENT_NAME).inc(entry[2])
+            return entry[1]
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            CACHE_LOOKUPS.labels(agent=AGENT_NAME, result="coalesced").inc()
+            response, total_tokens = await asyncio.shield(pending)
+            TOKENS_SAVED.labels(agent=AGENT_NAME).inc(total_tokens)
+            return response
+
+        CACHE_LOOKUPS.labels(agent=AGENT_NAME, result="miss").inc()
+        pending = asyncio.ensure_future(compute())
+        self._in_flight[key] = pending
+        try:
+            response, total_tokens = await asyncio.shield(pending)
+            self.put(key, response, total_tokens)
+            return response
+        finally:
+            self._in_flight.pop(key, None)
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("COMMAND_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("COMMAND_CACHE_TTL", "300")),
+)
+
 @app.post("/parse_command")
-async def parse_command(request: CommandRequest):
+async def parse_command(request: CommandRequest, _slot: None = Depends(concurrency_slot)):
     if not groq_client:
         raise HTTPException(status_code=500, detail="Groq client not initialized. Check API key.")
 
+    try:
+        response_data = await response_cache.get_or_compute(
+            response_cache.key_for(request), lambda: call_groq(request)
+        )
+        return JSONResponse(content=response_data)
+    except Exception as e:
+        print(f"COMMAND AGENT: Error calling Groq API: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def call_groq(request: CommandRequest):
+    """Asks Groq for the next action; returns the parsed JSON and the tokens it cost."""
     # Format the history for the prompt
     formatted_history = "\n".join([
         f"- User: {h.user_text_input}" for h in request.history if h.user_text_input
@@ -81,21 +203,18 @@ async def parse_command(request: CommandRequest):
 
     prompt = f"Conversation History:\n{formatted_history}\n\nUser's latest input: '{request.new_text}'"
 
-    try:
-        print("COMMAND AGENT: Sending request to Groq...")
-        chat_completion = groq_client.chat.completions.create(
+    print("COMMAND AGENT: Sending request to Groq...")
+    with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="llm").time():
+        chat_completion = await groq_client.chat.completions.create(
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
-            model="llama3-8b-8192",
-            temperature=0.1,
+            model=MODEL_NAME,
+            temperature=TEMPERATURE,
             response_format={"type": "json_object"},
         )
-        response_content_str = chat_completion.choices[0].message.content
-        print(f"COMMAND AGENT: Received from Groq: {response_content_str}")
-        response_data = json.loads(response_content_str)
-        return JSONResponse(content=response_data)
-    except Exception as e:
-        print(f"COMMAND AGENT: Error calling Groq API: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    response_content_str = chat_completion.choices[0].message.content
+    print(f"COMMAND AGENT: Received from Groq: {response_content_str}")
+    usage = getattr(chat_completion, "usage", None)
+    return json.loads(response_content_str), (usage.total_tokens if usage else 0) or 0
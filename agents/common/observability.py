@@ -0,0 +1,80 @@
+# agents/common/observability.py
+#
+# Metrics, concurrency limiting and /health shared by every agent. An agent
+# started from its own directory imports this module after putting agents/ on
+# sys.path.
+
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
+
+# --- Metrics ---
+# Prometheus histograms scraped from /metrics; p50/p95/p99 come from histogram_quantile().
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+REQUEST_LATENCY = Histogram(
+    "aura_agent_request_latency_seconds", "Latency of the agent's HTTP endpoints.",
+    ["agent", "endpoint", "status"], buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "aura_agent_stage_latency_seconds", "Latency of the processing stages inside a request.",
+    ["agent", "stage"], buckets=LATENCY_BUCKETS,
+)
+
+def install_metrics(app: FastAPI, agent_name: str):
+    """Times every request of `app` into REQUEST_LATENCY and serves /metrics."""
+
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        # Label by endpoint function, not raw path, to keep the label set bounded.
+        endpoint = request.scope.get("endpoint")
+        REQUEST_LATENCY.labels(
+            agent=agent_name, endpoint=endpoint.__name__ if endpoint else "unmatched", status=response.status_code
+        ).observe(time.perf_counter() - start)
+        return response
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def install_health(app: FastAPI, agent_name: str, **details):
+    """Serves /health, reporting the agent's name and any extra `details`."""
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "agent": agent_name, **details}
+
+# --- Concurrency ---
+# At most AGENT_MAX_CONCURRENCY requests are processed at once; the rest wait
+# for a slot. Blocking work runs off the event loop, so /health and /metrics
+# answer immediately even while every slot is busy.
+
+QUEUE_DEPTH = Gauge("aura_agent_queue_depth", "Requests waiting for a concurrency slot.", ["agent"])
+IN_FLIGHT = Gauge("aura_agent_requests_in_flight", "Requests currently being processed.", ["agent"])
+
+def concurrency_limiter(agent_name: str, default: int):
+    """
+    Returns a FastAPI dependency holding one of the agent's concurrency slots
+    for the request; AGENT_MAX_CONCURRENCY overrides the `default` slot count.
+    """
+    semaphore = asyncio.Semaphore(int(os.environ.get("AGENT_MAX_CONCURRENCY", str(default))))
+
+    async def concurrency_slot():
+        QUEUE_DEPTH.labels(agent=agent_name).inc()
+        try:
+            await semaphore.acquire()
+        finally:
+            QUEUE_DEPTH.labels(agent=agent_name).dec()
+        IN_FLIGHT.labels(agent=agent_name).inc()
+        try:
+            yield
+        finally:
+            IN_FLIGHT.labels(agent=agent_name).dec()
+            semaphore.release()
+
+    return concurrency_slot
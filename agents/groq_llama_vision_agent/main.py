@@ -1,12 +1,20 @@
 # agents/identifier_agent/main.py
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+import asyncio
+import time
 from pydantic import BaseModel, Field
-from groq import Groq
+from groq import AsyncGroq
 import uvicorn
 import os
+import sys
+import base64
 from dotenv import load_dotenv
 
+# The agents share agents/common; each one is started from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.observability import STAGE_LATENCY, concurrency_limiter, install_health, install_metrics
+
 # Load environment variables from .env file
 load_dotenv()
 # --- Pydantic Models for the New VLM-based Agent ---
@@ -34,7 +42,13 @@ class LlamaVisionResponse(BaseModel):
 # and run the agent with a loader like `uvicorn main:app --env-file .env`
 try:
     print("IDENTIFIER AGENT: Initializing Groq client...")
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+    # Async client: waiting on Groq must not block the event loop.
+    # GROQ_BASE_URL points it at the shared LLM gateway (agents/llm_gateway) when set.
+    client = AsyncGroq(
+        api_key=os.environ.get("GROQ_API_KEY"),
+        base_url=os.environ.get("GROQ_BASE_URL") or None,
+        default_headers={"X-Aura-Priority": "interactive"},
+    )
     # This is the hypothetical model name you provided.
     MODEL_NAME = "llama-4-scout-17b-16e-instruct" 
     print(f"IDENTIFIER AGENT: Groq client initialized for model {MODEL_NAME}.")
@@ -61,24 +75,19 @@ app = FastAPI(
     description="A specialized agent to 'see' and describe components from visual data using a Vision Language Model.",
 )
 
-@app.post("/identify", response_model=LlamaVisionResponse)
-async def identify_image_content(request: IdentifyRequest):
-    """
-    This endpoint receives a base64 encoded image, sends it to the Groq Llama
-    vision model, and returns a rich textual description.
-    """
-    if not client:
-        raise HTTPException(status_code=500, detail="Groq client is not available.")
+AGENT_NAME = "groq_llama_vision"
 
-    print("IDENTIFIER AGENT: Received request. Preparing to call Groq VLM...")
-    
-    try:
-        # The Groq API expects the image data URL directly.
-        image_data_url = request.image_base64
+install_metrics(app, AGENT_NAME)
+
+concurrency_slot = concurrency_limiter(AGENT_NAME, default=16)
+install_health(app, AGENT_NAME)
 
-        # Step 1: Call the Groq chat completions API with the image and prompt.
-        # We use stream=False to get the complete response in a single API call.
-        completion = client.chat.completions.create(
+async def describe_image(image_data_url: str) -> str:
+    """Sends an image data URL to the Groq Llama vision model and returns its description."""
+    # Call the Groq chat completions API with the image and prompt.
+    # We use stream=False to get the complete response in a single API call.
+    with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="llm").time():
+        completion = await client.chat.completions.create(
             model=MODEL_NAME,
             messages=[
                 {
@@ -107,11 +116,25 @@ async def identify_image_content(request: IdentifyRequest):
             stream=False # Important for a standard API request/response
         )
 
-        # Step 2: Extract the text description from the response.
-        description = completion.choices[0].message.content
+    return completion.choices[0].message.content
+
+@app.post("/identify", response_model=LlamaVisionResponse)
+async def identify_image_content(request: IdentifyRequest, _slot: None = Depends(concurrency_slot)):
+    """
+    This endpoint receives a base64 encoded image, sends it to the Groq Llama
+    vision model, and returns a rich textual description.
+    Kept for compatibility; the supervisor uses /identify_raw.
+    """
+    if not client:
+        raise HTTPException(status_code=500, detail="Groq client is not available.")
+
+    print("IDENTIFIER AGENT: Received request. Preparing to call Groq VLM...")
+    
+    try:
+        # The Groq API expects the image data URL directly.
+        description = await describe_image(request.image_base64)
         print(f"IDENTIFIER AGENT: Successfully received description from Groq.")
 
-        # Step 3: Return the structured response.
         return LlamaVisionResponse(description=description)
 
     except Exception as e:
@@ -120,8 +143,39 @@ async def identify_image_content(request: IdentifyRequest):
         print(f"IDENTIFIER AGENT: An error occurred: {error_message}")
         raise HTTPException(status_code=500, detail=error_message)
 
+@app.post("/identify_raw", response_model=LlamaVisionResponse)
+async def identify_image_content_raw(request: Request, _slot: None = Depends(concurrency_slot)):
+    """
+    Same as /identify, but the request body is the encoded image itself, with
+    its MIME type in Content-Type. The image is base64-encoded exactly once,
+    here, because the Groq API only accepts data URLs.
+    """
+    if not client:
+        raise HTTPException(status_code=500, detail="Groq client is not available.")
+
+    img_bytes = await request.body()
+    if not img_bytes:
+        raise HTTPException(status_code=400, detail="Empty request body; expected image bytes.")
+
+    mime_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if not mime_type.startswith("image/"):
+        mime_type = "image/jpeg"
+
+    try:
+        encoded = await asyncio.to_thread(base64.b64encode, img_bytes)
+        image_data_url = f"data:{mime_type};base64,{encoded.decode('ascii')}"
+        description = await describe_image(image_data_url)
+        print(f"IDENTIFIER AGENT: Successfully received description from Groq.")
+
+        return LlamaVisionResponse(description=description)
+
+    except Exception as e:
+        error_message = f"Failed to get description from Groq VLM: {str(e)}"
+        print(f"IDENTIFIER AGENT: An error occurred: {error_message}")
+        raise HTTPException(status_code=500, detail=error_message)
+
 # This block allows running the agent directly for testing purposes.
 if __name__ == "__main__":
     print("Starting Uvicorn server for Llama Vision Identifier Agent...")
     print("Ensure your GROQ_API_KEY is available as an environment variable.")
-    uvicorn.run(app, host="0.0.0.0", port=8006)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8006)
@@ -0,0 +1,231 @@
+# agents/groq_stub/main.py
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import re
+import time
+import uuid
+from prometheus_client import Counter
+import httpx
+import uvicorn
+from dotenv import load_dotenv
+
+# The agents share agents/common; each one is started from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.observability import install_health, install_metrics
+
+# Load environment variables from .env file
+load_dotenv()
+
+# --- Configuration ---
+# A local stand-in for Groq's OpenAI-compatible API, for load tests that must
+# not spend quota. Point a component at it with GROQ_BASE_URL=http://<host>:8008
+# (the supervisor and the command and vision agents), or point the LLM
+# gateway's GATEWAY_UPSTREAM_URL at it to keep the gateway in the path.
+#
+# GROQ_STUB_MODE:
+#   record     forwards every request to GROQ_STUB_UPSTREAM_URL and saves the
+#              answer in GROQ_STUB_CASSETTE_DIR, one JSON file per request
+#   replay     answers from the saved files; unknown requests get a 404, or a
+#              synthetic answer when GROQ_STUB_ON_MISS=synthetic
+#   synthetic  answers every request with generated filler text
+#
+# Replayed and synthetic answers wait GROQ_STUB_LATENCY_MS before the first
+# token ("recorded" reuses the latency measured while recording) and then
+# produce GROQ_STUB_TOKENS_PER_SECOND completion tokens per second (0 means
+# all at once), streamed or not as the client asked.
+
+MODE = os.environ.get("GROQ_STUB_MODE", "replay").lower()
+UPSTREAM_URL = os.environ.get("GROQ_STUB_UPSTREAM_URL", "https://api.groq.com").rstrip("/")
+# Used in record mode when a client does not send its own Authorization header.
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+CASSETTE_DIR = os.environ.get("GROQ_STUB_CASSETTE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes"))
+ON_MISS = os.environ.get("GROQ_STUB_ON_MISS", "error").lower()
+LATENCY_MS = os.environ.get("GROQ_STUB_LATENCY_MS", "200")
+TOKENS_PER_SECOND = float(os.environ.get("GROQ_STUB_TOKENS_PER_SECOND", "500"))
+# Length of a synthetic answer, in words standing in for tokens.
+SYNTHETIC_TOKENS = int(os.environ.get("GROQ_STUB_SYNTHETIC_TOKENS", "48"))
+
+if MODE not in ("record", "replay", "synthetic"):
+    raise RuntimeError(f"GROQ_STUB_MODE must be record, replay or synthetic, not {MODE!r}.")
+
+app = FastAPI(
+    title="AURA Groq Stub",
+    description="Record/replay stand-in for the Groq API, for offline load testing.",
+)
+
+AGENT_NAME = "groq_stub"
+
+# --- Metrics ---
+# The agent's own metrics; request latency and /metrics come from common.observability.
+
+STUB_RESPONSES = Counter(
+    "aura_groq_stub_responses_total", "Chat completions answered by the stub, by where the answer came from.",
+    ["source"],
+)
+
+install_metrics(app, AGENT_NAME)
+
+install_health(app, AGENT_NAME, mode=MODE)
+
+
+# --- Cassettes ---
+# A recording is keyed by the request minus the fields that only change how
+# the answer is delivered, so a streamed and a plain call share one file.
+
+DELIVERY_FIELDS = {"stream", "stream_options", "user"}
+
+def request_key(payload: dict) -> str:
+    canonical = {name: value for name, value in payload.items() if name not in DELIVERY_FIELDS}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def cassette_path(key: str) -> str:
+    return os.path.join(CASSETTE_DIR, key[:2], f"{key}.json")
+
+def load_cassette(key: str) -> dict | None:
+    try:
+        with open(cassette_path(key), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_cassette(key: str, cassette: dict):
+    path = cassette_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written aside and renamed, so a concurrent replay never reads half a file.
+    temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(cassette, f, indent=2)
+    os.replace(temporary, path)
+
+
+# --- Completions ---
+
+TOKEN_PIECE = re.compile(r"\s*\S+")
+FILLER = "This is a synthetic reply from the AURA Groq stub used for load testing".split()
+
+def synthetic_completion(payload: dict) -> dict:
+    """A well-formed completion of GROQ_STUB_SYNTHETIC_TOKENS filler words (fewer if max_tokens is lower)."""
+    count = int(payload.get("max_completion_tokens") or payload.get("max_tokens") or SYNTHETIC_TOKENS)
+    count = min(count, SYNTHETIC_TOKENS)
+    text = " ".join(FILLER[i % len(FILLER)] for i in range(count))
+    if (payload.get("response_format") or {}).get("type") == "json_object":
+        text = json.dumps({"stub": True, "text": text})
+    prompt_tokens = len(json.dumps(payload.get("messages") or [])) // 4
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": count, "total_tokens": prompt_tokens + count},
+    }
+
+def first_token_delay(cassette: dict | None) -> float:
+    if LATENCY_MS == "recorded":
+        return cassette["latency_ms"] / 1000.0 if cassette else 0.2
+    return float(LATENCY_MS) / 1000.0
+
+def completion_pieces(completion: dict) -> list:
+    """The answer split into the pieces a stream delivers, about one per token."""
+    message = completion["choices"][0]["message"]
+    return TOKEN_PIECE.findall(message.get("content") or "")
+
+def stream_chunks(completion: dict, pieces: list):
+    """The completion as OpenAI chat.completion.chunk objects (usage in x_groq, as Groq sends it)."""
+    message = completion["choices"][0]["message"]
+    base = {
+        "id": completion["id"], "object": "chat.completion.chunk",
+        "created": completion["created"], "model": completion["model"],
+    }
+    yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}
+    for piece in pieces:
+        yield {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+    if message.get("tool_calls"):
+        tool_calls = [{"index": i, **call} for i, call in enumerate(message["tool_calls"])]
+        yield {**base, "choices": [{"index": 0, "delta": {"tool_calls": tool_calls}, "finish_reason": None}]}
+    yield {
+        **base,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": completion["choices"][0].get("finish_reason", "stop")}],
+        "x_groq": {"id": completion["id"], "usage": completion.get("usage")},
+    }
+
+async def deliver(payload: dict, completion: dict, cassette: dict | None = None) -> Response:
+    """Answers with `completion`, paced by the configured latency and token rate."""
+    delay = first_token_delay(cassette)
+    pieces = completion_pieces(completion)
+    per_token = 1.0 / TOKENS_PER_SECOND if TOKENS_PER_SECOND > 0 else 0.0
+
+    if payload.get("stream"):
+        async def events():
+            await asyncio.sleep(delay)
+            for chunk in stream_chunks(completion, pieces):
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if per_token and chunk["choices"][0]["delta"].get("content"):
+                    await asyncio.sleep(per_token)
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    completion_tokens = (completion.get("usage") or {}).get("completion_tokens") or len(pieces)
+    await asyncio.sleep(delay + completion_tokens * per_token)
+    return JSONResponse(completion)
+
+async def record(payload: dict, request: Request, key: str) -> Response:
+    """Fetches the answer from the real API (never streamed) and saves it."""
+    headers = {"content-type": "application/json"}
+    headers["authorization"] = request.headers.get("authorization") or f"Bearer {GROQ_API_KEY}"
+    upstream_payload = {name: value for name, value in payload.items() if name not in ("stream", "stream_options")}
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=10.0)) as client:
+        response = await client.post(f"{UPSTREAM_URL}/openai/v1/chat/completions", json=upstream_payload, headers=headers)
+    latency_ms = round((time.perf_counter() - start) * 1000)
+    if response.status_code != 200:
+        # Errors and rate limits are passed through and not recorded.
+        return Response(response.content, status_code=response.status_code, media_type="application/json")
+
+    completion = response.json()
+    cassette = {"request": upstream_payload, "response": completion, "latency_ms": latency_ms}
+    save_cassette(key, cassette)
+    STUB_RESPONSES.labels(source="recorded").inc()
+    print(f"GROQ STUB: Recorded {key[:12]} ({latency_ms} ms).")
+    if payload.get("stream"):
+        # The client asked for a stream: replay what was just recorded, without extra delay.
+        return await deliver(payload, completion, {**cassette, "latency_ms": 0})
+    return JSONResponse(completion)
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    key = request_key(payload)
+
+    if MODE == "record":
+        return await record(payload, request, key)
+
+    cassette = load_cassette(key) if MODE == "replay" else None
+    if cassette is not None:
+        STUB_RESPONSES.labels(source="replayed").inc()
+        completion = {**cassette["response"], "created": int(time.time())}
+        return await deliver(payload, completion, cassette)
+
+    if MODE == "replay" and ON_MISS != "synthetic":
+        STUB_RESPONSES.labels(source="miss").inc()
+        print(f"GROQ STUB: No recording for {key[:12]}.")
+        return JSONResponse(
+            {"error": {"message": f"No recorded response for request {key}.", "type": "groq_stub_miss"}},
+            status_code=404,
+        )
+    STUB_RESPONSES.labels(source="synthetic").inc()
+    return await deliver(payload, synthetic_completion(payload))
+
+@app.get("/openai/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": AGENT_NAME}]}
+
+# This block allows running the agent directly for testing purposes.
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8008)
@@ -0,0 +1,153 @@
+# agents/identifier_agent/benchmark_backends.py
+
+"""
+Compares the identifier's inference backends on this host.
+
+Each backend runs in its own subprocess, so its startup time and peak RSS are
+measured in isolation, then every backend's boxes are checked against the
+PyTorch reference:
+
+    python benchmark_backends.py --images ./samples --runs 50
+    python benchmark_backends.py --backends torch onnx onnx-int8 --threads 4
+
+A detection matches when a reference box has the same label, an IoU of at
+least --iou-tol and a confidence within --conf-tol. Exits non-zero if any
+backend's boxes do not all match.
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+
+def load_images(paths):
+    files = []
+    for path in paths or []:
+        files += sorted(glob.glob(os.path.join(path, "*"))) if os.path.isdir(path) else [path]
+    images = [image for image in (cv2.imread(f) for f in files) if image is not None]
+    if not images:
+        # Without samples, time synthetic frames (parity is then only meaningful
+        # if the model finds something in them).
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(4)]
+    return images
+
+def run_worker(args):
+    """Runs one backend and prints its measurements as JSON."""
+    started = time.perf_counter()
+    from detectors import load_detector
+    backend = "onnx" if args.worker.startswith("onnx") else "torch"
+    detector = load_detector(
+        backend, args.model, args.conf, onnx_path=args.onnx_model,
+        int8=args.worker == "onnx-int8", intra_op_threads=args.threads,
+    )
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    detector.warmup(args.warmup)
+    warmup_seconds = time.perf_counter() - started
+
+    images = load_images(args.images)
+    latencies = []
+    for run in range(args.runs):
+        image = images[run % len(images)]
+        started = time.perf_counter()
+        detector.predict([image])
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    print(json.dumps({
+        "backend": args.worker,
+        "load_s": load_seconds,
+        "warmup_s": warmup_seconds,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "detections": detector.predict(images),
+    }))
+
+def iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def count_matches(reference, candidate, iou_tol, conf_tol):
+    """Greedy one-to-one matching of one image's detections; returns (matched, total)."""
+    unmatched = list(candidate)
+    matched = 0
+    for label, conf, box in reference:
+        for other in unmatched:
+            if other[0] == label and abs(other[1] - conf) <= conf_tol and iou(box, other[2]) >= iou_tol:
+                unmatched.remove(other)
+                matched += 1
+                break
+    return matched, max(len(reference), len(candidate))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--images", nargs="*", help="Image files or directories (default: synthetic frames).")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("IDENTIFIER_INTRA_OP_THREADS", "0")))
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--onnx-model", default="yolov8n.onnx")
+    parser.add_argument("--conf", type=float, default=float(os.environ.get("IDENTIFIER_CONFIDENCE", "0.25")))
+    parser.add_argument("--iou-tol", type=float, default=0.9)
+    parser.add_argument("--conf-tol", type=float, default=0.05)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker(args)
+
+    results = {}
+    for backend in args.backends:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", backend,
+                   "--runs", str(args.runs), "--warmup", str(args.warmup), "--threads", str(args.threads),
+                   "--model", args.model, "--onnx-model", args.onnx_model, "--conf", str(args.conf)]
+        if args.images:
+            command += ["--images", *args.images]
+        output = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if output.returncode != 0:
+            print(f"{backend}: failed\n{output.stderr.strip()}")
+            continue
+        results[backend] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    print(f"{'backend':<10} {'load s':>7} {'warmup s':>9} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'peak RSS MB':>12}")
+    for backend, r in results.items():
+        print(f"{backend:<10} {r['load_s']:>7.2f} {r['warmup_s']:>9.2f} {r['mean_ms']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['peak_rss_mb']:>12.0f}")
+
+    reference = results.get("torch")
+    if reference is None:
+        print("No torch results; skipping the parity check.")
+        return 0
+    ok = True
+    for backend, r in results.items():
+        if backend == "torch":
+            continue
+        matched = total = 0
+        for ref_dets, dets in zip(reference["detections"], r["detections"]):
+            m, t = count_matches(ref_dets, dets, args.iou_tol, args.conf_tol)
+            matched, total = matched + m, total + t
+        passed = matched == total
+        ok = ok and passed
+        print(f"parity {backend} vs torch: {matched}/{total} detections match -> {'PASS' if passed else 'FAIL'}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# agents/identifier_agent/detectors.py
+
+"""
+Inference backends for the Identifier Agent.
+
+Both backends take a batch of BGR images (as decoded by OpenCV) and return,
+per image, a list of (label, confidence, [x1, y1, x2, y2]) detections in that
+image's pixel coordinates:
+
+- TorchYoloDetector: the ultralytics/PyTorch model, as before.
+- OnnxYoloDetector: the same YOLOv8 network exported to ONNX (optionally
+  INT8-quantized) and run with ONNX Runtime on the CPU. It does its own
+  letterboxing and NMS, mirroring ultralytics' defaults, and never imports
+  torch, which keeps startup fast and memory low on CPU-only hosts.
+"""
+
+import ast
+import os
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+Detection = Tuple[str, float, List[float]]
+
+# ultralytics' predict() defaults, so both backends keep the same boxes.
+DEFAULT_IOU = 0.7
+MAX_DETECTIONS = 300
+# Class offset used for class-aware NMS in a single pass (as in ultralytics).
+MAX_WH = 7680
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+class TorchYoloDetector:
+    backend = "torch"
+
+    def __init__(self, model_path: str, conf: float):
+        # Imported here: pulling in torch is the slow part of starting the agent.
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.conf = conf
+        self.names = self.model.names
+
+    def predict(self, images: List[np.ndarray]) -> List[List[Detection]]:
+        results = self.model(images, conf=self.conf, verbose=False)
+        return [
+            [
+                (self.names[int(box.cls[0])], float(box.conf[0]), [float(c) for c in box.xyxy[0]])
+                for box in result.boxes
+            ]
+            for result in results
+        ]
+
+    def warmup(self, runs: int = 1, imgsz: int = 640):
+        blank = np.zeros((imgsz, imgsz, 3), np.uint8)
+        for _ in range(runs):
+            self.predict([blank])
+
+
+class OnnxYoloDetector:
+    backend = "onnx"
+
+    def __init__(self, model_path: str, conf: float, iou: float = DEFAULT_IOU, intra_op_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # 0 lets ONNX Runtime use one thread per physical core.
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.conf = conf
+        self.iou = iou
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, _ = model_input.shape
+        # Exports without dynamic axes only accept one image per run.
+        self.max_batch = batch if isinstance(batch, int) else None
+        self.imgsz = height if isinstance(height, int) else 640
+
+        # ultralytics stores the class names in the ONNX metadata as a dict literal.
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        self.names = ast.literal_eval(names) if names else {}
+
+    def _letterbox(self, image: np.ndarray):
+        """Resizes keeping the aspect ratio and pads to imgsz x imgsz; returns the gain and padding."""
+        h, w = image.shape[:2]
+        gain = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = round(w * gain), round(h * gain)
+        dw, dh = (self.imgsz - new_w) / 2, (self.imgsz - new_h) / 2
+        if (new_w, new_h) != (w, h):
+            image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = round(dh - 0.1), round(dh + 0.1)
+        left, right = round(dw - 0.1), round(dw + 0.1)
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+        return image, gain, (left, top)
+
+    def _postprocess(self, prediction: np.ndarray, gain: float, pad, shape) -> List[Detection]:
+        """Decodes one image's (4 + classes, anchors) output into detections in original coordinates."""
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences > self.conf
+        if not keep.any():
+            return []
+        prediction, class_ids, confidences = prediction[keep], class_ids[keep], confidences[keep]
+
+        # (cx, cy, w, h) -> top-left (x, y, w, h), offset per class so NMS never
+        # suppresses a box of another class.
+        xywh = prediction[:, :4].copy()
+        xywh[:, 0] -= xywh[:, 2] / 2
+        xywh[:, 1] -= xywh[:, 3] / 2
+        offset = xywh.copy()
+        offset[:, :2] += class_ids[:, None] * MAX_WH
+        kept = cv2.dnn.NMSBoxes(offset.tolist(), confidences.tolist(), self.conf, self.iou)
+        kept = np.array(kept).reshape(-1)[:MAX_DETECTIONS]
+
+        h, w = shape[:2]
+        detections = []
+        for i in kept:
+            x, y, bw, bh = xywh[i]
+            x1 = min(max((x - pad[0]) / gain, 0), w)
+            y1 = min(max((y - pad[1]) / gain, 0), h)
+            x2 = min(max((x + bw - pad[0]) / gain, 0), w)
+            y2 = min(max((y + bh - pad[1]) / gain, 0), h)
+            class_id = int(class_ids[i])
+            coords = [float(x1), float(y1), float(x2), float(y2)]
+            detections.append((self.names.get(class_id, str(class_id)), float(confidences[i]), coords))
+        return detections
+
+    def predict(self, images: List[np.ndarray]) -> List[List[Detection]]:
+        chunk = self.max_batch or len(images)
+        detections = []
+        for start in range(0, len(images), chunk):
+            batch = images[start:start + chunk]
+            letterboxed = [self._letterbox(image) for image in batch]
+            # BGR HWC uint8 -> RGB CHW float32 in [0, 1]
+            tensor = np.stack([lb[0][:, :, ::-1].transpose(2, 0, 1) for lb in letterboxed])
+            tensor = np.ascontiguousarray(tensor, dtype=np.float32) / 255.0
+            outputs = self.session.run(None, {self.input_name: tensor})[0]
+            for output, (_, gain, pad), image in zip(outputs, letterboxed, batch):
+                detections.append(self._postprocess(output, gain, pad, image.shape))
+        return detections
+
+    def warmup(self, runs: int = 1, imgsz: int = None):
+        blank = np.zeros((imgsz or self.imgsz, imgsz or self.imgsz, 3), np.uint8)
+        for _ in range(runs):
+            self.predict([blank])
+
+
+# --- Model Preparation ---
+
+def export_onnx(pt_path: str, onnx_path: str, imgsz: int = 640) -> str:
+    """Exports the PyTorch weights to ONNX with a dynamic batch axis (needs ultralytics, once)."""
+    from ultralytics import YOLO
+    exported = YOLO(pt_path).export(format="onnx", imgsz=imgsz, dynamic=True)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+def quantize_int8(onnx_path: str, int8_path: str) -> str:
+    """Dynamic INT8 quantization of the weights; activations stay float."""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    # Keep the class names (and the rest of the export metadata).
+    quantized = onnx.load(int8_path)
+    if not quantized.metadata_props:
+        quantized.metadata_props.extend(onnx.load(onnx_path).metadata_props)
+        onnx.save(quantized, int8_path)
+    return int8_path
+
+def load_detector(backend: str, pt_path: str, conf: float, onnx_path: str = None,
+                  int8: bool = False, intra_op_threads: int = 0):
+    """
+    Builds the selected backend. For "onnx", missing model files are produced
+    on first start: exported from `pt_path`, then quantized if `int8` is set.
+    """
+    if backend == "torch":
+        return TorchYoloDetector(pt_path, conf)
+    if backend != "onnx":
+        raise ValueError(f"Unknown identifier backend '{backend}'; expected 'torch' or 'onnx'.")
+
+    onnx_path = onnx_path or os.path.splitext(pt_path)[0] + ".onnx"
+    if not os.path.exists(onnx_path):
+        print(f"IDENTIFIER AGENT: Exporting {pt_path} to ONNX at {onnx_path}...")
+        export_onnx(pt_path, onnx_path)
+    if int8:
+        int8_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+        if not os.path.exists(int8_path):
+            print(f"IDENTIFIER AGENT: Quantizing {onnx_path} to INT8 at {int8_path}...")
+            quantize_int8(onnx_path, int8_path)
+        onnx_path = int8_path
+    return OnnxYoloDetector(onnx_path, conf, intra_op_threads=intra_op_threads)
@@ -1,13 +1,29 @@
 # agents/identifier_agent/main.py
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+import time
+from prometheus_client import Counter, Histogram
 from pydantic import BaseModel
 import uvicorn
 import cv2
 import numpy as np
+import asyncio
 import base64
-from ultralytics import YOLO
-from typing import List
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from detectors import load_detector
+from typing import List, Optional
+
+# The agents share agents/common; each one is started from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.observability import STAGE_LATENCY, concurrency_limiter, install_health, install_metrics
 
 # --- Pydantic Models for Input/Output Data Structures ---
 
@@ -34,10 +50,40 @@ class IdentifyResponse(BaseModel):
 # This is highly efficient as it prevents reloading the model on every API call.
 # The 'yolov8n.pt' file will be downloaded automatically by the library on first run
 # if it's not already present in the agent's directory.
+MODEL_NAME = "yolov8n.pt"
+# "torch" runs the ultralytics/PyTorch model; "onnx" runs the same network with
+# ONNX Runtime on the CPU (see detectors.py), exporting it on first start if
+# IDENTIFIER_ONNX_MODEL does not exist yet, and quantizing it to INT8 when
+# IDENTIFIER_ONNX_INT8 is set. IDENTIFIER_INTRA_OP_THREADS=0 means one thread per core.
+BACKEND = os.environ.get("IDENTIFIER_BACKEND", "torch")
+ONNX_MODEL = os.environ.get("IDENTIFIER_ONNX_MODEL", "yolov8n.onnx")
+ONNX_INT8 = os.environ.get("IDENTIFIER_ONNX_INT8", "false").lower() in ("1", "true", "yes")
+INTRA_OP_THREADS = int(os.environ.get("IDENTIFIER_INTRA_OP_THREADS", "0"))
+# Inferences on a blank image at startup, so the first real request does not
+# pay for lazy initialisation and memory allocation.
+WARMUP_RUNS = int(os.environ.get("IDENTIFIER_WARMUP_RUNS", "2"))
+# Detections below this confidence are dropped by the model.
+CONFIDENCE_THRESHOLD = float(os.environ.get("IDENTIFIER_CONFIDENCE", "0.25"))
+# YOLO resizes its input to 640px anyway, so images are decoded at a reduced
+# scale as long as the longest side stays at or above this many pixels.
+DECODE_MAX_SIDE = int(os.environ.get("IDENTIFIER_DECODE_MAX_SIDE", "1280"))
+# Concurrent requests are coalesced into one forward pass of up to
+# IDENTIFIER_MAX_BATCH images, waiting at most IDENTIFIER_MAX_WAIT_MS for it to fill.
+MAX_BATCH_SIZE = int(os.environ.get("IDENTIFIER_MAX_BATCH", "8"))
+MAX_BATCH_WAIT = float(os.environ.get("IDENTIFIER_MAX_WAIT_MS", "10")) / 1000
+# Threads decoding images. OpenCV releases the GIL while decoding, so these run
+# in parallel without blocking the event loop.
+DECODE_WORKERS = int(os.environ.get("IDENTIFIER_DECODE_WORKERS", str(os.cpu_count() or 4)))
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="identifier-decode")
+
 try:
-    print("IDENTIFIER AGENT: Loading YOLOv8 model...")
-    model = YOLO("yolov8n.pt")
-    print("IDENTIFIER AGENT: YOLOv8 model loaded successfully.")
+    print(f"IDENTIFIER AGENT: Loading YOLOv8 model ({BACKEND} backend)...")
+    model = load_detector(
+        BACKEND, MODEL_NAME, CONFIDENCE_THRESHOLD,
+        onnx_path=ONNX_MODEL, int8=ONNX_INT8, intra_op_threads=INTRA_OP_THREADS,
+    )
+    model.warmup(WARMUP_RUNS)
+    print("IDENTIFIER AGENT: YOLOv8 model loaded and warmed up successfully.")
 except Exception as e:
     print(f"FATAL: Could not load YOLOv8 model. Error: {e}")
     model = None
@@ -49,82 +95,293 @@ app = FastAPI(
     description="A specialized agent to 'see' and identify components from visual data.",
 )
 
-def base64_to_image(b64_string: str) -> np.ndarray:
+AGENT_NAME = "identifier"
+
+# --- Metrics ---
+# The agent's own metrics; request latency and /metrics come from common.observability.
+
+BATCH_SIZE = Histogram(
+    "aura_agent_inference_batch_size", "Number of images per batched forward pass.",
+    ["agent"], buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+DETECTION_CACHE_LOOKUPS = Counter(
+    "aura_agent_detection_cache_lookups_total", "Detection cache lookups by tier and result.",
+    ["agent", "tier", "result"],
+)
+
+install_metrics(app, AGENT_NAME)
+
+concurrency_slot = concurrency_limiter(AGENT_NAME, default=32)
+install_health(app, AGENT_NAME)
+
+# --- Detection Cache ---
+# The same image bytes are often identified again within a session (the UI
+# re-sends the captured frame). Results are cached under the SHA-256 of the
+# encoded image plus DETECTION_VERSION, so changing the model or the threshold
+# never serves stale boxes. An in-memory LRU answers repeats without decoding
+# or inference; the optional disk tier (IDENTIFIER_CACHE_DIR) survives restarts.
+
+DETECTION_BACKEND = BACKEND if BACKEND == "torch" else f"onnx{'-int8' if ONNX_INT8 else ''}:{ONNX_MODEL}"
+DETECTION_VERSION = f"{MODEL_NAME}:{DETECTION_BACKEND}:conf={CONFIDENCE_THRESHOLD}:decode={DECODE_MAX_SIDE}"
+
+class DetectionCache:
+    def __init__(self, max_entries: int, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(img_bytes: bytes) -> str:
+        return hashlib.sha256(DETECTION_VERSION.encode() + b"\0" + img_bytes).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[BoundingBox]]:
+        with self._lock:
+            boxes = self._entries.get(key)
+            if boxes is not None:
+                self._entries.move_to_end(key)
+        if boxes is not None:
+            DETECTION_CACHE_LOOKUPS.labels(agent=AGENT_NAME, tier="memory", result="hit").inc()
+            return boxes
+        DETECTION_CACHE_LOOKUPS.labels(agent=AGENT_NAME, tier="memory", result="miss").inc()
+
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                boxes = [BoundingBox(**b) for b in json.load(f)]
+        except (OSError, ValueError, TypeError):
+            DETECTION_CACHE_LOOKUPS.labels(agent=AGENT_NAME, tier="disk", result="miss").inc()
+            return None
+        DETECTION_CACHE_LOOKUPS.labels(agent=AGENT_NAME, tier="disk", result="hit").inc()
+        self._remember(key, boxes)
+        return boxes
+
+    def put(self, key: str, boxes: List[BoundingBox]):
+        self._remember(key, boxes)
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so a concurrent reader never sees a partial file.
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump([b.model_dump() for b in boxes], f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"IDENTIFIER AGENT: Could not write detection cache entry: {e}")
+
+    def _remember(self, key: str, boxes: List[BoundingBox]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = boxes
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+detection_cache = DetectionCache(
+    max_entries=int(os.environ.get("IDENTIFIER_CACHE_SIZE", "256")),
+    directory=os.environ.get("IDENTIFIER_CACHE_DIR") or None,
+)
+
+# OpenCV decode flags by reduction factor; for JPEGs the scaling happens inside the decoder.
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def decode_reduction(img_bytes: bytes) -> int:
+    """The largest reduction factor that keeps the image's longest side >= DECODE_MAX_SIDE."""
+    try:
+        # Image.open only parses the header here; nothing is decoded.
+        longest = max(Image.open(io.BytesIO(img_bytes)).size)
+    except Exception:
+        return 1
+    factor = 1
+    while factor < 8 and longest // (factor * 2) >= DECODE_MAX_SIDE:
+        factor *= 2
+    return factor
+
+def bytes_to_image(img_bytes: bytes):
+    """
+    Decodes encoded image bytes (JPEG, PNG, ...) into an OpenCV compatible numpy array.
+    np.frombuffer wraps the bytes without copying them. Returns the image and the
+    reduction factor it was decoded at, to scale detections back to full size.
     """
-    Decodes a base64 encoded image string into an OpenCV compatible numpy array.
+    np_arr = np.frombuffer(img_bytes, np.uint8)
+    factor = decode_reduction(img_bytes)
+    # The colour flags ensure it's read as a 3-channel BGR image.
+    return cv2.imdecode(np_arr, REDUCED_DECODE_FLAGS[factor]), factor
+
+def base64_to_bytes(b64_string: str) -> bytes:
+    """
+    Decodes a base64 encoded image string into the encoded image bytes.
     This function handles data URLs (e.g., from a browser's canvas.toDataURL()).
     """
     # Check if the string is a data URL and strip the header if it is.
     if "," in b64_string:
         b64_string = b64_string.split(',')[1]
-    
-    # Decode the base64 string into bytes.
-    img_bytes = base64.b64decode(b64_string)
-    
-    # Convert the bytes into a numpy array.
-    np_arr = np.frombuffer(img_bytes, np.uint8)
-    
-    # Decode the numpy array into an image using OpenCV.
-    # cv2.IMREAD_COLOR ensures it's read as a 3-channel BGR image.
-    image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    return image
+    return base64.b64decode(b64_string)
+
+def result_to_boxes(detections, scale: int = 1) -> List[BoundingBox]:
+    """
+    Converts one image's detections from the backend to BoundingBoxes,
+    multiplying coordinates by `scale` so they refer to the original,
+    full-resolution image.
+    """
+    return [
+        BoundingBox(label=label, confidence=confidence, box=[int(c * scale) for c in coords])
+        for label, confidence, coords in detections
+    ]
+
+# --- Micro-Batching ---
+
+class InferenceBatcher:
+    """
+    Coalesces concurrent inference requests into batched forward passes.
+
+    Requests queue up on the event loop. A single worker task takes the first
+    waiting image, collects more until the batch holds `max_batch` images or
+    `max_wait` seconds have passed, and runs the batch on a dedicated inference
+    thread. Requests arriving while a batch runs form the next one, so under
+    load batches fill without waiting and at low load the extra latency is
+    bounded by `max_wait`.
+    """
+
+    def __init__(self, max_batch: int, max_wait: float):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        # The model is not thread-safe: one batch at a time, off the event loop.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="identifier-inference")
+        self._queue = None
+        self._worker = None
+
+    async def infer(self, image: np.ndarray):
+        """Returns the YOLOv8 result for one image, computed as part of a batch."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _predict(self, images: List[np.ndarray]):
+        with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="inference").time():
+            return model.predict(images)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Skip requests whose client already went away.
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                continue
+            BATCH_SIZE.labels(agent=AGENT_NAME).observe(len(batch))
+            print(f"IDENTIFIER AGENT: Running YOLOv8 inference on a batch of {len(batch)}...")
+            try:
+                results = await loop.run_in_executor(self._executor, self._predict, [image for image, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+batcher = InferenceBatcher(MAX_BATCH_SIZE, MAX_BATCH_WAIT)
+
+async def identify_bytes(img_bytes: bytes) -> List[BoundingBox]:
+    """Detections for encoded image bytes, from the cache or from a fresh decode + inference."""
+    loop = asyncio.get_running_loop()
+    # Hashing megabytes and reading the disk tier are blocking too.
+    key = await loop.run_in_executor(decode_pool, detection_cache.key_for, img_bytes)
+    cached = await loop.run_in_executor(decode_pool, detection_cache.get, key)
+    if cached is not None:
+        print(f"IDENTIFIER AGENT: Cache hit, returning {len(cached)} cached objects.")
+        return cached
+
+    with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="decode").time():
+        image, scale = await loop.run_in_executor(decode_pool, bytes_to_image, img_bytes)
+    if image is None:
+        # This can happen if the bytes are malformed or not an image.
+        raise HTTPException(status_code=400, detail="Invalid image data. Could not decode.")
+
+    detected_objects = result_to_boxes(await batcher.infer(image), scale)
+    print(f"IDENTIFIER AGENT: Detected {len(detected_objects)} objects.")
+    await loop.run_in_executor(decode_pool, detection_cache.put, key, detected_objects)
+    return detected_objects
 
 @app.post("/identify", response_model=IdentifyResponse)
-async def identify_component(request: IdentifyRequest):
+async def identify_component(request: IdentifyRequest, _slot: None = Depends(concurrency_slot)):
     """
     This endpoint receives a base64 encoded image, runs YOLOv8 object detection,
     and returns a list of detected objects with their labels and coordinates.
+    Kept for compatibility; the supervisor uses /identify_raw.
     """
     # First, check if the model was loaded successfully during startup.
     if not model:
         raise HTTPException(status_code=500, detail="YOLOv8 model is not loaded or failed to load.")
 
     try:
-        # Step 1: Decode the incoming image string into a usable format.
+        # Step 1: Decode the incoming base64 string into the image bytes.
         print("IDENTIFIER AGENT: Decoding image from base64...")
-        image = base64_to_image(request.image_base64)
-
-        if image is None:
-            # This can happen if the base64 string is malformed or not an image.
-            raise HTTPException(status_code=400, detail="Invalid image data. Could not decode.")
-        
-        # Step 2: Run the YOLOv8 model inference on the decoded image.
-        print("IDENTIFIER AGENT: Running YOLOv8 inference...")
-        results = model(image)
-        
-        # Step 3: Process the inference results.
-        print("IDENTIFIER AGENT: Processing detection results...")
-        detected_objects = []
-        # The 'results' object is a list of results (usually just one for a single image).
-        for result in results:
-            # result.boxes contains all the bounding box detections.
-            for box in result.boxes:
-                # Get the class ID and look up the class name (e.g., "person", "car").
-                class_id = int(box.cls[0])
-                class_name = model.names[class_id]
-                
-                # Get the bounding box coordinates [x1, y1, x2, y2].
-                coords = [int(c) for c in box.xyxy[0]]
-                
-                # Create a BoundingBox object and add it to our list.
-                detected_objects.append(
-                    BoundingBox(
-                        label=class_name,
-                        confidence=float(box.conf[0]),
-                        box=coords
-                    )
-                )
-        
-        print(f"IDENTIFIER AGENT: Detected {len(detected_objects)} objects.")
-        
-        # Step 4: Return the structured response.
-        return IdentifyResponse(detected_objects=detected_objects)
+        img_bytes = base64_to_bytes(request.image_base64)
+
+        # Step 2: Run (or reuse) detection and return the structured response.
+        return IdentifyResponse(detected_objects=await identify_bytes(img_bytes))
 
+    except HTTPException:
+        raise
     except Exception as e:
         # Catch-all for any other unexpected errors during processing.
         print(f"IDENTIFIER AGENT: An unexpected error occurred: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process image: {str(e)}")
 
+@app.post("/identify_raw", response_model=IdentifyResponse)
+async def identify_component_raw(request: Request, _slot: None = Depends(concurrency_slot)):
+    """
+    Same as /identify, but the request body is the encoded image itself
+    (Content-Type: application/octet-stream or image/*). No base64 inflation,
+    and the bytes are decoded straight from the request buffer.
+    """
+    if not model:
+        raise HTTPException(status_code=500, detail="YOLOv8 model is not loaded or failed to load.")
+
+    img_bytes = await request.body()
+    if not img_bytes:
+        raise HTTPException(status_code=400, detail="Empty request body; expected image bytes.")
+
+    try:
+        return IdentifyResponse(detected_objects=await identify_bytes(img_bytes))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"IDENTIFIER AGENT: An unexpected error occurred: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to process image: {str(e)}")
+
 # This block allows running the agent directly for testing purposes.
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,403 @@
+# agents/llm_gateway/main.py
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import sys
+import re
+import time
+from prometheus_client import Counter, Gauge, Histogram
+import httpx
+import uvicorn
+from dotenv import load_dotenv
+
+# The agents share agents/common; each one is started from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.observability import LATENCY_BUCKETS, install_health, install_metrics
+
+# Load environment variables from .env file
+load_dotenv()
+
+# --- Configuration ---
+# Every AURA component that talks to Groq points its client here
+# (GROQ_BASE_URL=http://host.docker.internal:8007), so one process sees all
+# LLM traffic and can keep it inside the account's limits.
+
+UPSTREAM_URL = os.environ.get("GATEWAY_UPSTREAM_URL", "https://api.groq.com").rstrip("/")
+# Used when a client does not send its own Authorization header.
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+REQUESTS_PER_MINUTE = float(os.environ.get("GATEWAY_RPM", "30"))
+TOKENS_PER_MINUTE = float(os.environ.get("GATEWAY_TPM", "6000"))
+MAX_IN_FLIGHT = int(os.environ.get("GATEWAY_MAX_IN_FLIGHT", "16"))
+# How long a request may wait for admission when it sends no X-Aura-Deadline-Ms.
+DEFAULT_DEADLINE = float(os.environ.get("GATEWAY_DEFAULT_DEADLINE_S", "60"))
+# Upstream 429s retried inside the gateway before the client sees one.
+MAX_UPSTREAM_RETRIES = int(os.environ.get("GATEWAY_MAX_RETRIES", "3"))
+# Completion budget assumed for requests that do not set max_tokens.
+DEFAULT_COMPLETION_TOKENS = int(os.environ.get("GATEWAY_DEFAULT_COMPLETION_TOKENS", "256"))
+
+# X-Aura-Priority values; lower is served first.
+PRIORITIES = {"interactive": 0, "default": 1, "batch": 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+app = FastAPI(
+    title="AURA LLM Gateway",
+    description="Admission control and rate-limit-aware scheduling in front of the Groq API.",
+)
+
+AGENT_NAME = "llm_gateway"
+
+# --- Metrics ---
+# The agent's own metrics; request latency and /metrics come from common.observability.
+
+QUEUE_WAIT = Histogram(
+    "aura_gateway_queue_wait_seconds", "Time an LLM request waited for admission.",
+    ["priority"], buckets=LATENCY_BUCKETS,
+)
+QUEUE_DEPTH = Gauge("aura_gateway_queue_depth", "LLM requests waiting for admission.", ["priority"])
+IN_FLIGHT = Gauge("aura_gateway_requests_in_flight", "LLM requests admitted and not yet finished.")
+BUDGET = Gauge("aura_gateway_budget_remaining", "Remaining capacity of the rate-limit buckets.", ["bucket"])
+UPSTREAM_RESPONSES = Counter("aura_gateway_upstream_responses_total", "Responses from the provider.", ["status"])
+REJECTED = Counter("aura_gateway_rejected_total", "Requests refused without reaching the provider.", ["reason"])
+
+install_metrics(app, AGENT_NAME)
+
+install_health(app, AGENT_NAME)
+
+
+# --- Rate Limiting ---
+
+class TokenBucket:
+    """A per-minute budget refilled continuously, as the provider accounts it."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (requests larger than the bucket wait for a full one)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate) if self.rate > 0 else 0.0
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+    def limit(self, remaining: float, now: float):
+        """Never assume more budget than the provider says is left."""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Scheduler:
+    """
+    Admits LLM requests one at a time, in priority order and, within a
+    priority, earliest deadline first. The request at the head of the queue is
+    admitted once the requests and tokens buckets can pay for it, fewer than
+    MAX_IN_FLIGHT requests are running and no provider cooldown (retry-after)
+    is pending. A request whose deadline passes before that point is refused
+    instead of being sent late, so it never holds up the ones behind it.
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket(REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(TOKENS_PER_MINUTE)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._wake = None
+        self._worker = None
+
+    async def acquire(self, priority: int, cost: int, deadline: float) -> "Admission":
+        """Waits until the request may be sent; raises DeadlineExceeded if it cannot be in time."""
+        if self._worker is None or self._worker.done():
+            self._wake = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, deadline, next(self._sequence), cost, future))
+        QUEUE_DEPTH.labels(priority=PRIORITY_NAMES[priority]).inc()
+        self._wake.set()
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled just after being admitted: the slot is already taken.
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release(cost, 0)
+            future.cancel()
+            raise
+        finally:
+            QUEUE_DEPTH.labels(priority=PRIORITY_NAMES[priority]).dec()
+            QUEUE_WAIT.labels(priority=PRIORITY_NAMES[priority]).observe(time.monotonic() - started)
+        return Admission(self, cost)
+
+    def _release(self, estimated: int, actual: int = None):
+        """Ends an admitted request; the tokens bucket is corrected to what it actually used."""
+        self.in_flight -= 1
+        IN_FLIGHT.dec()
+        if actual is not None:
+            self.tokens.give(estimated - actual)
+        self._wake.set()
+
+    def cool_down(self, seconds: float):
+        """Holds every admission for `seconds` (the provider's retry-after)."""
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+        self._wake.set()
+
+    def observe_limits(self, headers):
+        """Aligns the buckets with the provider's x-ratelimit-* headers."""
+        now = time.monotonic()
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            try:
+                self.tokens.limit(float(remaining_tokens), now)
+            except ValueError:
+                pass
+        # Groq's request limit is per day; when it is spent, wait for its reset.
+        if headers.get("x-ratelimit-remaining-requests") == "0":
+            self.cool_down(parse_duration(headers.get("x-ratelimit-reset-requests")) or 60.0)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            now = time.monotonic()
+            # Drop requests whose caller gave up (deadline or disconnect).
+            while self._heap and self._heap[0][4].done():
+                heapq.heappop(self._heap)
+            if not self._heap or self.in_flight >= MAX_IN_FLIGHT:
+                await self._wake.wait()
+                continue
+
+            priority, deadline, _, cost, future = self._heap[0]
+            wait = max(
+                self.cooldown_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(cost, now),
+            )
+            if now + wait > deadline:
+                heapq.heappop(self._heap)
+                REJECTED.labels(reason="deadline").inc()
+                future.set_exception(DeadlineExceeded(f"No LLM capacity within the deadline (next slot in {wait:.1f}s)."))
+                continue
+            if wait > 0:
+                # A new arrival may outrank the head, so wake up for it too.
+                try:
+                    await asyncio.wait_for(self._wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self.requests.take(1, now)
+            self.tokens.take(cost, now)
+            self.in_flight += 1
+            IN_FLIGHT.inc()
+            BUDGET.labels(bucket="requests").set(self.requests.level)
+            BUDGET.labels(bucket="tokens").set(self.tokens.level)
+            future.set_result(None)
+
+
+class Admission:
+    """An admitted request's slot. Releasing it more than once is harmless, so
+    every exit path of the proxy can release without tracking the others."""
+
+    def __init__(self, scheduler: Scheduler, cost: int):
+        self.scheduler = scheduler
+        self.cost = cost
+        self.released = False
+
+    def release(self, actual: int = None):
+        if not self.released:
+            self.released = True
+            self.scheduler._release(self.cost, actual)
+
+scheduler = Scheduler()
+
+
+# --- Helpers ---
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+def parse_duration(value) -> float:
+    """Seconds in a retry-after ("7") or Groq reset ("1m2.5s", "120ms") header; 0 if absent."""
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(amount) * units[unit] for amount, unit in DURATION_PART.findall(value))
+
+def estimate_tokens(payload: dict) -> int:
+    """Prompt (~4 characters per token) plus the completion budget the request allows."""
+    characters = 0
+    for message in payload.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+        elif isinstance(content, list):
+            characters += sum(len(part.get("text") or "") for part in content if isinstance(part, dict))
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return characters // 4 + 1 + int(completion)
+
+# Hop-by-hop and gateway-only headers are not forwarded.
+DROPPED_REQUEST_HEADERS = {"host", "content-length", "connection", "accept-encoding"}
+RETURNED_HEADERS = ("content-type", "retry-after", "x-request-id")
+
+def upstream_headers(request: Request) -> dict:
+    headers = {
+        name: value for name, value in request.headers.items()
+        if name not in DROPPED_REQUEST_HEADERS and not name.startswith("x-aura-")
+    }
+    if "authorization" not in headers and GROQ_API_KEY:
+        headers["authorization"] = f"Bearer {GROQ_API_KEY}"
+    return headers
+
+def client_headers(response: httpx.Response) -> dict:
+    return {
+        name: value for name, value in response.headers.items()
+        if name in RETURNED_HEADERS or name.startswith("x-ratelimit-")
+    }
+
+def gateway_error(status: int, message: str, retry_after: float = None) -> JSONResponse:
+    # x-should-retry tells the Groq/OpenAI SDKs not to retry on their own:
+    # the gateway already did, and a burst of client retries is what it prevents.
+    headers = {"x-should-retry": "false"}
+    if retry_after:
+        headers["retry-after"] = str(max(1, round(retry_after)))
+    return JSONResponse({"error": {"message": message, "type": "aura_gateway"}}, status_code=status, headers=headers)
+
+
+# --- Proxy ---
+
+class RelayResponse(StreamingResponse):
+    """
+    Relays a streamed upstream response and then closes it and frees its slot.
+    Done in __call__ rather than in the body iterator or a background task, so
+    it also happens when the client disconnects or the body is never read.
+    """
+
+    def __init__(self, upstream: httpx.Response, on_close, **kwargs):
+        super().__init__(upstream.aiter_raw(), **kwargs)
+        self.upstream = upstream
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.upstream.aclose()
+            self.on_close()
+
+http_client = httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=10.0))
+
+@app.api_route("/openai/v1/{path:path}", methods=["GET", "POST"])
+async def proxy(path: str, request: Request):
+    """
+    Forwards an OpenAI-compatible request to Groq once the scheduler admits it.
+    Clients pick their class with X-Aura-Priority (interactive, default,
+    batch) and may bound their wait with X-Aura-Deadline-Ms. Provider 429s
+    pause all admissions for the retry-after period and the request is queued
+    again; streamed responses are relayed as they arrive.
+    """
+    url = f"{UPSTREAM_URL}/openai/v1/{path}"
+    headers = upstream_headers(request)
+    if request.method == "GET":
+        # Model listings and the like do not count against the LLM limits.
+        response = await http_client.get(url, headers=headers, params=request.query_params)
+        return Response(response.content, status_code=response.status_code, headers=client_headers(response))
+
+    body = await request.body()
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return gateway_error(400, "The request body is not valid JSON.")
+    priority = PRIORITIES.get(request.headers.get("x-aura-priority", "default").lower(), PRIORITIES["default"])
+    try:
+        wait_budget = float(request.headers["x-aura-deadline-ms"]) / 1000.0
+    except (KeyError, ValueError):
+        wait_budget = DEFAULT_DEADLINE
+    deadline = time.monotonic() + wait_budget
+    cost = estimate_tokens(payload)
+
+    response = None
+    for attempt in range(MAX_UPSTREAM_RETRIES + 1):
+        try:
+            admission = await scheduler.acquire(priority, cost, deadline)
+        except DeadlineExceeded as e:
+            return gateway_error(429, str(e), retry_after=scheduler.cooldown_until - time.monotonic())
+
+        # From here until the exchange is over the slot is released exactly once,
+        # whether it ends normally, fails, or is cancelled by a disconnect.
+        handed_off = False
+        response = None
+        try:
+            try:
+                upstream_request = http_client.build_request("POST", url, headers=headers, content=body)
+                response = await http_client.send(upstream_request, stream=True)
+            except httpx.HTTPError as e:
+                admission.release(0)
+                return gateway_error(502, f"Could not reach the LLM provider: {e}")
+            UPSTREAM_RESPONSES.labels(status=response.status_code).inc()
+            scheduler.observe_limits(response.headers)
+
+            if response.status_code == 429:
+                await response.aread()
+                # Nothing was generated; the whole estimate goes back to the bucket.
+                admission.release(0)
+                retry_after = parse_duration(response.headers.get("retry-after")) or 1.0
+                print(f"LLM GATEWAY: Provider rate limit hit; pausing admissions for {retry_after:.1f}s (attempt {attempt + 1}).")
+                scheduler.cool_down(retry_after)
+                continue
+
+            if payload.get("stream"):
+                handed_off = True
+                # Streamed usage arrives in the last chunk; keep the estimate.
+                return RelayResponse(response, admission.release, status_code=response.status_code, headers=client_headers(response))
+
+            try:
+                content = await response.aread()
+            except httpx.HTTPError as e:
+                return gateway_error(502, f"The LLM provider's response was cut short: {e}")
+            actual = None
+            try:
+                actual = json.loads(content)["usage"]["total_tokens"]
+            except (ValueError, KeyError, TypeError):
+                pass
+            admission.release(actual)
+            return Response(content, status_code=response.status_code, headers=client_headers(response))
+        finally:
+            if not handed_off:
+                if response is not None:
+                    await response.aclose()
+                # A request that may have reached the provider keeps its estimate.
+                admission.release()
+
+    return Response(
+        response.content, status_code=429,
+        headers={**client_headers(response), "x-should-retry": "false"},
+    )
+
+# This block allows running the agent directly for testing purposes.
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8007)
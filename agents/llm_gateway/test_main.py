@@ -0,0 +1,94 @@
+# agents/llm_gateway/test_main.py
+# Run from this directory: python -m unittest test_main
+
+import asyncio
+import unittest
+
+import httpx
+
+import main
+
+
+class ChunkStream(httpx.AsyncByteStream):
+    """An upstream body delivered (or failing) as a real stream."""
+
+    def __init__(self, *chunks):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+class ProxySlotTests(unittest.IsolatedAsyncioTestCase):
+    """Every admitted request must give its slot back, however it ends."""
+
+    async def asyncSetUp(self):
+        main.scheduler = main.Scheduler()
+        self.upstream_started = asyncio.Event()
+        self.original_client = main.http_client
+
+    async def asyncTearDown(self):
+        await main.http_client.aclose()
+        main.http_client = self.original_client
+
+    def use_upstream(self, handler):
+        main.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def gateway(self):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway")
+
+    async def post(self, client, **payload):
+        return await client.post(
+            "/openai/v1/chat/completions",
+            json={"model": "m", "messages": [{"role": "user", "content": "hi"}], **payload},
+        )
+
+    async def test_cancelled_during_upstream_call_releases_slot(self):
+        async def hang(request):
+            self.upstream_started.set()
+            await asyncio.sleep(3600)
+        self.use_upstream(hang)
+
+        async with self.gateway() as client:
+            request = asyncio.create_task(self.post(client))
+            await asyncio.wait_for(self.upstream_started.wait(), 5)
+            self.assertEqual(main.scheduler.in_flight, 1)
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+
+        self.assertEqual(main.scheduler.in_flight, 0)
+
+    async def test_read_error_releases_slot(self):
+        self.use_upstream(lambda request: httpx.Response(200, stream=ChunkStream(httpx.ReadError("connection reset"))))
+
+        async with self.gateway() as client:
+            response = await self.post(client)
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(main.scheduler.in_flight, 0)
+
+    async def test_streamed_response_releases_slot(self):
+        self.use_upstream(lambda request: httpx.Response(200, stream=ChunkStream(b"data: [DONE]\n\n")))
+
+        async with self.gateway() as client:
+            response = await self.post(client, stream=True)
+
+        self.assertEqual(response.text, "data: [DONE]\n\n")
+        self.assertEqual(main.scheduler.in_flight, 0)
+
+    async def test_completed_request_releases_slot(self):
+        self.use_upstream(lambda request: httpx.Response(200, json={"usage": {"total_tokens": 12}}))
+
+        async with self.gateway() as client:
+            response = await self.post(client)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(main.scheduler.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
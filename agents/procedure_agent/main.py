@@ -3,6 +3,7 @@
 # --- START OF ENVIRONMENT FIX ---
 # This block runs BEFORE any other imports to fix the "homeless" environment issue.
 import os
+import sys
 import pathlib
 
 # Check if the HOME environment variable is missing.
@@ -24,13 +25,21 @@ if not os.getenv("HOME") and not os.getenv("USERPROFILE"):
 
 
 # Now, with the environment fixed, we can safely import everything else.
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
+import asyncio
+import time
 from pydantic import BaseModel
 import uvicorn
 import json
 from dotenv import load_dotenv
 import snowflake.connector
 import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# The agents share agents/common; each one is started from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.observability import STAGE_LATENCY, concurrency_limiter, install_health, install_metrics
+
 # Load environment variables from .env file (for Snowflake credentials)
 load_dotenv()
 
@@ -54,6 +63,24 @@ app = FastAPI(
     title="AURA Procedure Agent (Snowflake-Connected)",
     description="Fetches SOPs directly from an enterprise Snowflake data warehouse."
 )
+
+AGENT_NAME = "procedure"
+
+install_metrics(app, AGENT_NAME)
+
+concurrency_slot = concurrency_limiter(AGENT_NAME, default=8)
+install_health(app, AGENT_NAME)
+
+# --- I/O Pool ---
+# The Snowflake connector and the supervisor fallback are blocking clients, so
+# they run on this pool instead of the event loop.
+
+PROCEDURE_IO_WORKERS = int(os.environ.get("PROCEDURE_IO_WORKERS", "8"))
+io_pool = ThreadPoolExecutor(max_workers=PROCEDURE_IO_WORKERS, thread_name_prefix="procedure-io")
+
+async def run_io(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(io_pool, func, *args)
+
 def get_from_snowflake(component_name: str):
     """Primary Method: Tries to fetch from Snowflake."""
     print(f"PROCEDURE AGENT: Attempting to fetch '{component_name}' from Snowflake (Primary)...")
@@ -96,15 +123,17 @@ def get_from_local_db(component_name: str):
         return None
 
 @app.post("/get_procedure")
-async def get_procedure(request: ComponentRequest):
+async def get_procedure(request: ComponentRequest, _slot: None = Depends(concurrency_slot)):
     component = request.component_name
     
     # 1. Try online source first
-    procedure_data = get_from_snowflake(component)
+    with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="snowflake").time():
+        procedure_data = await run_io(get_from_snowflake, component)
     
     # 2. If it fails, try the offline fallback
     if not procedure_data:
-        procedure_data = get_from_local_db(component)
+        with STAGE_LATENCY.labels(agent=AGENT_NAME, stage="local_cache").time():
+            procedure_data = await run_io(get_from_local_db, component)
 
     # 3. If BOTH sources fail, return a graceful "not found" message.
     if not procedure_data:
@@ -118,4 +147,4 @@ async def get_procedure(request: ComponentRequest):
     return procedure_data
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8002)
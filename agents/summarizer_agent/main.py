@@ -1,8 +1,14 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from pydantic import BaseModel
+import asyncio
 import time
 import uvicorn
 import os # Good practice to use os for clarity
+import sys
+
+# The agents share agents/common; each one is started from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.observability import STAGE_LATENCY, concurrency_limiter, install_health, install_metrics
 
 # Define the input data model. The Supervisor will send a long string of all the logs.
 class LogTextRequest(BaseModel):
@@ -14,8 +20,15 @@ app = FastAPI(
     description="A specialized agent to summarize job logs and create a final report."
 )
 
+AGENT_NAME = "summarizer"
+
+install_metrics(app, AGENT_NAME)
+
+concurrency_slot = concurrency_limiter(AGENT_NAME, default=16)
+install_health(app, AGENT_NAME)
+
 @app.post("/summarize")
-async def summarize(request: LogTextRequest):
+async def summarize(request: LogTextRequest, _slot: None = Depends(concurrency_slot)):
     """
     Receives a string of job logs and returns a concise summary.
     For the hackathon, we simulate this with a hardcoded response.
@@ -27,7 +40,7 @@ async def summarize(request: LogTextRequest):
     print(f"SUMMARIZER AGENT: Received request with {log_length} characters of log data.")
     print("SUMMARIZER AGENT: Simulating summarization process (e.g., LLM call)...")
     
-    time.sleep(1) 
+    await asyncio.sleep(1)
     
     # Hardcoded response that matches what the Supervisor expects
     summary_data = {
@@ -42,4 +55,4 @@ async def summarize(request: LogTextRequest):
 
 # This allows running the script directly
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8003)
\ No newline at end of file
+    uvicorn.run(app, host="127.0.0.1", port=8003)
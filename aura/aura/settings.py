@@ -40,6 +40,15 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if DEBUG and not GROQ_API_KEY:
     print("WARNING: GROQ_API_KEY is not set in the .env file.")
 
+# --- LLM Gateway ---
+# When set (e.g. http://host.docker.internal:8007), Groq calls go through the
+# shared admission-control gateway (agents/llm_gateway) instead of straight to
+# the provider. Turns are sent as "interactive" and give up waiting for a slot
+# after AURA_LLM_DEADLINE_MS. For offline load tests, point it (or the
+# gateway's upstream) at the record/replay stub in agents/groq_stub instead.
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+AURA_LLM_DEADLINE_MS = int(os.getenv("AURA_LLM_DEADLINE_MS", "20000"))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -55,6 +64,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,22 +98,57 @@ WSGI_APPLICATION = 'aura.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.sqlite3',
-#         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
-# }
-
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        # --- THIS IS THE CHANGE ---
-        # Look for the database file in a 'database' sub-directory
-        # inside the main project directory (/app in the container).
-        "NAME": BASE_DIR / "database" / "db.sqlite3", 
+# AURA_DB_ENGINE selects the database mode:
+#   - 'sqlite' (default): a single file, tuned for concurrent workers. WAL lets
+#     log reads run alongside writes, writers queue on a busy timeout instead of
+#     failing with "database is locked", and connections are kept open.
+#   - 'postgres': PostgreSQL through psycopg 3 with a connection pool.
+# Compare both with `python manage.py bench_db`.
+AURA_DB_ENGINE = os.getenv('AURA_DB_ENGINE', 'sqlite')
+
+if AURA_DB_ENGINE == 'postgres':
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("POSTGRES_DB", "aura"),
+            "USER": os.getenv("POSTGRES_USER", "aura"),
+            "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+            "HOST": os.getenv("POSTGRES_HOST", "localhost"),
+            "PORT": os.getenv("POSTGRES_PORT", "5432"),
+            # The pool replaces persistent connections (CONN_MAX_AGE must stay 0).
+            "OPTIONS": {
+                "pool": {
+                    "min_size": int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2")),
+                    "max_size": int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+                    "timeout": float(os.getenv("POSTGRES_POOL_TIMEOUT", "10")),
+                },
+            },
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            # Look for the database file in a 'database' sub-directory
+            # inside the main project directory (/app in the container).
+            "NAME": BASE_DIR / "database" / "db.sqlite3",
+            "CONN_MAX_AGE": int(os.getenv("AURA_DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                # Seconds a writer waits for the lock before giving up.
+                "timeout": float(os.getenv("AURA_SQLITE_BUSY_TIMEOUT", "20")),
+                # Take the write lock when the transaction starts, so concurrent
+                # writers queue on the busy timeout instead of deadlocking on upgrade.
+                "transaction_mode": "IMMEDIATE",
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA temp_store=MEMORY;"
+                    "PRAGMA cache_size=-20000;"
+                ),
+            },
+        }
     }
-}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -162,6 +207,110 @@ MEDIA_URL = '/media/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# --- LIVE LOG STREAM ---
+# The stream is woken by an in-process event broker (core.events), so it needs
+# every write and every streamed token to happen in the process holding the
+# browser's connection: with AURA_LOG_STREAM on, startup.sh runs a single web
+# worker. Set it to false to run AURA_WEB_WORKERS workers; the stream endpoint
+# then answers 501 and pages poll the log API instead.
+# Seconds an idle log stream waits before sending a keep-alive. Each heartbeat
+# also re-reads the database, as a safety net for writes made elsewhere
+# (management commands, the admin).
+AURA_LOG_STREAM = os.getenv('AURA_LOG_STREAM', 'true').lower() in ('1', 'true', 'yes')
+AURA_LOG_STREAM_HEARTBEAT = float(os.getenv('AURA_LOG_STREAM_HEARTBEAT', '15'))
+
+# --- AGENT TURN WORKERS ---
+# Agent turns run on a bounded pool instead of inside the web request.
+# AURA_TURN_EXECUTOR is 'thread' or 'process'; AURA_TURN_QUEUE_SIZE is how many
+# turns may wait for a free worker before new ones are refused with a 503.
+AURA_TURN_EXECUTOR = os.getenv('AURA_TURN_EXECUTOR', 'thread')
+AURA_TURN_WORKERS = int(os.getenv('AURA_TURN_WORKERS', '4'))
+AURA_TURN_QUEUE_SIZE = int(os.getenv('AURA_TURN_QUEUE_SIZE', '32'))
+
+# --- AGENT TOOL CALLS ---
+# With AURA_PARALLEL_TOOLS, the tool calls the LLM makes in one step run
+# concurrently on a pool of AURA_TOOL_WORKERS threads (core.parallel_executor).
+# A call still running after its timeout (seconds; AURA_TOOL_TIMEOUTS per tool,
+# e.g. "end_session_and_generate_report=120", else AURA_TOOL_TIMEOUT) is
+# reported to the LLM as timed out.
+AURA_PARALLEL_TOOLS = os.getenv('AURA_PARALLEL_TOOLS', 'true').lower() in ('1', 'true', 'yes')
+AURA_TOOL_WORKERS = int(os.getenv('AURA_TOOL_WORKERS', '8'))
+AURA_TOOL_TIMEOUT = float(os.getenv('AURA_TOOL_TIMEOUT', '90'))
+AURA_TOOL_TIMEOUTS = {
+    name.strip(): float(value)
+    for name, value in (
+        item.split('=') for item in os.getenv('AURA_TOOL_TIMEOUTS', 'end_session_and_generate_report=180').split(',') if item
+    )
+}
+
+# --- CONVERSATION HISTORY ---
+# Approximate token budgets for the chat history sent with every agent turn:
+# recent messages are kept verbatim up to AURA_HISTORY_TOKEN_BUDGET, older
+# ones are rolled into a summary capped at AURA_HISTORY_SUMMARY_TOKENS.
+AURA_HISTORY_TOKEN_BUDGET = int(os.getenv('AURA_HISTORY_TOKEN_BUDGET', '2000'))
+AURA_HISTORY_SUMMARY_TOKENS = int(os.getenv('AURA_HISTORY_SUMMARY_TOKENS', '500'))
+
+# --- IMAGE NORMALIZATION ---
+# Uploaded photos get an upright JPEG derivative capped at AURA_IMAGE_MAX_SIDE
+# pixels (core.imaging), which is what the vision agents are sent. The
+# original upload is kept unchanged.
+AURA_IMAGE_NORMALIZE = os.getenv('AURA_IMAGE_NORMALIZE', 'true').lower() in ('1', 'true', 'yes')
+AURA_IMAGE_MAX_SIDE = int(os.getenv('AURA_IMAGE_MAX_SIDE', '1280'))
+AURA_IMAGE_JPEG_QUALITY = int(os.getenv('AURA_IMAGE_JPEG_QUALITY', '85'))
+
+# --- IMAGE DERIVATIVES ---
+# Widths of the resized copies written in the background for the images the
+# page shows (core.derivatives); the log API lists them as a srcset. An empty
+# list disables them.
+AURA_IMAGE_DERIVATIVE_WIDTHS = tuple(
+    int(width) for width in os.getenv('AURA_IMAGE_DERIVATIVE_WIDTHS', '160,480,960').split(',') if width.strip()
+)
+AURA_IMAGE_DERIVATIVE_WORKERS = int(os.getenv('AURA_IMAGE_DERIVATIVE_WORKERS', '1'))
+# An unreferenced blob saved or re-saved this recently is not deleted on the
+# spot, as an upload of the same bytes may still be inserting its row; the
+# gc_blobs command frees such blobs later.
+AURA_BLOB_GRACE_SECONDS = int(os.getenv('AURA_BLOB_GRACE_SECONDS', '600'))
+# Browser cache lifetime of content-addressed media, whose bytes never change.
+AURA_MEDIA_CACHE_MAX_AGE = int(os.getenv('AURA_MEDIA_CACHE_MAX_AGE', str(365 * 24 * 3600)))
+
+# --- INTENT ROUTER ---
+# Mechanical turns ("procedure for PSU-07B", "next step", "we're done,
+# success") are answered by core.router without the LLM tool loop.
+AURA_ROUTER_ENABLED = os.getenv('AURA_ROUTER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# --- ANNOTATIONS ---
+# "overlay" stores the boxes as JSON and lets the page draw them over the
+# original image; the annotated JPEG is only rendered when it is requested.
+# "raster" has the Annotator Agent draw and store a JPEG on every annotation.
+AURA_ANNOTATION_MODE = os.getenv('AURA_ANNOTATION_MODE', 'overlay').lower()
+# Overlays rasterized per Annotator Agent call when a whole job's annotated
+# images are requested (at most the agent's ANNOTATOR_MAX_BATCH).
+AURA_ANNOTATION_BATCH_SIZE = int(os.getenv('AURA_ANNOTATION_BATCH_SIZE', '32'))
+
+# --- AGENT HTTP CLIENT ---
+# Shared keep-alive clients used by core.services to reach the agents.
+# Timeouts are in seconds. Connection failures and 502/503/504 answers are
+# retried AGENT_RETRIES times with jittered exponential backoff. After
+# AGENT_BREAKER_THRESHOLD consecutive failures an agent's circuit opens and
+# calls fail fast for AGENT_BREAKER_RESET_TIMEOUT seconds.
+AGENT_CONNECT_TIMEOUT = float(os.getenv('AGENT_CONNECT_TIMEOUT', '3'))
+AGENT_READ_TIMEOUT = float(os.getenv('AGENT_READ_TIMEOUT', '30'))
+# Per-agent read timeouts for the slower, LLM-backed agents, e.g. "summarizer=90,command=20".
+AGENT_READ_TIMEOUTS = {
+    name.strip(): float(value)
+    for name, value in (
+        item.split('=') for item in os.getenv('AGENT_READ_TIMEOUTS', 'groq_llama_vision=60,summarizer=60').split(',') if item
+    )
+}
+AGENT_RETRIES = int(os.getenv('AGENT_RETRIES', '2'))
+AGENT_RETRY_BACKOFF = float(os.getenv('AGENT_RETRY_BACKOFF', '0.25'))
+AGENT_POOL_SIZE = int(os.getenv('AGENT_POOL_SIZE', '10'))
+AGENT_BREAKER_THRESHOLD = int(os.getenv('AGENT_BREAKER_THRESHOLD', '5'))
+AGENT_BREAKER_RESET_TIMEOUT = float(os.getenv('AGENT_BREAKER_RESET_TIMEOUT', '30'))
+# Shared deadline for agent calls a tool fans out concurrently (core.async_services).
+# Defaults to the longest read timeout, so a slow but healthy agent is not cut off.
+AGENT_FANOUT_DEADLINE = float(os.getenv('AGENT_FANOUT_DEADLINE', str(max([AGENT_READ_TIMEOUT, *AGENT_READ_TIMEOUTS.values()]))))
+
 # --- CELERY SETTINGS ---
 # We use the service name 'redis' from our docker-compose.yml
 # NEW: Add a flag for on-device/offline mode.
@@ -1,8 +1,10 @@
 # aura/urls.py
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings 
 from django.conf.urls.static import static 
+from core.metrics import metrics_view
+from core.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,9 +12,12 @@ urlpatterns = [
     path('', include('landing.urls')), 
     # The main application now lives under the /app/ prefix
     path('app/', include('core.urls')), 
-    path('forge/', include('forge.urls'))
+    path('forge/', include('forge.urls')),
+    # Prometheus scrape endpoint (views, agent calls, tools, LLM calls, turns)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Like static(), with long-lived cache headers for content-addressed files.
+    urlpatterns += [re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.*)$', serve_media)]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
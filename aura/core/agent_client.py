@@ -0,0 +1,151 @@
+# aura/core/agent_client.py
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+class AgentInteractionError(Exception):
+    """Custom exception for agent communication failures."""
+    pass
+
+class CircuitOpenError(AgentInteractionError):
+    """Raised without touching the network while an agent's circuit is open."""
+    pass
+
+
+# Gateway errors are worth another attempt; anything else is the agent's answer.
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an agent is down.
+
+    After `failure_threshold` consecutive failures the circuit opens and every
+    call is refused for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Gives the trial slot back without a verdict, for calls that ended
+        without judging the agent (cancelled, or an unexpected error)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class AgentClient:
+    """
+    A keep-alive HTTP client for one agent: its own connection pool, connect and
+    read timeouts, bounded retries with jittered exponential backoff for
+    connection failures and gateway errors, and a circuit breaker.
+    """
+
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.connect_timeout = settings.AGENT_CONNECT_TIMEOUT
+        self.read_timeout = settings.AGENT_READ_TIMEOUTS.get(name, settings.AGENT_READ_TIMEOUT)
+        self.retries = settings.AGENT_RETRIES
+        self.backoff = settings.AGENT_RETRY_BACKOFF
+        self.breaker = CircuitBreaker(settings.AGENT_BREAKER_THRESHOLD, settings.AGENT_BREAKER_RESET_TIMEOUT)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.AGENT_POOL_SIZE, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _sleep_before_retry(self, attempt):
+        # "Full jitter": spread retries of many callers over the whole backoff window.
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def post(self, url=None, **kwargs) -> requests.Response:
+        """POSTs to the agent and returns the successful response, or raises AgentInteractionError."""
+        url = url or self.url
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"{self.name} agent at {url} is unavailable (circuit open); not calling it.")
+
+        try:
+            return self._post_with_retries(url, **kwargs)
+        except AgentInteractionError:
+            raise
+        except BaseException:
+            # The breaker was not told how the call went; free a half-open
+            # trial so the circuit is not stuck open.
+            self.breaker.release_trial()
+            raise
+
+    def _post_with_retries(self, url, **kwargs) -> requests.Response:
+        timeout = (self.connect_timeout, self.read_timeout)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                last_error = e
+            except requests.RequestException as e:
+                # A read timeout means the agent is hung; retrying would only multiply the wait.
+                self.breaker.record_failure()
+                raise AgentInteractionError(f"{self.name} agent at {url} failed: {e}") from e
+            else:
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    last_error = requests.HTTPError(f"{response.status_code} Server Error from {url}", response=response)
+                else:
+                    if response.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError as e:
+                        raise AgentInteractionError(f"{self.name} agent at {url} failed: {e}") from e
+                    return response
+
+            if attempt < self.retries:
+                self._sleep_before_retry(attempt)
+
+        self.breaker.record_failure()
+        raise AgentInteractionError(f"{self.name} agent at {url} failed after {self.retries + 1} attempts: {last_error}") from last_error
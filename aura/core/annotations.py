@@ -0,0 +1,132 @@
+# aura/core/annotations.py
+
+import magic
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.urls import reverse
+
+from . import services
+from .derivatives import responsive_image
+from .imaging import image_width
+from .models import Interaction
+
+
+# --- Vector Overlays ---
+# In "overlay" mode (AURA_ANNOTATION_MODE) an annotation is stored as JSON on
+# AURA's Interaction instead of as a new JPEG:
+#
+#     {"image_interaction": "<USER interaction id>", "width": 1280, "height": 960,
+#      "boxes": [{"label": "valve", "confidence": 0.91, "box": [x1, y1, x2, y2]}]}
+#
+# Box coordinates are in the pixel space of that interaction's agent_image (the
+# image the identifier saw), whose size is recorded so the page can scale them.
+
+def parse_boxes(boxes) -> list:
+    """Validates the boxes passed by the LLM; raises ValueError on a malformed box."""
+    if not isinstance(boxes, list):
+        raise ValueError("'boxes' must be a list of box objects.")
+    parsed = []
+    for b_box in boxes:
+        if not isinstance(b_box, dict) or 'box' not in b_box or 'label' not in b_box:
+            raise ValueError("Each box must be an object with 'label' and 'box' keys.")
+        coords = b_box['box']
+        if not isinstance(coords, (list, tuple)) or len(coords) != 4:
+            raise ValueError("Each 'box' must be [x1, y1, x2, y2].")
+        parsed.append({
+            'label': str(b_box['label']),
+            'confidence': float(b_box.get('confidence') or 0.0),
+            'box': [int(round(float(c))) for c in coords],
+        })
+    return parsed
+
+def build_overlay(image_interaction, boxes: list) -> dict:
+    """The annotation JSON for drawing `boxes` over an interaction's image."""
+    image = image_interaction.agent_image
+    return {
+        'image_interaction': str(image_interaction.id),
+        'width': image.width,
+        'height': image.height,
+        'boxes': parse_boxes(boxes),
+    }
+
+def overlay_payload(interaction) -> dict | None:
+    """What the page needs to draw an AURA interaction's overlay, or None if it has none."""
+    annotation = interaction.aura_annotation
+    if not annotation:
+        return None
+    image_interaction = Interaction.objects.filter(
+        id=annotation['image_interaction'], job_id=interaction.job_id
+    ).first()
+    if image_interaction is None or not image_interaction.agent_image:
+        return None
+    return {
+        'interaction_id': str(interaction.id),
+        'image_url': image_interaction.agent_image.url,
+        'image': responsive_image(image_interaction.agent_image, annotation['width']),
+        'width': annotation['width'],
+        'height': annotation['height'],
+        'boxes': annotation['boxes'],
+        'export_url': reverse('core:annotated_image', args=[interaction.id]),
+    }
+
+
+# --- On-Demand Rasterization ---
+
+def _annotation_source(interaction):
+    """The (image bytes, mime type, boxes) the Annotator Agent needs to rasterize an overlay."""
+    annotation = interaction.aura_annotation
+    image_interaction = Interaction.objects.get(id=annotation['image_interaction'], job_id=interaction.job_id)
+    with image_interaction.agent_image.open('rb') as f:
+        image_bytes = f.read()
+    return image_bytes, magic.from_buffer(image_bytes, mime=True), annotation['boxes']
+
+def _store_rasterized(interaction, jpeg: bytes):
+    interaction.aura_annotated_image.save(
+        f"anno_{interaction.aura_annotation['image_interaction']}.jpg", ContentFile(jpeg), save=False
+    )
+    interaction.aura_annotated_image_width = image_width(jpeg)
+    interaction.save(update_fields=['aura_annotated_image', 'aura_annotated_image_width'])
+
+def rasterize_annotation(interaction):
+    """
+    Renders an overlay into aura_annotated_image with the Annotator Agent, once;
+    later calls (exports, reports) reuse the stored JPEG.
+    Raises Interaction.DoesNotExist if the annotated image is gone.
+    """
+    if interaction.aura_annotated_image:
+        return interaction.aura_annotated_image
+    _store_rasterized(interaction, services.call_annotator_agent_raw(*_annotation_source(interaction)))
+    return interaction.aura_annotated_image
+
+def rasterize_job_annotations(job) -> list:
+    """
+    Renders every overlay of a job that has no JPEG yet, with one Annotator
+    Agent call per AURA_ANNOTATION_BATCH_SIZE overlays, and returns the job's
+    AURA interactions that have an annotated image, oldest first. Overlays
+    whose image is gone or that the agent could not draw are left out.
+    """
+    pending = []
+    overlays = job.interactions.filter(aura_annotation__isnull=False).filter(
+        Q(aura_annotated_image='') | Q(aura_annotated_image__isnull=True)
+    )
+    for interaction in overlays.order_by('seq'):
+        try:
+            pending.append((interaction, _annotation_source(interaction)))
+        except (Interaction.DoesNotExist, FileNotFoundError):
+            print(f"ANNOTATIONS: The image annotated by {interaction.id} is gone; skipping it.")
+
+    batch_size = settings.AURA_ANNOTATION_BATCH_SIZE
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        results = services.call_annotator_agent_batch_raw([source for _, source in batch])
+        for (interaction, _), result in zip(batch, results):
+            if isinstance(result, services.AgentInteractionError):
+                print(f"ANNOTATIONS: Could not rasterize {interaction.id}: {result}")
+                continue
+            _store_rasterized(interaction, result)
+
+    return list(
+        job.interactions.filter(source=Interaction.Source.AURA).exclude(aura_annotated_image='')
+        .exclude(aura_annotated_image__isnull=True).order_by('seq')
+    )
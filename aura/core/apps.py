@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Registers the signal handlers that feed the live log streams and
+        # generate image derivatives.
+        from . import events  # noqa: F401
+        from . import derivatives  # noqa: F401
@@ -0,0 +1,165 @@
+# aura/core/async_services.py
+
+import asyncio
+import concurrent.futures
+import random
+import threading
+from typing import Any, Dict
+
+import httpx
+from django.conf import settings
+
+from .services import AGENT_ENDPOINTS, RAW_AGENT_ENDPOINTS, AgentInteractionError, CircuitOpenError, get_agent_client
+from .agent_client import RETRYABLE_STATUS_CODES
+from .metrics import AGENT_CALL_LATENCY, timed
+
+# --- Shared Event Loop & Client ---
+# Tools and views are synchronous and run on many threads, while an
+# httpx.AsyncClient belongs to a single event loop. So one daemon thread runs
+# a loop for the whole process, owns the shared client (and its keep-alive
+# pool), and sync code submits coroutines to it with `run_sync`.
+
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    global _loop, _client
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                _client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.AGENT_POOL_SIZE * len(AGENT_ENDPOINTS),
+                        max_keepalive_connections=settings.AGENT_POOL_SIZE * len(AGENT_ENDPOINTS),
+                    ),
+                )
+                threading.Thread(target=loop.run_forever, name="aura-async-services", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def run_sync(coro, timeout=None):
+    """
+    Runs a coroutine on the shared loop from synchronous code and returns its
+    result. On timeout the coroutine is cancelled and TimeoutError is raised.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+# --- Agent Calls ---
+
+async def _post(agent: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Async twin of AgentClient.post: same timeouts and retry policy, and the
+    same circuit breaker, so sync and async callers agree on an agent's health.
+    """
+    breaker = get_agent_client(agent).breaker
+    if not breaker.allow_request():
+        raise CircuitOpenError(f"{agent} agent at {url} is unavailable (circuit open); not calling it.")
+
+    try:
+        return await _post_with_retries(breaker, agent, url, **kwargs)
+    except AgentInteractionError:
+        raise
+    except BaseException:
+        # Cancelled by a fan-out deadline, or an unexpected error: the breaker
+        # was not told how the call went, so free a half-open trial.
+        breaker.release_trial()
+        raise
+
+async def _post_with_retries(breaker, agent: str, url: str, **kwargs) -> httpx.Response:
+    timeout = httpx.Timeout(settings.AGENT_READ_TIMEOUTS.get(agent, settings.AGENT_READ_TIMEOUT), connect=settings.AGENT_CONNECT_TIMEOUT)
+    last_error = None
+    for attempt in range(settings.AGENT_RETRIES + 1):
+        try:
+            response = await _client.post(url, timeout=timeout, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            last_error = e
+        except httpx.HTTPError as e:
+            breaker.record_failure()
+            raise AgentInteractionError(f"{agent} agent at {url} failed: {e}") from e
+        else:
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                last_error = AgentInteractionError(f"{response.status_code} Server Error from {url}")
+            else:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.is_error:
+                    raise AgentInteractionError(f"{agent} agent at {url} failed with status {response.status_code}: {response.text}")
+                return response
+
+        if attempt < settings.AGENT_RETRIES:
+            await asyncio.sleep(random.uniform(0, settings.AGENT_RETRY_BACKOFF * (2 ** attempt)))
+
+    breaker.record_failure()
+    raise AgentInteractionError(f"{agent} agent at {url} failed after {settings.AGENT_RETRIES + 1} attempts: {last_error}")
+
+def _json(agent: str, response: httpx.Response) -> Dict[str, Any]:
+    try:
+        return response.json()
+    except ValueError as e:
+        raise AgentInteractionError(f"{agent} agent returned invalid JSON: {e}") from e
+
+async def post_json(agent: str, payload: dict) -> Dict[str, Any]:
+    """POSTs a JSON payload to the agent's endpoint and returns the decoded JSON answer."""
+    return _json(agent, await _post(agent, AGENT_ENDPOINTS[agent], json=payload))
+
+async def post_image(agent: str, image_bytes: bytes, mime_type: str) -> Dict[str, Any]:
+    """POSTs encoded image bytes as the raw body to the agent's raw endpoint."""
+    response = await _post(agent, RAW_AGENT_ENDPOINTS[agent], content=image_bytes, headers={'Content-Type': mime_type})
+    return _json(agent, response)
+
+@timed(AGENT_CALL_LATENCY, call="async_call_identifier_agent")
+async def call_identifier_agent(image_bytes: bytes, mime_type: str) -> Dict[str, Any]:
+    print(f"SUPERVISOR (async): Calling Identifier Agent at {RAW_AGENT_ENDPOINTS['identifier']}...")
+    return await post_image("identifier", image_bytes, mime_type)
+
+@timed(AGENT_CALL_LATENCY, call="async_call_groq_llama_vision_agent")
+async def call_groq_llama_vision_agent(image_bytes: bytes, mime_type: str) -> Dict[str, Any]:
+    print(f"SUPERVISOR (async): Calling Groq Llama Vision Agent at {RAW_AGENT_ENDPOINTS['groq_llama_vision']}...")
+    return await post_image("groq_llama_vision", image_bytes, mime_type)
+
+@timed(AGENT_CALL_LATENCY, call="async_call_procedure_agent")
+async def call_procedure_agent(component_name: str) -> Dict[str, Any]:
+    print(f"SUPERVISOR (async): Calling Procedure Agent for '{component_name}'...")
+    return await post_json("procedure", {'component_name': component_name})
+
+
+# --- Fan-out ---
+
+async def fan_out(calls: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+    """
+    Awaits independent agent calls concurrently under one shared deadline.
+
+    `calls` maps a name to a coroutine. The result maps each name to the call's
+    return value, or to the exception it raised; calls still running when the
+    deadline passes are cancelled and reported as an AgentInteractionError.
+    """
+    tasks = {name: asyncio.ensure_future(coro) for name, coro in calls.items()}
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=deadline)
+
+    results = {}
+    for name, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            results[name] = AgentInteractionError(f"'{name}' did not finish within the {deadline}s deadline.")
+        elif task.exception() is not None:
+            results[name] = task.exception()
+        else:
+            results[name] = task.result()
+    return results
+
+def fan_out_sync(calls: Dict[str, Any], deadline: float = None) -> Dict[str, Any]:
+    """`fan_out` for synchronous callers such as LangChain tools."""
+    deadline = deadline or settings.AGENT_FANOUT_DEADLINE
+    # A little slack so the coroutine can report its own timeouts first.
+    return run_sync(fan_out(calls, deadline), timeout=deadline + 5)
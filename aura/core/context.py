@@ -0,0 +1,35 @@
+# aura/core/context.py
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+
+@dataclass
+class TurnContext:
+    """
+    What the LangChain tools need to know about the turn they run for.
+    Set by the turn executor, so tools never have to guess the job from
+    global state or trust ids produced by the LLM.
+
+    Tools can also leave results for the executor here, such as the annotated
+    image bytes or the annotation overlay, instead of passing them through the
+    LLM as text.
+    """
+    job_id: str
+    interaction_id: str
+    annotated_image: bytes | None = None
+    annotation: dict | None = None
+    active_procedure: dict | None = None
+    # Set when the executor stopped waiting for the tool call this context was
+    # given to; such a call must not commit side effects any more.
+    abandoned: bool = False
+
+
+# The fields tools write results into.
+TOOL_RESULT_FIELDS = ('annotated_image', 'annotation', 'active_procedure')
+
+
+current_turn: ContextVar = ContextVar('current_turn', default=None)
+
+def get_turn_context() -> TurnContext | None:
+    return current_turn.get()
@@ -0,0 +1,101 @@
+# aura/core/conversation.py
+
+from django.conf import settings
+from django.db import transaction
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
+from .models import ConversationState
+
+# Longest excerpt of a single message kept in the rolling summary.
+SUMMARY_LINE_CHARS = 240
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for Llama-style tokenizers)."""
+    return len(text) // 4 + 1
+
+def _summary_line(message: dict) -> str:
+    speaker = "USER" if message["role"] == "human" else "AURA"
+    content = " ".join(message["content"].split())
+    if len(content) > SUMMARY_LINE_CHARS:
+        content = content[:SUMMARY_LINE_CHARS - 3] + "..."
+    return f"{speaker}: {content}"
+
+def enforce_token_budget(state: ConversationState):
+    """
+    Moves the oldest verbatim messages into the summary until the verbatim part
+    fits AURA_HISTORY_TOKEN_BUDGET, then trims the summary's oldest lines down to
+    AURA_HISTORY_SUMMARY_TOKENS. The latest exchange is always kept verbatim.
+    """
+    budget = settings.AURA_HISTORY_TOKEN_BUDGET
+    used = sum(estimate_tokens(m["content"]) for m in state.messages)
+    rolled = []
+    while used > budget and len(state.messages) > 2:
+        message = state.messages.pop(0)
+        used -= estimate_tokens(message["content"])
+        rolled.append(_summary_line(message))
+    if not rolled:
+        return
+
+    lines = (state.summary.splitlines() if state.summary else []) + rolled
+    summary_budget = settings.AURA_HISTORY_SUMMARY_TOKENS
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > summary_budget:
+        lines.pop(0)
+    state.summary = "\n".join(lines)
+
+def load_conversation_state(user_interaction) -> ConversationState:
+    """
+    Returns the job's conversation state, brought up to date with the
+    Interactions committed before `user_interaction`. Only rows past the last
+    synced `seq` are read, so the cost per turn does not grow with the session,
+    and a reply that commits late is picked up by the next turn.
+
+    Turns of one job can run at once, so the state row is locked while it is
+    brought up to date; a concurrent turn waits and then only appends what is
+    still missing. Only the history fields are written, leaving the router's
+    active_procedure alone. A later turn may have synced first; the messages
+    at or after this turn are then left out of the returned (unsaved) copy.
+    """
+    job = user_interaction.job
+    ConversationState.objects.get_or_create(job=job)
+
+    with transaction.atomic():
+        state = ConversationState.objects.select_for_update().get(job=job)
+
+        new_interactions = job.interactions.filter(seq__gt=state.synced_seq, seq__lt=user_interaction.seq)
+        changed = False
+        for inter in new_interactions.order_by('seq'):
+            if inter.user_text_input:
+                state.messages.append({"role": "human", "content": inter.user_text_input, "seq": inter.seq})
+            if inter.aura_text_response:
+                state.messages.append({"role": "ai", "content": inter.aura_text_response, "seq": inter.seq})
+            state.synced_seq = inter.seq
+            changed = True
+
+        if changed:
+            enforce_token_budget(state)
+            state.save(update_fields=['messages', 'summary', 'synced_seq', 'updated_at'])
+
+    if state.synced_seq >= user_interaction.seq:
+        state.messages = [m for m in state.messages if m.get("seq", 0) < user_interaction.seq]
+    return state
+
+def save_active_procedure(state: ConversationState, procedure: dict | None):
+    """Sets and saves the router's active procedure under the same row lock as the history sync."""
+    with transaction.atomic():
+        locked = ConversationState.objects.select_for_update().get(pk=state.pk)
+        locked.active_procedure = procedure
+        locked.save(update_fields=['active_procedure', 'updated_at'])
+    state.active_procedure = procedure
+
+def build_chat_history(state: ConversationState) -> list:
+    """Turns a ConversationState into the `chat_history` messages for the agent prompt."""
+    chat_history = []
+    if state.summary:
+        chat_history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{state.summary}"))
+    for message in state.messages:
+        if message["role"] == "human":
+            chat_history.append(HumanMessage(content=message["content"]))
+        else:
+            chat_history.append(AIMessage(content=message["content"]))
+    return chat_history
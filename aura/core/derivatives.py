@@ -0,0 +1,116 @@
+# aura/core/derivatives.py
+
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .imaging import resized_variants
+from .storage import IMAGE_FIELDS, content_key, content_storage, delete_derivatives, derivative_name
+
+
+# --- Generation ---
+# Resized copies (AURA_IMAGE_DERIVATIVE_WIDTHS) of the images the page shows are
+# written by a small background pool once the Interaction is committed, so
+# neither the upload request nor the turn waits for them.
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = set()
+
+def _reset_after_fork():
+    # A forked turn worker inherits the pool object but not its threads.
+    global _pool
+    _pool = None
+    _pending.clear()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_derivative_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=settings.AURA_IMAGE_DERIVATIVE_WORKERS, thread_name_prefix='aura-derivatives'
+                )
+    return _pool
+
+def generate_derivatives(name: str) -> list:
+    """Writes the missing width derivatives of a stored image; returns the widths written."""
+    missing = [w for w in settings.AURA_IMAGE_DERIVATIVE_WIDTHS if not content_storage.exists(derivative_name(name, w))]
+    if not missing:
+        return []
+    with content_storage.open(name, 'rb') as f:
+        data = f.read()
+    variants = resized_variants(data, missing)
+    for width, jpeg in variants.items():
+        content_storage.save_exact(derivative_name(name, width), ContentFile(jpeg))
+    if not content_storage.exists(name):
+        # release_blob freed the blob while these were written and may already
+        # have deleted its derivatives; do not leave these behind as orphans.
+        delete_derivatives(name)
+        return []
+    return sorted(variants)
+
+def schedule_derivatives(name: str):
+    """Queues `generate_derivatives(name)` unless it is already queued."""
+    with _pool_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+
+    def run():
+        try:
+            widths = generate_derivatives(name)
+            if widths:
+                print(f"DERIVATIVES: Wrote widths {widths} of {name}")
+        except Exception:
+            print(f"DERIVATIVES: Failed for {name}\n{traceback.format_exc()}")
+        finally:
+            with _pool_lock:
+                _pending.discard(name)
+
+    get_derivative_pool().submit(run)
+
+@receiver(post_save, sender='core.Interaction')
+def generate_interaction_derivatives(sender, instance, created, update_fields=None, **kwargs):
+    # Only writes that store an image; turn status updates and the like skip this.
+    if not created and not set(update_fields or ()) & set(IMAGE_FIELDS):
+        return
+    if not settings.AURA_IMAGE_DERIVATIVE_WIDTHS:
+        return
+    # The page shows the image the agents saw and AURA's annotated image.
+    for image in (instance.agent_image, instance.aura_annotated_image):
+        if image and content_key(image.name):
+            transaction.on_commit(lambda name=image.name: schedule_derivatives(name))
+
+
+# --- Responsive URLs ---
+
+def responsive_image(image, width: int = None) -> dict:
+    """
+    The URL of a stored image plus a `srcset` of the derivatives written so far
+    and the URL of the smallest one as `thumbnail_url`. `width` is the image's
+    own width, as stored by the caller; the file itself is never opened, so
+    without it the original is left out of the srcset.
+    """
+    entries = []
+    if content_key(image.name):
+        for derivative_width in sorted(settings.AURA_IMAGE_DERIVATIVE_WIDTHS):
+            name = derivative_name(image.name, derivative_width)
+            if content_storage.exists(name):
+                entries.append((derivative_width, content_storage.url(name)))
+    if entries and width:
+        entries.append((width, image.url))
+    return {
+        'url': image.url,
+        'srcset': ', '.join(f"{url} {w}w" for w, url in entries),
+        'thumbnail_url': entries[0][1] if entries else image.url,
+    }
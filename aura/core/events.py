@@ -0,0 +1,81 @@
+# aura/core/events.py
+
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Job, Interaction
+
+
+class JobEventBroker:
+    """
+    A tiny in-process pub/sub used to wake up live log streams.
+
+    Each subscriber is an asyncio.Queue living on the event loop of the stream
+    that created it. Publishers can be sync code running in any thread (views,
+    tools, management commands), so messages are handed over with
+    `call_soon_threadsafe`. A `None` message simply means "the database changed
+    for this job, re-read it".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._forward = None
+
+    def forward_to(self, queue):
+        """
+        Sends every message published in this process to `queue` as
+        `(job_id, message)` instead, for another process to publish (a turn
+        worker process has no streams of its own, see core.turns).
+        """
+        self._forward = queue
+
+    def subscribe(self, job_id):
+        subscription = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[str(job_id)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, job_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(str(job_id))
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[str(job_id)]
+
+    def publish(self, job_id, message=None):
+        if self._forward is not None:
+            self._forward.put((str(job_id), message))
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(job_id), ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # The stream's loop has already shut down; it will unsubscribe itself.
+                pass
+
+
+job_events = JobEventBroker()
+
+
+# --- Model signal hooks ---
+# Every write path (handle_interaction_api, end_session, the
+# end_session_and_generate_report tool, ...) goes through these models, so
+# hooking the signals covers them all. Publishing waits for the commit so a
+# woken stream never reads the database before the row is visible.
+
+@receiver(post_save, sender=Interaction)
+def interaction_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: job_events.publish(instance.job_id))
+
+@receiver(post_save, sender=Job)
+def job_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: job_events.publish(instance.id))
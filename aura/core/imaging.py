@@ -0,0 +1,99 @@
+# aura/core/imaging.py
+
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# EXIF tag holding the camera orientation; 1 means "already upright".
+EXIF_ORIENTATION = 0x0112
+
+
+def image_width(data: bytes) -> int | None:
+    """The pixel width of an encoded image, read from its header; None if it cannot be parsed."""
+    try:
+        return Image.open(io.BytesIO(data)).width
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+
+def normalize_image(data: bytes, max_side: int = None, quality: int = None) -> bytes | None:
+    """
+    Returns an upright JPEG of `data` whose longest side is at most `max_side`,
+    or None when the image can be used as-is (already an upright JPEG within
+    the cap) or cannot be decoded.
+
+    JPEGs are decoded at reduced resolution with Image.draft(), so a 4000px
+    phone photo is read at 1/2, 1/4 or 1/8 scale by the JPEG decoder itself
+    instead of being fully decoded and then shrunk.
+    """
+    max_side = max_side or settings.AURA_IMAGE_MAX_SIDE
+    quality = quality or settings.AURA_IMAGE_JPEG_QUALITY
+    try:
+        image = Image.open(io.BytesIO(data))
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        if image.format == 'JPEG' and orientation == 1 and max(image.size) <= max_side:
+            return None
+
+        # draft() only ever scales down to a size still >= the requested one.
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+        return output.getvalue()
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        print(f"IMAGING: Could not normalize image: {e}")
+        return None
+
+def resized_variants(data: bytes, widths, quality: int = None) -> dict:
+    """
+    JPEGs of `data` scaled down to each of `widths` (keeping the aspect ratio),
+    as {width: bytes}. Widths at or above the image's own are skipped, since
+    the original already serves them. The image is decoded once, at the
+    reduced resolution the largest width allows.
+    """
+    quality = quality or settings.AURA_IMAGE_JPEG_QUALITY
+    try:
+        image = Image.open(io.BytesIO(data))
+        largest = max(widths, default=0)
+        # Square request: EXIF rotation may turn the height into the width.
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        print(f"IMAGING: Could not decode image for resizing: {e}")
+        return {}
+
+    variants = {}
+    # Largest first, each resized from the previous one, which is cheaper than
+    # going back to the full image every time.
+    for width in sorted(set(widths), reverse=True):
+        if width >= image.width:
+            continue
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        variants[width] = output.getvalue()
+    return variants
+
+def normalized_derivative(uploaded_file) -> ContentFile | None:
+    """
+    Builds the normalized derivative of an uploaded image, ready to assign to
+    Interaction.user_image_normalized, or None if normalization is disabled or
+    the original is already suitable.
+    """
+    if not uploaded_file or not settings.AURA_IMAGE_NORMALIZE:
+        return None
+    data = uploaded_file.read()
+    uploaded_file.seek(0)
+    normalized = normalize_image(data)
+    if normalized is None:
+        return None
+    stem = os.path.splitext(os.path.basename(uploaded_file.name or 'image'))[0]
+    return ContentFile(normalized, name=f"{stem}.jpg")
@@ -1,7 +1,9 @@
+from django.conf import settings
 from langchain_groq import ChatGroq
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate
 from .langchain_tools import all_tools
+from .parallel_executor import ParallelToolExecutor
 import os
 
 # SYSTEM_PROMPT = """
@@ -104,6 +106,7 @@ You are AURA, a helpful and methodical AI operational assistant. Your primary fu
 
 **Available Tools:**
 - `identify_objects_in_latest_image`: Analyzes the most recent image. Takes NO arguments.
+- `analyze_latest_image`: Detects objects AND describes the most recent image in one call; can also fetch procedures for candidate component names at the same time. Prefer it when you need more than one of these.
 - `get_procedure_for_component`: Fetches the procedure for a named component.
 
 **Non-Negotiable Rules of Operation:**
@@ -126,7 +129,15 @@ def create_aura_agent_executor():
     llm = ChatGroq(
         temperature=0.1, 
         groq_api_key=os.environ.get("GROQ_API_KEY"), 
-        model_name="llama3-8b-8192"
+        model_name="llama3-8b-8192",
+        # Tokens reach the callbacks (core.streaming) as they are generated.
+        streaming=True,
+        # Through the LLM gateway when one is configured; turns are interactive.
+        base_url=settings.GROQ_BASE_URL,
+        default_headers={
+            "X-Aura-Priority": "interactive",
+            "X-Aura-Deadline-Ms": str(settings.AURA_LLM_DEADLINE_MS),
+        },
     )
     prompt = ChatPromptTemplate.from_messages([
         ("system", SYSTEM_PROMPT),
@@ -134,6 +145,9 @@ def create_aura_agent_executor():
         ("human", "{input}"),
         ("placeholder", "{agent_scratchpad}"),
     ])
+    if settings.AURA_PARALLEL_TOOLS:
+        # Runs the tool calls of one step concurrently.
+        return ParallelToolExecutor(llm, all_tools, prompt, max_iterations=10)
     agent = create_tool_calling_agent(llm, all_tools, prompt)
     agent_executor = AgentExecutor(
         agent=agent, 
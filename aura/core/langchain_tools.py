@@ -1,11 +1,42 @@
 from langchain_core.tools import tool
 from . import services
-import base64
+from . import async_services
+from typing import List, Optional
+from concurrent.futures import TimeoutError as FanOutTimeout
 import magic
+from django.core.exceptions import ValidationError
 from .models import Interaction, Job  # <-- Import the Job model
+from .context import get_turn_context
+from .annotations import build_overlay
+from .router import procedure_from_result
+from django.conf import settings
 
 
 
+def _latest_image_interaction(turn):
+    """The newest interaction of the current job that carries an image (index lookup)."""
+    return Interaction.objects.filter(job_id=turn.job_id, has_image=True).latest('timestamp')
+
+def _image_interaction(turn, interaction_id=None):
+    """
+    An image interaction of the current job, by id. Without an id, the turn's
+    own interaction if it carries an image, else the latest image of the job.
+    """
+    if interaction_id:
+        return Interaction.objects.get(id=interaction_id, job_id=turn.job_id)
+    own = Interaction.objects.filter(id=turn.interaction_id, job_id=turn.job_id, has_image=True).first()
+    return own or _latest_image_interaction(turn)
+
+def _read_image_bytes(interaction):
+    """
+    Reads the image the agents should see (the normalized derivative when there
+    is one) and detects its MIME type. These bytes are sent to the agents as-is,
+    so this file read is the only copy we make.
+    """
+    with interaction.agent_image.open('rb') as f:
+        image_bytes = f.read()
+    return image_bytes, magic.from_buffer(image_bytes, mime=True)
+
 @tool
 def identify_objects_in_latest_image() -> str:
     """
@@ -13,41 +44,73 @@ def identify_objects_in_latest_image() -> str:
     This tool takes NO arguments. It automatically finds the latest image.
     """
     print(f"--- TOOL: identify_objects_in_latest_image ---")
+    turn = get_turn_context()
+    if turn is None:
+        return "Error: No active session context is available for this tool."
     try:
-        # Find the most recent interaction that has an image file.
-        latest_interaction_with_image = Interaction.objects.filter(
-            user_image_input__isnull=False,
-            user_image_input__gt=''
-        ).latest('timestamp')
-
-        if not latest_interaction_with_image:
-            return "Error: No image has been uploaded in this session yet."
+        # Find the most recent interaction of this session that has an image file.
+        latest_interaction_with_image = _latest_image_interaction(turn)
 
         print(f"Found latest image in interaction: {latest_interaction_with_image.id}")
 
-        with latest_interaction_with_image.user_image_input.open('rb') as f:
-            image_bytes = f.read()
-            mime_type = magic.from_buffer(image_bytes, mime=True)
-            image_base64 = f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+        image_bytes, mime_type = _read_image_bytes(latest_interaction_with_image)
         
         # Call the actual vision agent service
-        return services.call_identifier_agent(image_base64)
+        return services.call_identifier_agent_raw(image_bytes, mime_type)
 
     except Interaction.DoesNotExist:
-        return "Error: Could not find any interactions with an image."
+        return "Error: No image has been uploaded in this session yet."
     except Exception as e:
         return f"An unexpected error occurred in the tool: {str(e)}"
 
+@tool
+def analyze_latest_image(component_names: Optional[List[str]] = None) -> dict:
+    """
+    Call this tool to fully analyze the most recently uploaded image of the current session in one step.
+    It runs object detection and a visual scene description at the same time and, if you pass
+    candidate 'component_names', also fetches their procedures in parallel.
+    """
+    print(f"--- TOOL: analyze_latest_image (components: {component_names}) ---")
+    turn = get_turn_context()
+    if turn is None:
+        return {"error": "No active session context is available for this tool."}
+    try:
+        image_bytes, mime_type = _read_image_bytes(_latest_image_interaction(turn))
+    except Interaction.DoesNotExist:
+        return {"error": "No image has been uploaded in this session yet."}
+
+    calls = {
+        "detected_objects": async_services.call_identifier_agent(image_bytes, mime_type),
+        "description": async_services.call_groq_llama_vision_agent(image_bytes, mime_type),
+    }
+    for name in component_names or []:
+        calls[f"procedure:{name}"] = async_services.call_procedure_agent(name)
+
+    try:
+        results = async_services.fan_out_sync(calls)
+    except FanOutTimeout:
+        return {"error": "The image analysis agents did not answer in time."}
+
+    analysis = {"procedures": {}, "errors": {}}
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            analysis["errors"][name] = str(result)
+        elif name == "detected_objects":
+            analysis["detected_objects"] = result.get("detected_objects", [])
+        elif name == "description":
+            analysis["description"] = result.get("description")
+        else:
+            analysis["procedures"][name.split(":", 1)[1]] = result
+    return analysis
+
 @tool
 def get_current_job_id() -> str:
     """
     Call this tool to get the ID of the current job or session.
     """
-    # This is a placeholder. In a real system, you'd get this from the context.
-    # For now, we'll just get the latest one.
-    latest_job = Job.objects.order_by('-created_at').first()
-    if latest_job:
-        return str(latest_job.id)
+    turn = get_turn_context()
+    if turn:
+        return turn.job_id
     return "No active job found."
 
 @tool
@@ -59,72 +122,80 @@ def get_procedure_for_component(component_name: str) -> dict:
     if not component_name or not isinstance(component_name, str):
         return "Error: This tool was called without a valid 'component_name'. You must provide the name of the component."
     print(f"--- TOOL: get_procedure_for_component for '{component_name}' ---")
-    return services.call_procedure_agent(component_name)
+    result = services.call_procedure_agent(component_name)
+    turn = get_turn_context()
+    if turn is not None:
+        # Lets "next step" and friends be answered by the router (core.router) afterwards.
+        turn.active_procedure = procedure_from_result(component_name, result) or turn.active_procedure
+    return result
 
 @tool
-def annotate_image_with_boxes(interaction_id: str, boxes: list) -> dict:
+def annotate_image_with_boxes(boxes: list, interaction_id: Optional[str] = None) -> dict:
     """
-    Call this tool to draw bounding boxes on an image from a specific interaction.
-    Provide the interaction ID and a list of box objects to draw.
-    Each box object should be a dictionary with 'label' and 'box' keys.
+    Call this tool to draw bounding boxes on the image of the current session.
+    Provide a list of box objects to draw; each box object should be a dictionary with 'label' and 'box' keys.
+    The latest image is used automatically; 'interaction_id' can be left empty.
     """
-    if not interaction_id or not isinstance(interaction_id, str):
-        return "Error: This tool was called without a valid 'interaction_id'. You must provide the ID of the interaction containing the image."
+    turn = get_turn_context()
+    if turn is None:
+        return {"error": "No active session context is available for this tool."}
     print(f"--- TOOL: annotate_image_with_boxes for interaction {interaction_id} ---")
     try:
-        interaction = Interaction.objects.get(id=interaction_id)
+        interaction = _image_interaction(turn, interaction_id)
         if not interaction.user_image_input:
             return {"error": "The specified interaction does not contain an image to annotate."}
 
-        with interaction.user_image_input.open('rb') as f:
-            image_bytes = f.read()
-            image_base64 = f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
-
-        return services.call_annotator_agent(image_base64, boxes)
-    except Interaction.DoesNotExist:
-        return {"error": f"Could not find interaction with ID {interaction_id}."}
+        if settings.AURA_ANNOTATION_MODE == 'overlay':
+            # Only the boxes are stored; the page draws them over the original.
+            turn.annotation = build_overlay(interaction, boxes)
+            return {"status": "The annotation has been attached to your reply.", "boxes_drawn": len(boxes)}
+
+        image_bytes, mime_type = _read_image_bytes(interaction)
+        # The annotated JPEG is handed to the turn executor, which attaches it to
+        # AURA's reply; only a short confirmation goes back into the LLM context.
+        turn.annotated_image = services.call_annotator_agent_raw(image_bytes, mime_type, boxes)
+        return {"status": "The annotated image has been attached to your reply.", "boxes_drawn": len(boxes)}
+    except (Interaction.DoesNotExist, ValidationError):
+        return {"error": f"Could not find an image interaction with ID {interaction_id} in this session."}
+    except ValueError as e:
+        return {"error": str(e)}
 
 @tool
-def describe_image_content(interaction_id: str) -> dict:
+def describe_image_content(interaction_id: Optional[str] = None) -> dict:
     """
-    Call this tool with the ID of the interaction containing the image to be analyzed.
+    Call this tool to get a description of the image of the current session.
     This tool "sees" the image using a Vision Language Model and returns a rich textual description.
+    The latest image is used automatically; 'interaction_id' can be left empty.
     """
-    if not interaction_id or not isinstance(interaction_id, str):
-        return "Error: This tool was called without a valid 'interaction_id'. You must provide the ID of the user's latest interaction."
+    turn = get_turn_context()
+    if turn is None:
+        return {"error": "No active session context is available for this tool."}
     print(f"--- TOOL: describe_image_content for interaction {interaction_id} ---")
     try:
-        interaction = Interaction.objects.get(id=interaction_id)
+        interaction = _image_interaction(turn, interaction_id)
         if not interaction.user_image_input:
             return {"error": "The specified interaction does not contain an image."}
         
-        # Open the image file from Django's storage
-        with interaction.user_image_input.open('rb') as f:
-            image_bytes = f.read()
-
-            # --- DYNAMIC MIME TYPE DETECTION ---
-            # Use python-magic to detect the MIME type from the file's content
-            mime_type = magic.from_buffer(image_bytes, mime=True)
-            print(f"--- TOOL: Detected image MIME type as: {mime_type} ---")
-            
-            # Now, construct the data URL with the CORRECT MIME type
-            base64_encoded_data = base64.b64encode(image_bytes).decode('utf-8')
-            image_base64 = f"data:{mime_type};base64,{base64_encoded_data}"
+        # Read the image file from Django's storage along with its CORRECT MIME type
+        image_bytes, mime_type = _read_image_bytes(interaction)
         
-        # The rest of the function remains the same
-        return services.call_groq_llama_vision_agent(image_base64)
+        return services.call_groq_llama_vision_agent_raw(image_bytes, mime_type)
         
-    except Interaction.DoesNotExist:
-        return {"error": f"Could not find interaction with ID {interaction_id}."}
+    except (Interaction.DoesNotExist, ValidationError):
+        return {"error": f"Could not find an image interaction with ID {interaction_id} in this session."}
     except Exception as e:
         return {"error": f"An unexpected error occurred in the tool: {str(e)}"}
 @tool
-def end_session_and_generate_report(job_id: str, outcome: str) -> str:
+def end_session_and_generate_report(outcome: str, job_id: str = "") -> str:
     """
     Call this tool ONLY when the user indicates the entire task is complete.
     This tool ends the session, generates a final summary report, and closes the job.
     The 'outcome' argument must be either 'success' or 'failure', based on the conversation.
+    The current session is used automatically; 'job_id' can be left empty.
     """
+    turn = get_turn_context()
+    if turn is not None:
+        job_id = turn.job_id
     if not job_id or not isinstance(job_id, str):
         return "Error: This tool was called without a valid 'job_id'. You must provide the ID of the job session."
     print(f"--- TOOL: end_session_and_generate_report for Job {job_id} with outcome: {outcome} ---")
@@ -141,6 +212,10 @@ def end_session_and_generate_report(job_id: str, outcome: str) -> str:
         except services.AgentInteractionError as e:
             final_summary = f"Summary could not be generated due to an agent error: {e}"
 
+        if turn is not None and turn.abandoned:
+            # The executor gave up on this call and told the LLM so; do not close the job behind its back.
+            return "Error: The session was not closed because the report took too long."
+
         job.final_report_text = final_summary
         
         if outcome.lower() == 'success':
@@ -159,6 +234,7 @@ def end_session_and_generate_report(job_id: str, outcome: str) -> str:
         return f"Error: Could not find a job with the ID {job_id}."    
 all_tools = [
     identify_objects_in_latest_image,
+    analyze_latest_image,
     get_procedure_for_component,
     annotate_image_with_boxes,
     describe_image_content,
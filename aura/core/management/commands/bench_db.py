@@ -0,0 +1,96 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from core.models import Job, Interaction
+from core.views import build_log_payload
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class Command(BaseCommand):
+    help = ('Hammers the configured database with concurrent Interaction writes and '
+            'log API reads, to compare the SQLite and PostgreSQL modes (AURA_DB_ENGINE).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Threads creating Interactions.')
+        parser.add_argument('--readers', type=int, default=8, help='Threads polling the incremental log payload.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run.')
+        parser.add_argument('--jobs', type=int, default=4, help='Sessions the load is spread over.')
+
+    def handle(self, *args, **options):
+        engine = connection.settings_dict['ENGINE'].rsplit('.', 1)[-1]
+        self.stdout.write(f"Benchmarking '{engine}' with {options['writers']} writers and "
+                          f"{options['readers']} readers for {options['duration']}s...")
+
+        jobs = [Job.objects.create(title="bench_db") for _ in range(options['jobs'])]
+        stop = threading.Event()
+        results = {'write': [], 'read': []}
+        errors = {'write': [], 'read': []}
+        lock = threading.Lock()
+
+        def writer(index):
+            job = jobs[index % len(jobs)]
+            latencies, failures = [], []
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    Interaction.objects.create(job=job, source=Interaction.Source.USER, user_text_input=f"bench write {index}")
+                    latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    failures.append(str(e))
+            connections.close_all()
+            with lock:
+                results['write'].extend(latencies)
+                errors['write'].extend(failures)
+
+        def reader(index):
+            job = jobs[index % len(jobs)]
+            cursor = None
+            latencies, failures = [], []
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    payload = build_log_payload(job.id, after=cursor)
+                    latencies.append(time.perf_counter() - start)
+                    cursor = payload['cursor']
+                except Exception as e:
+                    failures.append(str(e))
+            connections.close_all()
+            with lock:
+                results['read'].extend(latencies)
+                errors['read'].extend(failures)
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        for kind in ('write', 'read'):
+            samples = results[kind]
+            self.stdout.write(
+                f"{kind:>5}: {len(samples)} ok ({len(samples) / elapsed:.1f}/s), {len(errors[kind])} errors | "
+                f"mean {statistics.fmean(samples) * 1000 if samples else 0:.2f}ms "
+                f"p50 {percentile(samples, 50) * 1000:.2f}ms "
+                f"p95 {percentile(samples, 95) * 1000:.2f}ms "
+                f"p99 {percentile(samples, 99) * 1000:.2f}ms"
+            )
+            if errors[kind]:
+                self.stdout.write(self.style.WARNING(f"       first error: {errors[kind][0]}"))
+
+        Job.objects.filter(id__in=[job.id for job in jobs]).delete()
+        self.stdout.write(self.style.SUCCESS("Benchmark finished; benchmark sessions removed."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.turns import fail_orphaned_turns
+
+
+class Command(BaseCommand):
+    help = ('Fails and answers the turns a previous server process left queued or running. '
+            'Run at startup, before the server accepts requests.')
+
+    def handle(self, *args, **options):
+        count = fail_orphaned_turns()
+        self.stdout.write(self.style.SUCCESS(f"Failed {count} orphaned turn(s)."))
@@ -0,0 +1,61 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.storage import DERIVATIVES_DIR, blob_is_claimed, blob_ref_count, content_key, content_storage, delete_derivatives, release_blob
+
+
+class Command(BaseCommand):
+    help = ('Deletes content-addressed blobs no Interaction references, with their derivatives. '
+            'Run it periodically: blobs released within AURA_BLOB_GRACE_SECONDS of being saved are left to it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be deleted.')
+
+    def handle(self, *args, **options):
+        root = content_storage.location
+        cutoff = time.time() - settings.AURA_BLOB_GRACE_SECONDS
+        blob_keys, derivatives, freed, leftovers = set(), [], 0, 0
+
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if filename.endswith(('.tmp', '.deleting')):
+                    # Left behind by an interrupted save or release.
+                    if os.path.getmtime(path) < cutoff:
+                        leftovers += 1
+                        if not options['dry_run']:
+                            os.remove(path)
+                    continue
+                if name.startswith(f"{DERIVATIVES_DIR}/"):
+                    # Recent ones may belong to a blob saved after the walk passed it.
+                    if os.path.getmtime(path) < cutoff:
+                        derivatives.append(name)
+                    continue
+                key = content_key(name)
+                if not key:
+                    continue
+                blob_keys.add(key)
+                if options['dry_run']:
+                    if not blob_ref_count(name) and not blob_is_claimed(name):
+                        self.stdout.write(f"Would free {name}")
+                        freed += 1
+                elif release_blob(name):
+                    blob_keys.discard(key)
+                    freed += 1
+
+        # Derivatives whose blob is gone (written after it was released).
+        orphans = {name.rsplit('/', 1)[-1].split('_w', 1)[0] for name in derivatives} - blob_keys
+        for key in orphans:
+            if options['dry_run']:
+                self.stdout.write(f"Would delete the derivatives of {key}")
+            else:
+                delete_derivatives(f"{key}.jpg")
+
+        verb = "Would free" if options['dry_run'] else "Freed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {freed} blob(s), the derivatives of {len(orphans)} missing blob(s) and {leftovers} leftover file(s)."
+        ))
@@ -0,0 +1,174 @@
+# aura/core/metrics.py
+
+import functools
+import inspect
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# --- Histograms ---
+# Shared buckets from 5ms up to a minute, wide enough for both SQLite reads
+# and multi-round LLM turns. p50/p95/p99 per stage come from
+# histogram_quantile() over these in Prometheus.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+VIEW_LATENCY = Histogram(
+    'aura_view_latency_seconds', 'Time spent producing a supervisor HTTP response.',
+    ['view', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+AGENT_CALL_LATENCY = Histogram(
+    'aura_agent_call_latency_seconds', 'Latency of core.services agent calls, including retries.',
+    ['call', 'outcome'], buckets=LATENCY_BUCKETS,
+)
+TOOL_LATENCY = Histogram(
+    'aura_tool_latency_seconds', 'Latency of LangChain tool runs.',
+    ['tool', 'outcome'], buckets=LATENCY_BUCKETS,
+)
+LLM_LATENCY = Histogram(
+    'aura_llm_latency_seconds', 'Latency of individual LLM invocations made by the agent executor.',
+    ['model', 'outcome'], buckets=LATENCY_BUCKETS,
+)
+TURN_LATENCY = Histogram(
+    'aura_turn_latency_seconds', 'End-to-end time of an agent turn on the worker pool.',
+    ['outcome'], buckets=LATENCY_BUCKETS,
+)
+# What the technician waits for before AURA's reply starts to appear.
+TURN_FIRST_TOKEN_LATENCY = Histogram(
+    'aura_turn_first_token_seconds', 'Time from the start of an agent turn to its first streamed LLM token.',
+    buckets=LATENCY_BUCKETS,
+)
+
+# Tool calls core.parallel_executor gave up waiting for.
+TOOL_TIMEOUTS = Counter(
+    'aura_tool_timeouts_total', 'Tool calls that outlived their timeout.', ['tool'],
+)
+
+# route="llm" counts turns the fast-path router handed to the agent executor;
+# the router's share is sum(route!="llm") / sum(all).
+ROUTER_TURNS = Counter(
+    'aura_router_turns_total', 'Agent turns by how the intent router handled them.', ['route'],
+)
+
+
+def timed(histogram, **labels):
+    """Decorator observing a function's duration on `histogram`, with outcome="ok" or "error"."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await func(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Times every tool run and LLM call of an agent execution. Pass it in the
+    `callbacks` of the invoke config so it is inherited by all child runs.
+    """
+
+    def __init__(self):
+        self._starts = {}
+
+    def _start(self, run_id, histogram, label_name, label_value):
+        self._starts[run_id] = (time.perf_counter(), histogram, label_name, label_value)
+
+    def _end(self, run_id, outcome):
+        started = self._starts.pop(run_id, None)
+        if started is None:
+            return
+        start, histogram, label_name, label_value = started
+        histogram.labels(outcome=outcome, **{label_name: label_value}).observe(time.perf_counter() - start)
+
+    @staticmethod
+    def _model_name(serialized, kwargs):
+        params = kwargs.get('invocation_params') or {}
+        return params.get('model_name') or params.get('model') or (serialized or {}).get('name', 'unknown')
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, LLM_LATENCY, 'model', self._model_name(serialized, kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, LLM_LATENCY, 'model', self._model_name(serialized, kwargs))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "ok")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "error")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, TOOL_LATENCY, 'tool', (serialized or {}).get('name', 'unknown'))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "error")
+
+
+class MetricsMiddleware:
+    """Observes every request on VIEW_LATENCY, labelled by URL name rather than raw path."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _observe(self, request, response, start):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        VIEW_LATENCY.labels(view=view, method=request.method, status=response.status_code).observe(time.perf_counter() - start)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. With several web or turn worker processes,
+    set PROMETHEUS_MULTIPROC_DIR (startup.sh does) so all of them are aggregated.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
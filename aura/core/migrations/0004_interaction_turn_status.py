@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_procedure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interaction',
+            name='in_reply_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replies', to='core.interaction'),
+        ),
+        migrations.AddField(
+            model_name='interaction',
+            name='turn_status',
+            field=models.CharField(blank=True, choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], max_length=20, null=True),
+        ),
+    ]
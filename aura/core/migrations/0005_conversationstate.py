@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_interaction_turn_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationState',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='conversation_state', serialize=False, to='core.job')),
+                ('messages', models.JSONField(default=list)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('synced_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
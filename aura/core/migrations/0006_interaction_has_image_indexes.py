@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:58
+
+from django.db import migrations, models
+
+
+def backfill_has_image(apps, schema_editor):
+    Interaction = apps.get_model('core', 'Interaction')
+    Interaction.objects.exclude(user_image_input__isnull=True).exclude(user_image_input='').update(has_image=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_conversationstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interaction',
+            name='has_image',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_has_image, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['job', 'timestamp'], name='interaction_job_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['job', 'has_image', 'timestamp'], name='interaction_job_image_ts_idx'),
+        ),
+    ]
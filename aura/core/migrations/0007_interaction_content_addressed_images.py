@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:07
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_interaction_has_image_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='interaction',
+            name='aura_annotated_image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=core.storage.get_content_storage, upload_to=core.models.aura_image_path),
+        ),
+        migrations.AlterField(
+            model_name='interaction',
+            name='user_image_input',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=core.storage.get_content_storage, upload_to=core.models.user_image_path),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:08
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_interaction_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interaction',
+            name='user_image_normalized',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=core.storage.get_content_storage, upload_to=core.models.normalized_image_path),
+        ),
+    ]
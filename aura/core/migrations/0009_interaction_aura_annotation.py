@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_interaction_user_image_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interaction',
+            name='aura_annotation',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
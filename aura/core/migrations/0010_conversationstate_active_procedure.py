@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_interaction_aura_annotation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationstate',
+            name='active_procedure',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
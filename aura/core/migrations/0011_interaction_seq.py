@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:10
+
+from django.db import migrations, models
+
+
+def number_interactions(apps, schema_editor):
+    Job = apps.get_model('core', 'Job')
+    Interaction = apps.get_model('core', 'Interaction')
+    for job in Job.objects.all():
+        seq = 0
+        for interaction in Interaction.objects.filter(job=job).order_by('timestamp', 'id'):
+            seq += 1
+            interaction.seq = seq
+            interaction.save(update_fields=['seq'])
+        job.interaction_seq = seq
+        job.save(update_fields=['interaction_seq'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_conversationstate_active_procedure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='interaction_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='interaction',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(number_interactions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='interaction',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='interaction',
+            constraint=models.UniqueConstraint(fields=('job', 'seq'), name='interaction_job_seq_uniq'),
+        ),
+    ]
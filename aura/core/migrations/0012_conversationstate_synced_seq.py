@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+def backfill_synced_seq(apps, schema_editor):
+    ConversationState = apps.get_model('core', 'ConversationState')
+    Interaction = apps.get_model('core', 'Interaction')
+    for state in ConversationState.objects.exclude(synced_until=None):
+        last = Interaction.objects.filter(job_id=state.job_id, timestamp__lte=state.synced_until).order_by('-seq').first()
+        state.synced_seq = last.seq if last else 0
+        state.save(update_fields=['synced_seq'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_interaction_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationstate',
+            name='synced_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_synced_seq, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='conversationstate',
+            name='synced_until',
+        ),
+    ]
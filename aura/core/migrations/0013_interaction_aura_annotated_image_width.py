@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:20
+
+import io
+
+from django.db import migrations, models
+from PIL import Image, UnidentifiedImageError
+
+
+def record_annotated_image_widths(apps, schema_editor):
+    Interaction = apps.get_model('core', 'Interaction')
+    annotated = Interaction.objects.exclude(aura_annotated_image='').exclude(aura_annotated_image__isnull=True)
+    for interaction in annotated.iterator():
+        try:
+            with interaction.aura_annotated_image.open('rb') as f:
+                interaction.aura_annotated_image_width = Image.open(io.BytesIO(f.read())).width
+        except (UnidentifiedImageError, OSError, ValueError):
+            continue
+        interaction.save(update_fields=['aura_annotated_image_width'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_conversationstate_synced_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interaction',
+            name='aura_annotated_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(record_annotated_image_widths, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,22 @@
 # Aura/core/models.py
 
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+
+from .storage import get_content_storage
+
+# The image fields use content-addressed storage, which keeps only the top-level
+# directory and the extension of these names: files actually land in
+# MEDIA_ROOT/input_images/<sha[:2]>/<sha256><ext> (see core/storage.py).
 
 def user_image_path(instance, filename):
-    # file will be uploaded to MEDIA_ROOT/input_images/<job_id>/<filename>
     return f'input_images/{instance.job.id}/{filename}'
 
+def normalized_image_path(instance, filename):
+    return f'normalized_images/{instance.job.id}/{filename}'
+
 def aura_image_path(instance, filename):
-    # file will be uploaded to MEDIA_ROOT/annotated_images/<job_id>/<filename>
     return f'annotated_images/{instance.job.id}/{filename}'
 
 class Job(models.Model):
@@ -25,6 +33,8 @@ class Job(models.Model):
     title = models.CharField(max_length=255, default="New AURA Session")
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.IN_PROGRESS)
     final_report_text = models.TextField(blank=True, null=True)
+    # Last `Interaction.seq` handed out for this job
+    interaction_seq = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -40,28 +50,101 @@ class Interaction(models.Model):
         USER = 'USER', 'Human Technician'
         AURA = 'AURA', 'Aura Assistant'
 
+    class TurnStatus(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     job = models.ForeignKey(Job, related_name='interactions', on_delete=models.CASCADE)
     source = models.CharField(max_length=20, choices=Source.choices)
     
     # User's Input for this turn
     user_text_input = models.TextField(blank=True, null=True)
-    user_image_input = models.ImageField(upload_to=user_image_path, blank=True, null=True)
+    user_image_input = models.ImageField(upload_to=user_image_path, storage=get_content_storage, blank=True, null=True, db_index=True)
+    # Upright, size-capped JPEG derivative of user_image_input (core.imaging);
+    # empty when the original was already suitable. Agents are sent this one.
+    user_image_normalized = models.ImageField(upload_to=normalized_image_path, storage=get_content_storage, blank=True, null=True, db_index=True)
+    # Denormalized from user_image_input so "latest image of this job" is an index lookup
+    has_image = models.BooleanField(default=False, editable=False)
 
     # Aura's Response for this turn
     aura_text_response = models.TextField(blank=True, null=True)
-    aura_annotated_image = models.ImageField(upload_to=aura_image_path, blank=True, null=True)
+    aura_annotated_image = models.ImageField(upload_to=aura_image_path, storage=get_content_storage, blank=True, null=True, db_index=True)
+    # Pixel width of the image above, recorded when it is written so the log
+    # can build its srcset (core.derivatives) without opening the file.
+    aura_annotated_image_width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    # Boxes drawn over a USER image, as a vector overlay (core.annotations); the
+    # JPEG above is then only rendered on demand, e.g. for exports.
+    aura_annotation = models.JSONField(blank=True, null=True)
     
     # Metadata for the turn
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Position in the job in commit order, unlike `timestamp`, which is taken
+    # before the INSERT and can commit behind a newer row. Cursors over a
+    # job's interactions (the live log, the conversation state) use this.
+    seq = models.PositiveBigIntegerField(editable=False)
     parsed_intent = models.CharField(max_length=100, blank=True, null=True) # e.g., "FETCH_PROCEDURE"
 
+    # Background execution state of a USER turn (its id is the turn id), and
+    # the USER turn an AURA response answers.
+    turn_status = models.CharField(max_length=20, choices=TurnStatus.choices, blank=True, null=True)
+    in_reply_to = models.ForeignKey('self', related_name='replies', on_delete=models.SET_NULL, blank=True, null=True)
+
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['job', 'timestamp'], name='interaction_job_ts_idx'),
+            models.Index(fields=['job', 'has_image', 'timestamp'], name='interaction_job_image_ts_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'seq'], name='interaction_job_seq_uniq'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.has_image = bool(self.user_image_input)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'user_image_input' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'has_image'}
+        if self._state.adding and self.seq is None:
+            # The job row stays locked from taking the number until the row
+            # commits, so a job's interactions commit in `seq` order.
+            with transaction.atomic():
+                Job.objects.filter(id=self.job_id).update(interaction_seq=F('interaction_seq') + 1)
+                self.seq = Job.objects.filter(id=self.job_id).values_list('interaction_seq', flat=True).get()
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
+    @property
+    def agent_image(self):
+        """The image file the agents should see: the normalized derivative if there is one."""
+        return self.user_image_normalized or self.user_image_input
 
     def __str__(self):
         return f"Interaction {self.id} for Job {self.job.id}"
 
+class ConversationState(models.Model):
+    """
+    The agent's incrementally maintained view of a Job's conversation.
+    Recent messages are kept verbatim; older ones are rolled into `summary`
+    so the prompt stays within the configured token budget.
+    """
+    job = models.OneToOneField(Job, primary_key=True, related_name='conversation_state', on_delete=models.CASCADE)
+    # [{"role": "human" | "ai", "content": "...", "seq": <Interaction.seq>}], oldest first
+    messages = models.JSONField(default=list)
+    summary = models.TextField(blank=True, default='')
+    # `Interaction.seq` of the newest Interaction already folded into this state
+    synced_seq = models.PositiveBigIntegerField(default=0)
+    # Procedure being worked through and the current step (core.router):
+    # {"component_name", "procedure_id", "steps", "safety_warnings", "step"}
+    active_procedure = models.JSONField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Conversation state for Job {self.job_id}"
+
 # Aura/core/models.py
 # ... (at the end of the file, after your Job and Interaction models) ...
 
@@ -0,0 +1,146 @@
+# aura/core/parallel_executor.py
+
+import contextvars
+import dataclasses
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.db import close_old_connections
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from .context import TOOL_RESULT_FIELDS, current_turn, get_turn_context
+from .metrics import TOOL_TIMEOUTS
+
+
+# --- Tool Pool ---
+# One bounded pool for the whole process, shared by every turn's tool calls.
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _reset_after_fork():
+    # A forked turn worker inherits the pool object but not its threads.
+    global _pool
+    _pool = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_tool_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=settings.AURA_TOOL_WORKERS, thread_name_prefix='aura-tools')
+    return _pool
+
+def tool_timeout(tool_name: str) -> float:
+    return settings.AURA_TOOL_TIMEOUTS.get(tool_name, settings.AURA_TOOL_TIMEOUT)
+
+
+# --- Executor ---
+
+class ParallelToolExecutor:
+    """
+    The agent loop of a tool-calling LLM that runs the tool calls of one step
+    concurrently. It is invoked like an AgentExecutor and returns the inputs
+    with the final answer under "output".
+
+    When the LLM asks for several tools at once (identify the objects and
+    describe the image, or the procedures of two components), they are
+    submitted together to the tool pool, so the step takes as long as its
+    slowest tool rather than the sum of them. Each call runs in a copy of the
+    turn's context, so tools still see the TurnContext and their callbacks
+    nest under the run. Results go back to the LLM in the order it asked for
+    them.
+
+    A tool that outlives its timeout (AURA_TOOL_TIMEOUTS, AURA_TOOL_TIMEOUT)
+    is reported to the LLM as timed out; its thread is left to finish in the
+    background, since a running call cannot be interrupted, but whatever it
+    leaves in its TurnContext copy is ignored.
+    """
+
+    def __init__(self, llm, tools, prompt, max_iterations=10):
+        self.tools = {tool.name: tool for tool in tools}
+        self.model = prompt | llm.bind_tools(tools)
+        self.max_iterations = max_iterations
+        self.runnable = RunnableLambda(self._run).with_config(run_name="ParallelToolExecutor")
+
+    def invoke(self, inputs, config=None):
+        return self.runnable.invoke(inputs, config)
+
+    def _run(self, inputs, config):
+        scratchpad = []
+        for _ in range(self.max_iterations):
+            message = self.model.invoke({**inputs, "agent_scratchpad": scratchpad}, config)
+            if not message.tool_calls and not message.invalid_tool_calls:
+                return {**inputs, "output": message.content}
+            scratchpad.append(message)
+            scratchpad.extend(self.run_tool_calls(message, config))
+        return {**inputs, "output": "Agent stopped due to iteration limit or time limit."}
+
+    def run_tool_calls(self, message, config):
+        """
+        Runs the tool calls of an AIMessage on the tool pool and returns their
+        ToolMessages in order.
+
+        Each call gets its own copy of the TurnContext. The results of the
+        calls that finish in time are copied back in the LLM's order; a call
+        that timed out is marked abandoned and its results are dropped. Calls
+        the LLM got wrong are answered with the error instead of being run.
+        """
+        turn = get_turn_context()
+        pool = get_tool_pool()
+        submitted = []
+        for call in message.tool_calls:
+            if call["name"] not in self.tools:
+                submitted.append((call, None, None, None))
+                continue
+            call_turn = dataclasses.replace(turn) if turn is not None else None
+            context = contextvars.copy_context()
+            future = pool.submit(context.run, self._run_pooled_call, call_turn, call, config)
+            submitted.append((call, call_turn, future, time.monotonic() + tool_timeout(call["name"])))
+
+        results = []
+        for call, call_turn, future, deadline in submitted:
+            if future is None:
+                results.append(self._error_message(
+                    call, f"{call['name']} is not a valid tool, try one of [{', '.join(self.tools)}]."
+                ))
+                continue
+            try:
+                results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+            except TimeoutError:
+                if call_turn is not None:
+                    call_turn.abandoned = True
+                # Not started yet (the pool is busy) means it never will be.
+                future.cancel()
+                TOOL_TIMEOUTS.labels(tool=call["name"]).inc()
+                print(f"PARALLEL EXECUTOR: Tool {call['name']} timed out after {tool_timeout(call['name']):g}s.")
+                results.append(self._error_message(
+                    call, f"The tool {call['name']} did not answer within {tool_timeout(call['name']):g} seconds."
+                ))
+                continue
+            if call_turn is not None:
+                for field in TOOL_RESULT_FIELDS:
+                    value = getattr(call_turn, field)
+                    if value is not getattr(turn, field):
+                        setattr(turn, field, value)
+        for call in message.invalid_tool_calls:
+            results.append(self._error_message(call, f"Invalid tool call: {call.get('error') or call.get('args')}"))
+        return results
+
+    def _error_message(self, call, text):
+        return ToolMessage(content=text, tool_call_id=call["id"], name=call["name"], status="error")
+
+    def _run_pooled_call(self, call_turn, call, config):
+        if call_turn is not None:
+            current_turn.set(call_turn)
+        try:
+            return self.tools[call["name"]].invoke(call, config)
+        finally:
+            # Tools query the database from this pool thread.
+            close_old_connections()
@@ -0,0 +1,299 @@
+# aura/core/router.py
+
+import re
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .conversation import save_active_procedure
+from .models import ConversationState, Procedure
+from .metrics import ROUTER_TURNS
+
+
+# --- Component Index ---
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+END_OF_NAME = '$'
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+def name_variants(component_name: str) -> set:
+    """Token sequences a name can be spoken as: "PSU-07B" is also "psu 07b"."""
+    tokens = tokenize(component_name)
+    split = [part for token in tokens for part in re.split(r"[-_.]", token)]
+    return {tuple(tokens), tuple(split)} - {()}
+
+
+class ComponentIndex:
+    """
+    A token trie over Procedure.component_name, for recognizing a known
+    component's name however it is spoken or spelled.
+
+    Kept in step with the table: saves and deletes in this process update it
+    through signals, and a cheap (count, latest last_synced) stamp read before
+    each lookup picks up syncs made by other processes, such as the
+    sync_procedures command. Only procedures synced since the last stamp are
+    re-read, so the index is only rebuilt from scratch when rows disappeared.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trie = {}
+        self._names = {}  # procedure_id -> component_name
+        self._stamp = None
+
+    def _insert(self, component_name):
+        for variant in name_variants(component_name):
+            node = self._trie
+            for token in variant:
+                node = node.setdefault(token, {})
+            node[END_OF_NAME] = component_name
+
+    def _remove(self, component_name):
+        for variant in name_variants(component_name):
+            path = [self._trie]
+            for token in variant:
+                node = path[-1].get(token)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                if path[-1].get(END_OF_NAME) == component_name:
+                    del path[-1][END_OF_NAME]
+                # Prune the branches this name no longer needs.
+                for parent, token, node in reversed(list(zip(path, variant, path[1:]))):
+                    if node:
+                        break
+                    del parent[token]
+
+    def put(self, procedure_id, component_name):
+        with self._lock:
+            previous = self._names.get(procedure_id)
+            if previous == component_name:
+                return
+            if previous is not None:
+                self._remove(previous)
+            self._names[procedure_id] = component_name
+            self._insert(component_name)
+
+    def discard(self, procedure_id):
+        with self._lock:
+            previous = self._names.pop(procedure_id, None)
+            if previous is not None:
+                self._remove(previous)
+
+    def _load(self, procedures):
+        for procedure_id, component_name in procedures.values_list('procedure_id', 'component_name'):
+            self.put(procedure_id, component_name)
+
+    def refresh(self):
+        """Applies procedures synced since the last refresh (all of them the first time)."""
+        stamp = Procedure.objects.aggregate(count=Count('pk'), latest=Max('last_synced'))
+        stamp = (stamp['count'], stamp['latest'])
+        if stamp == self._stamp:
+            return
+        if self._stamp is not None and self._stamp[1] is not None:
+            self._load(Procedure.objects.filter(last_synced__gte=self._stamp[1]))
+        if len(self._names) != stamp[0]:
+            # Rows were deleted elsewhere (or this is the first load).
+            with self._lock:
+                self._trie, self._names = {}, {}
+            self._load(Procedure.objects.all())
+        self._stamp = stamp
+
+    def lookup(self, text) -> str | None:
+        """The component whose name is the whole of `text`, or None."""
+        with self._lock:
+            node = self._trie
+            for token in tokenize(text):
+                node = node.get(token)
+                if node is None:
+                    return None
+            return node.get(END_OF_NAME)
+
+
+component_index = ComponentIndex()
+
+@receiver(post_save, sender=Procedure)
+def procedure_saved(sender, instance, **kwargs):
+    component_index.put(instance.procedure_id, instance.component_name)
+
+@receiver(post_delete, sender=Procedure)
+def procedure_deleted(sender, instance, **kwargs):
+    component_index.discard(instance.procedure_id)
+
+
+# --- Command Grammar ---
+# Matched against the lower-cased utterance with punctuation removed. Step
+# navigation and procedure requests must be the whole utterance; anything
+# longer is left to the LLM.
+
+# The request itself; the rest of the utterance must be a known component.
+PROCEDURE_REQUEST = re.compile(
+    r"^(please )?((((can|could) you )?(show|give|get|send|pull up|bring up|find)( me)?|i need|what'?s|what is|what are)"
+    r" (the )?(procedures?|sop|instructions|steps)( for| to (replace|fix|repair|service|install|remove))?"
+    r"|how (do|can|should) i (replace|fix|repair|service|install|remove)) "
+)
+SUBJECT_FILLER = re.compile(r"^(the|a|an|this|that|our) | please$")
+NEXT_STEP = re.compile(r"^((ok|okay|done|alright|got it) )?(next( step)?|continue|what'?s next|go on)$")
+PREVIOUS_STEP = re.compile(r"^(previous( step)?|go back|back|last step)$")
+REPEAT_STEP = re.compile(r"^(repeat( that| the step| step)?|say (that|it) again|again)$")
+GOTO_STEP = re.compile(r"^(go to |show )?step (\d+)$")
+STEP_COMMAND = re.compile("|".join(p.pattern for p in (NEXT_STEP, PREVIOUS_STEP, REPEAT_STEP, GOTO_STEP)))
+END_SESSION = re.compile(
+    r"\b(we'?re done|we are done|all done|i'?m done|(task|job) (is )?(complete|completed|finished|done)"
+    r"|(end|close) (the )?session|wrap (it )?up)\b"
+)
+FAILURE = re.compile(r"\b(fail|failed|failure|unsuccessful|not fixed|didn'?t work|doesn'?t work|couldn'?t|could not|unable)\b")
+SUCCESS = re.compile(r"\b(success|successful|successfully|fixed|resolved|worked|works)\b")
+NEGATION = re.compile(r"\b(not|no|never|nothing|without)\b|n't\b")
+# Words before an outcome word that are searched for a negation.
+NEGATION_WINDOW = 3
+
+def negated(command: str, match) -> bool:
+    before = command[:match.start()].split()[-NEGATION_WINDOW:]
+    return bool(NEGATION.search(" ".join(before)))
+
+def session_outcome(command: str) -> str | None:
+    """
+    'success' or 'failure' when the closing utterance states it plainly. An
+    outcome that is negated ("not successful", "no success") or contradicted
+    ("not fixed" is both) returns None: closing a job cannot be undone, so
+    anything but a clear statement is left to the LLM.
+    """
+    successes = list(SUCCESS.finditer(command))
+    failures = list(FAILURE.finditer(command))
+    if bool(successes) == bool(failures):
+        return None
+    if any(negated(command, match) for match in successes or failures):
+        return None
+    return 'success' if successes else 'failure'
+
+def requested_component(command: str) -> str | None:
+    """The known component a procedure request is for, or None if it is not only that."""
+    match = PROCEDURE_REQUEST.match(command)
+    if not match:
+        return None
+    component_index.refresh()
+    return component_index.lookup(SUBJECT_FILLER.sub("", command[match.end():]))
+
+def navigate_steps(command: str, procedure: dict) -> str | None:
+    """Moves `procedure` for a step command and returns the reply, or None if `command` is not one."""
+    last = len(procedure['steps']) - 1
+    goto = GOTO_STEP.match(command)
+    if NEXT_STEP.match(command):
+        if procedure['step'] >= last:
+            return f"That was the last step of the {procedure['component_name']} procedure."
+        procedure['step'] += 1
+    elif PREVIOUS_STEP.match(command):
+        procedure['step'] = max(procedure['step'] - 1, 0)
+    elif REPEAT_STEP.match(command):
+        pass
+    elif goto and 1 <= int(goto.group(2)) <= last + 1:
+        procedure['step'] = int(goto.group(2)) - 1
+    else:
+        return None
+    return format_step(procedure)
+
+def normalize_command(text: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9'\s-]", " ", (text or "").lower()).split())
+
+def step_text(step) -> str:
+    if isinstance(step, dict):
+        for key in ('instruction', 'text', 'description', 'step'):
+            if step.get(key):
+                return str(step[key])
+    return str(step)
+
+def format_step(procedure: dict) -> str:
+    steps = procedure['steps']
+    index = procedure['step']
+    return f"Step {index + 1} of {len(steps)}: {step_text(steps[index])}"
+
+
+# --- Routing ---
+
+def route_turn(text: str, state, callbacks=None) -> str | None:
+    """
+    Answers a mechanical turn without the LLM: fetching a known component's
+    procedure, moving through the active procedure's steps, or ending the
+    session with an explicit outcome. Returns AURA's reply, or None to hand the
+    turn to the agent executor. The active procedure is kept on `state`
+    (ConversationState) and saved here, under the state row's lock, when it
+    changes.
+    """
+    if not settings.AURA_ROUTER_ENABLED:
+        return None
+    # Imported here: langchain_tools imports this module.
+    from .langchain_tools import end_session_and_generate_report, get_procedure_for_component
+
+    command = normalize_command(text)
+    config = {"callbacks": callbacks or []}
+    route, reply = None, None
+
+    if state.active_procedure and STEP_COMMAND.match(command):
+        with transaction.atomic():
+            # Another turn of the job may have moved through the steps since the state was loaded.
+            locked = ConversationState.objects.select_for_update().get(pk=state.pk)
+            procedure = locked.active_procedure
+            if procedure and procedure.get('steps'):
+                reply = navigate_steps(command, procedure)
+            if reply is not None:
+                route = "step"
+                locked.save(update_fields=['active_procedure', 'updated_at'])
+        state.active_procedure = locked.active_procedure
+
+    if route is None and END_SESSION.search(command):
+        outcome = session_outcome(command)
+        if outcome:
+            route = "end_session"
+            result = end_session_and_generate_report.invoke({"outcome": outcome}, config=config)
+            # The tool reports what happened, including when it could not close the job.
+            reply = str(result)
+            if reply.startswith("SESSION ENDED"):
+                save_active_procedure(state, None)
+
+    component_name = requested_component(command) if route is None else None
+    if component_name:
+        route = "procedure"
+        result = get_procedure_for_component.invoke({"component_name": component_name}, config=config)
+        save_active_procedure(state, procedure_from_result(component_name, result))
+        if state.active_procedure:
+            reply = present_procedure(state.active_procedure)
+        else:
+            message = result.get('message') if isinstance(result, dict) else None
+            reply = message or f"I could not find a procedure for {component_name}."
+
+    ROUTER_TURNS.labels(route=route or "llm").inc()
+    if route is None:
+        return None
+    print(f"ROUTER: Served the turn directly ({route}).")
+    return reply
+
+def procedure_from_result(component_name, result) -> dict | None:
+    """The active procedure to track for a get_procedure_for_component result (None if not found)."""
+    data = result.get('data') if isinstance(result, dict) and result.get('status') == 'success' else None
+    if not data or not data.get('steps'):
+        return None
+    return {
+        'component_name': component_name,
+        'procedure_id': data.get('procedure_id'),
+        'steps': data['steps'],
+        'safety_warnings': data.get('safety_warnings') or [],
+        'step': 0,
+    }
+
+def present_procedure(procedure: dict) -> str:
+    lines = [f"Here is procedure {procedure['procedure_id']} for {procedure['component_name']}."]
+    if procedure['safety_warnings']:
+        lines.append("Safety warnings: " + " ".join(
+            str(warning) if str(warning).endswith('.') else f"{warning}." for warning in procedure['safety_warnings']
+        ))
+    lines.append(format_step(procedure))
+    lines.append('Say "next step" when you are ready.')
+    return "\n".join(lines)
@@ -1,8 +1,12 @@
 # aura/core/services.py
-import requests
-import base64
-from typing import List, Dict, Any
 import json
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import List, Dict, Any
+
+from .agent_client import AgentClient, AgentInteractionError, CircuitOpenError
+from .metrics import AGENT_CALL_LATENCY, timed
 
 # AGENT_ENDPOINTS now points to the services that will be running on the host machine,
 # launched by the Coral Server. The supervisor container will access them via the
@@ -16,10 +20,33 @@ AGENT_ENDPOINTS = {
     "groq_llama_vision": "http://host.docker.internal:8006/identify",
 }
 
-class AgentInteractionError(Exception):
-    """Custom exception for agent communication failures."""
-    pass
+# Raw-bytes twins of the image endpoints. The image travels as the request body
+# (or a multipart file part) instead of a base64 data URL inside JSON, which is
+# a third smaller and skips an encode/decode copy on each side.
+RAW_AGENT_ENDPOINTS = {
+    "identifier": "http://host.docker.internal:8001/identify_raw",
+    "annotator": "http://host.docker.internal:8005/annotate_raw",
+    "annotator_batch": "http://host.docker.internal:8005/annotate_batch_raw",
+    "groq_llama_vision": "http://host.docker.internal:8006/identify_raw",
+}
+
+# --- Shared Agent Clients ---
+# One keep-alive client (connection pool, timeouts, retries, circuit breaker)
+# per agent, shared by every thread of this process.
+
+_agent_clients = {}
+_agent_clients_lock = threading.Lock()
 
+def get_agent_client(agent: str) -> AgentClient:
+    client = _agent_clients.get(agent)
+    if client is None:
+        with _agent_clients_lock:
+            client = _agent_clients.get(agent)
+            if client is None:
+                client = _agent_clients[agent] = AgentClient(agent, AGENT_ENDPOINTS[agent])
+    return client
+
+@timed(AGENT_CALL_LATENCY, call="call_identifier_agent")
 def call_identifier_agent(image_base64: str) -> Dict[str, Any]:
     """
     Calls the upgraded Identifier Agent.
@@ -31,18 +58,30 @@ def call_identifier_agent(image_base64: str) -> Dict[str, Any]:
         Dict[str, Any]: The JSON response from the agent, containing detected objects.
     """
     try:
-        url = AGENT_ENDPOINTS["identifier"]
-        print(f"SUPERVISOR: Calling Identifier Agent with image data at {url}...")
+        client = get_agent_client("identifier")
+        print(f"SUPERVISOR: Calling Identifier Agent with image data at {client.url}...")
         
         # The agent now expects a JSON payload with the base64 string.
         payload = {'image_base64': image_base64}
         
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
+        response = client.post(json=payload)
         return response.json()
-    except requests.RequestException as e:
-        raise AgentInteractionError(f"Identifier Agent at {url} failed: {e}")
+    except ValueError as e:
+        raise AgentInteractionError(f"Identifier Agent returned invalid JSON: {e}")
     
+@timed(AGENT_CALL_LATENCY, call="call_identifier_agent_raw")
+def call_identifier_agent_raw(image_bytes: bytes, mime_type: str) -> Dict[str, Any]:
+    """Calls the Identifier Agent with the encoded image as the raw request body."""
+    try:
+        client = get_agent_client("identifier")
+        url = RAW_AGENT_ENDPOINTS["identifier"]
+        print(f"SUPERVISOR: Calling Identifier Agent with {len(image_bytes)} image bytes at {url}...")
+        response = client.post(url=url, data=image_bytes, headers={'Content-Type': mime_type})
+        return response.json()
+    except ValueError as e:
+        raise AgentInteractionError(f"Identifier Agent returned invalid JSON: {e}")
+
+@timed(AGENT_CALL_LATENCY, call="call_groq_llama_vision_agent")
 def call_groq_llama_vision_agent(image_base64: str) -> Dict[str, Any]:
     """
     Calls the upgraded Identifier Agent.
@@ -54,64 +93,123 @@ def call_groq_llama_vision_agent(image_base64: str) -> Dict[str, Any]:
         Dict[str, Any]: The JSON response from the agent, containing detected objects.
     """
     try:
-        url = AGENT_ENDPOINTS["groq_llama_vision"]
-        print(f"SUPERVISOR: Calling Groq Llama Vision Agent with image data at {url}...")
+        client = get_agent_client("groq_llama_vision")
+        print(f"SUPERVISOR: Calling Groq Llama Vision Agent with image data at {client.url}...")
 
         # The agent now expects a JSON payload with the base64 string.
         payload = {'image_base64': image_base64}
         
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
+        response = client.post(json=payload)
         return response.json()
-    except requests.RequestException as e:
-        raise AgentInteractionError(f"Identifier Agent at {url} failed: {e}")
+    except ValueError as e:
+        raise AgentInteractionError(f"Groq Llama Vision Agent returned invalid JSON: {e}")
 
+@timed(AGENT_CALL_LATENCY, call="call_groq_llama_vision_agent_raw")
+def call_groq_llama_vision_agent_raw(image_bytes: bytes, mime_type: str) -> Dict[str, Any]:
+    """Calls the Groq Llama Vision Agent with the encoded image as the raw request body."""
+    try:
+        client = get_agent_client("groq_llama_vision")
+        url = RAW_AGENT_ENDPOINTS["groq_llama_vision"]
+        print(f"SUPERVISOR: Calling Groq Llama Vision Agent with {len(image_bytes)} image bytes at {url}...")
+        response = client.post(url=url, data=image_bytes, headers={'Content-Type': mime_type})
+        return response.json()
+    except ValueError as e:
+        raise AgentInteractionError(f"Groq Llama Vision Agent returned invalid JSON: {e}")
+
+@timed(AGENT_CALL_LATENCY, call="call_procedure_agent")
 def call_procedure_agent(component_name: str):
     """Calls the Procedure Agent via its Docker service name."""
     try:
-        url = AGENT_ENDPOINTS["procedure"]
-        print(f"SUPERVISOR: Calling Procedure Agent inside Docker at {url}...")
-        response = requests.post(url, json={'component_name': component_name})
-        response.raise_for_status()
+        client = get_agent_client("procedure")
+        print(f"SUPERVISOR: Calling Procedure Agent inside Docker at {client.url}...")
+        response = client.post(json={'component_name': component_name})
         return response.json()
-    except requests.RequestException as e:
-        raise AgentInteractionError(f"Procedure Agent at {url} failed: {e}")
+    except ValueError as e:
+        raise AgentInteractionError(f"Procedure Agent returned invalid JSON: {e}")
 
+@timed(AGENT_CALL_LATENCY, call="call_summarizer_agent")
 def call_summarizer_agent(job_log_text: str):
     """Calls the Summarizer Agent via its Docker service name."""
     try:
-        url = AGENT_ENDPOINTS["summarizer"]
-        print(f"SUPERVISOR: Calling Summarizer Agent inside Docker at {url}...")
-        response = requests.post(url, json={'log_text': job_log_text})
-        response.raise_for_status()
+        client = get_agent_client("summarizer")
+        print(f"SUPERVISOR: Calling Summarizer Agent inside Docker at {client.url}...")
+        response = client.post(json={'log_text': job_log_text})
         return response.json()
-    except requests.RequestException as e:
-        raise AgentInteractionError(f"Summarizer Agent at {url} failed: {e}")
+    except ValueError as e:
+        raise AgentInteractionError(f"Summarizer Agent returned invalid JSON: {e}")
 
 # New function to call the command agent
+@timed(AGENT_CALL_LATENCY, call="call_command_agent")
 def call_command_agent(history: list, new_text: str, has_image: bool):
     """Calls the Command Agent to parse user intent with Groq/Llama."""
-    try:
-        url = AGENT_ENDPOINTS["command"]
-        print(f"SUPERVISOR: Calling Command Agent at {url}...")
-        payload = {
-            "history": history,
-            "new_text": new_text,
-            "has_image": has_image,
-        }
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        # Get the raw text from the response body.
-        return response.text
-    except json.JSONDecodeError as e:
-        raise AgentInteractionError(f"Command Agent returned invalid JSON: {response.text}")
+    client = get_agent_client("command")
+    print(f"SUPERVISOR: Calling Command Agent at {client.url}...")
+    payload = {
+        "history": history,
+        "new_text": new_text,
+        "has_image": has_image,
+    }
+    response = client.post(json=payload)
+    # Get the raw text from the response body.
+    return response.text
+
+
+@timed(AGENT_CALL_LATENCY, call="call_annotator_agent")
 def call_annotator_agent(image_base64: str, boxes: list):
     try:
-        url = AGENT_ENDPOINTS["annotator"]
-        print(f"SUPERVISOR: Calling Annotator Agent at {url}...")
+        client = get_agent_client("annotator")
+        print(f"SUPERVISOR: Calling Annotator Agent at {client.url}...")
         payload = {"image_base64": image_base64, "boxes": boxes}
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
+        response = client.post(json=payload)
         return response.json()
-    except requests.RequestException as e:
-        raise AgentInteractionError(f"Annotator Agent at {url} failed: {e}")
\ No newline at end of file
+    except ValueError as e:
+        raise AgentInteractionError(f"Annotator Agent returned invalid JSON: {e}")
+
+@timed(AGENT_CALL_LATENCY, call="call_annotator_agent_raw")
+def call_annotator_agent_raw(image_bytes: bytes, mime_type: str, boxes: list) -> bytes:
+    """
+    Calls the Annotator Agent with a multipart request (image file part plus
+    JSON boxes) and returns the annotated image as JPEG bytes.
+    """
+    client = get_agent_client("annotator")
+    url = RAW_AGENT_ENDPOINTS["annotator"]
+    print(f"SUPERVISOR: Calling Annotator Agent with {len(image_bytes)} image bytes at {url}...")
+    response = client.post(
+        url=url,
+        files={'image': ('image', image_bytes, mime_type)},
+        data={'boxes': json.dumps(boxes)},
+    )
+    return response.content
+
+@timed(AGENT_CALL_LATENCY, call="call_annotator_agent_batch_raw")
+def call_annotator_agent_batch_raw(images: list) -> list:
+    """
+    Annotates many images in one multipart call to the Annotator Agent.
+    `images` is a list of (image_bytes, mime_type, boxes). Returns, in the same
+    order, the annotated JPEG bytes of each image, or an AgentInteractionError
+    for an image the agent could not annotate.
+    """
+    client = get_agent_client("annotator")
+    url = RAW_AGENT_ENDPOINTS["annotator_batch"]
+    print(f"SUPERVISOR: Calling Annotator Agent with a batch of {len(images)} images at {url}...")
+    response = client.post(
+        url=url,
+        files=[('images', ('image', image_bytes, mime_type)) for image_bytes, mime_type, _ in images],
+        data={'boxes': json.dumps([boxes for _, _, boxes in images])},
+    )
+
+    # One multipart/mixed part per image, in request order.
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {response.headers.get('Content-Type', '')}\r\n\r\n".encode() + response.content
+    )
+    parts = list(message.iter_parts()) if message.is_multipart() else []
+    if len(parts) != len(images):
+        raise AgentInteractionError(f"Annotator Agent returned {len(parts)} images for a batch of {len(images)}.")
+    results = []
+    for part in parts:
+        content = part.get_payload(decode=True)
+        if part.get_content_type() == 'image/jpeg':
+            results.append(content)
+        else:
+            results.append(AgentInteractionError(f"Annotator Agent could not annotate an image: {content.decode(errors='replace')}"))
+    return results
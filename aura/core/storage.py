@@ -0,0 +1,158 @@
+# aura/core/storage.py
+
+import hashlib
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+
+# --- Content-Addressed Storage ---
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the SHA-256 of its content:
+
+        <top-level dir of the requested name>/<sha[:2]>/<sha><ext>
+
+    so `input_images/<job>/frame.jpg` becomes `input_images/3f/3fa9...c1.jpg`.
+    Saving bytes that are already stored writes nothing and returns the
+    existing name, which is what deduplicates the frame the UI re-sends on
+    consecutive turns. The name doubles as a stable cache key for the image
+    (see `content_key`).
+
+    Blobs are shared between Interactions, so they are only deleted when the
+    last row referencing them goes away (see `release_blob`).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        prefix = name.replace('\\', '/').split('/', 1)[0] if '/' in name else 'blobs'
+        ext = os.path.splitext(name)[1].lower()
+        return self.save_exact(f"{prefix}/{digest[:2]}/{digest}{ext}", content, max_length=max_length)
+
+    def save_exact(self, name, content, max_length=None):
+        """Stores `content` under exactly `name`, unless that file already exists."""
+        try:
+            # Existence check and claim in one step: the fresh mtime tells
+            # release_blob that a new reference to this blob may be on its way.
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        # Write to a private temporary name and rename it into place, so a
+        # concurrent save of the same bytes never exposes a half-written blob.
+        temp_name = super().save(f"{name}.{uuid.uuid4().hex}.tmp", content, max_length=max_length)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+def get_content_storage():
+    """Storage callable for the image fields, so migrations do not serialize the instance."""
+    return content_storage
+
+content_storage = ContentAddressedStorage()
+
+def content_key(name: str) -> str:
+    """The SHA-256 of a content-addressed file, taken from its name (empty for legacy paths)."""
+    stem = os.path.splitext(os.path.basename(name or ''))[0]
+    return stem if len(stem) == 64 else ''
+
+
+# --- Derivatives ---
+# Resized copies of a blob (core.derivatives) are named after its hash, so they
+# are as immutable as the blob itself and need no database columns.
+
+DERIVATIVES_DIR = 'derivatives'
+
+def derivative_name(name: str, width: int) -> str:
+    key = content_key(name)
+    return f"{DERIVATIVES_DIR}/{key[:2]}/{key}_w{width}.jpg"
+
+def is_immutable(name: str) -> bool:
+    """Whether a media path is content-addressed, i.e. its bytes can never change."""
+    stem = os.path.splitext(os.path.basename(name or ''))[0]
+    return len(stem.split('_w', 1)[0]) == 64
+
+def delete_derivatives(name: str):
+    key = content_key(name)
+    if not key:
+        return
+    directory = f"{DERIVATIVES_DIR}/{key[:2]}"
+    if not content_storage.exists(directory):
+        return
+    for filename in content_storage.listdir(directory)[1]:
+        if filename.startswith(f"{key}_w"):
+            content_storage.delete(f"{directory}/{filename}")
+
+
+# --- Reference Counting ---
+# A blob's references are the Interaction image fields that hold its name;
+# every one of them is indexed, so counting them is cheap.
+
+IMAGE_FIELDS = ('user_image_input', 'user_image_normalized', 'aura_annotated_image')
+
+def blob_ref_count(name: str) -> int:
+    from .models import Interaction
+    refs = Q()
+    for field in IMAGE_FIELDS:
+        refs |= Q(**{field: name})
+    return Interaction.objects.filter(refs).count()
+
+def blob_is_claimed(name: str) -> bool:
+    """Whether a blob was saved or re-saved within AURA_BLOB_GRACE_SECONDS (see save_exact)."""
+    try:
+        age = time.time() - os.path.getmtime(content_storage.path(name))
+    except FileNotFoundError:
+        return False
+    return age < settings.AURA_BLOB_GRACE_SECONDS
+
+def release_blob(name: str) -> bool:
+    """
+    Deletes a stored file (and its derivatives) once no Interaction references
+    it any more. Returns whether it was deleted.
+
+    An upload of the same bytes may have found the blob in save_exact and not
+    yet inserted its row, so a recently claimed blob is kept (the gc_blobs
+    command frees it later if it stays unreferenced). The blob is first moved
+    aside and checked again, so a save racing with the delete either claims
+    it before the move, and it is put back, or finds it gone and writes it anew.
+    """
+    if not name or blob_ref_count(name) or blob_is_claimed(name):
+        return False
+    path = content_storage.path(name)
+    doomed = f"{path}.{uuid.uuid4().hex}.deleting"
+    try:
+        os.rename(path, doomed)
+    except FileNotFoundError:
+        return False
+    if blob_ref_count(name) or time.time() - os.path.getmtime(doomed) < settings.AURA_BLOB_GRACE_SECONDS:
+        if not os.path.exists(path):
+            os.replace(doomed, path)
+        else:
+            os.remove(doomed)
+        return False
+    os.remove(doomed)
+    delete_derivatives(name)
+    print(f"STORAGE: Freed unreferenced blob {name}")
+    return True
+
+@receiver(post_delete, sender='core.Interaction')
+def release_interaction_images(sender, instance, **kwargs):
+    # Deleting a Job cascades here for each of its Interactions. Only release
+    # after commit, so a rolled-back delete never loses files.
+    for field in IMAGE_FIELDS:
+        name = getattr(instance, field).name
+        if name:
+            transaction.on_commit(lambda name=name: release_blob(name))
@@ -0,0 +1,67 @@
+# aura/core/streaming.py
+
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .events import job_events
+from .metrics import TURN_FIRST_TOKEN_LATENCY
+
+
+class TurnStreamCallbackHandler(BaseCallbackHandler):
+    """
+    Publishes a running turn's progress on the job's event broker, for the live
+    log stream to forward to the browser as it happens:
+
+        {"type": "tool_start", "turn_id": ..., "tool": "identify_objects_in_latest_image"}
+        {"type": "tool_end", "turn_id": ..., "tool": ..., "ok": true}
+        {"type": "token", "turn_id": ..., "text": "I see a"}
+        {"type": "draft_reset", "turn_id": ...}
+
+    Tokens come from every LLM call of the tool loop. When a call ends in tool
+    calls, the text it streamed was not the answer, so `draft_reset` tells the
+    page to drop it. The final Interaction is still saved as usual and replaces
+    the streamed draft.
+
+    With AURA_TURN_EXECUTOR=process, a worker's events are relayed to the web
+    process (core.turns).
+    """
+
+    def __init__(self, job_id, turn_id):
+        self.job_id = str(job_id)
+        self.turn_id = str(turn_id)
+        self._started = time.perf_counter()
+        self._first_token = True
+        self._streamed_runs = set()
+        self._tools = {}
+
+    def _publish(self, event_type, **fields):
+        job_events.publish(self.job_id, {"type": event_type, "turn_id": self.turn_id, **fields})
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if not token:
+            return
+        if self._first_token:
+            self._first_token = False
+            TURN_FIRST_TOKEN_LATENCY.observe(time.perf_counter() - self._started)
+        self._streamed_runs.add(run_id)
+        self._publish("token", text=token)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if run_id not in self._streamed_runs:
+            return
+        self._streamed_runs.discard(run_id)
+        message = getattr(response.generations[0][0], 'message', None) if response.generations else None
+        if getattr(message, 'tool_calls', None):
+            self._publish("draft_reset")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get('name', 'unknown')
+        self._tools[run_id] = name
+        self._publish("tool_start", tool=name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._publish("tool_end", tool=self._tools.pop(run_id, 'unknown'), ok=True)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._publish("tool_end", tool=self._tools.pop(run_id, 'unknown'), ok=False)
@@ -1,3 +1,505 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import tool
+
+from . import services, turns
+from .annotations import rasterize_job_annotations
+from .context import TurnContext, current_turn
+from .conversation import load_conversation_state
+from .langchain_tools import annotate_image_with_boxes, describe_image_content
+from .derivatives import generate_derivatives, responsive_image
+from .models import ConversationState, Interaction, Job, Procedure
+from .parallel_executor import ParallelToolExecutor
+from .router import normalize_command, route_turn, session_outcome
+from .storage import DERIVATIVES_DIR, content_storage, derivative_name, release_blob
+from .views import build_log_payload
+
+
+class SessionOutcomeTests(TestCase):
+    """The router may only close a job on a plainly stated outcome."""
+
+    def outcome(self, text):
+        return session_outcome(normalize_command(text))
+
+    def test_plain_outcomes(self):
+        self.assertEqual(self.outcome("We're done, it worked."), 'success')
+        self.assertEqual(self.outcome("All done, the leak is fixed"), 'success')
+        self.assertEqual(self.outcome("We're done, it didn't work."), 'failure')
+        self.assertEqual(self.outcome("Job complete, replacement failed"), 'failure')
+
+    def test_negated_success_is_left_to_the_llm(self):
+        self.assertIsNone(self.outcome("We're done, it was not successful"))
+        self.assertIsNone(self.outcome("We're done, no success"))
+        self.assertIsNone(self.outcome("We're done but the fault is not resolved"))
+        self.assertIsNone(self.outcome("We're done, it never worked"))
+
+    def test_negation_window(self):
+        # A negation within NEGATION_WINDOW words of the outcome counts; one further back does not.
+        self.assertIsNone(self.outcome("We're done, it isn't really fixed"))
+        self.assertEqual(self.outcome("No worries, we're done and the pump works"), 'success')
+
+    def test_contradictory_outcomes_are_left_to_the_llm(self):
+        self.assertIsNone(self.outcome("We're done, not fixed"))
+        self.assertIsNone(self.outcome("We're done, the first try failed but then it worked"))
+
+    def test_no_outcome(self):
+        self.assertIsNone(self.outcome("We're done"))
+
+
+class ConversationSyncTests(TestCase):
+    """Turns of one job run concurrently; each must see exactly what was committed before it."""
+
+    def setUp(self):
+        self.job = Job.objects.create()
+
+    def say(self, text):
+        return Interaction.objects.create(job=self.job, source=Interaction.Source.USER, user_text_input=text)
+
+    def reply(self, turn, text):
+        return Interaction.objects.create(job=self.job, source=Interaction.Source.AURA, aura_text_response=text, in_reply_to=turn)
+
+    def history(self, turn):
+        return [m['content'] for m in load_conversation_state(turn).messages]
+
+    def test_later_turn_synced_first_does_not_leak_into_the_earlier_turn(self):
+        first = self.say("Which valve is this?")
+        second = self.say("And the pump?")
+
+        self.assertEqual(self.history(second), ["Which valve is this?"])
+        self.assertEqual(self.history(first), [])
+
+    def test_reply_committed_late_reaches_the_next_turn(self):
+        first = self.say("Which valve is this?")
+        second = self.say("And the pump?")
+        self.history(second)
+        # The reply to the first turn took its timestamp before the second message but committed after it.
+        late = self.reply(first, "That is V-12.")
+        Interaction.objects.filter(id=late.id).update(timestamp=first.timestamp)
+        self.reply(second, "That is P-3.")
+        third = self.say("Thanks")
+
+        self.assertEqual(self.history(third), ["Which valve is this?", "And the pump?", "That is V-12.", "That is P-3."])
+        self.assertEqual(ConversationState.objects.get(job=self.job).synced_seq, third.seq - 1)
+
+
+class RouteTurnTests(TestCase):
+
+    def setUp(self):
+        self.job = Job.objects.create()
+        self.state = ConversationState.objects.create(job=self.job)
+        token = current_turn.set(TurnContext(job_id=str(self.job.id), interaction_id=''))
+        self.addCleanup(current_turn.reset, token)
+
+    def start_procedure(self):
+        self.state.active_procedure = {
+            'component_name': 'PSU-07B', 'procedure_id': 'SOP-1', 'safety_warnings': [], 'step': 0,
+            'steps': ['Isolate power.', 'Remove the cover.', 'Swap the unit.'],
+        }
+        self.state.save()
+
+    def test_step_navigation(self):
+        self.start_procedure()
+        self.assertEqual(route_turn("Next step", self.state), "Step 2 of 3: Remove the cover.")
+        self.assertEqual(route_turn("ok, next", self.state), "Step 3 of 3: Swap the unit.")
+        self.assertEqual(route_turn("next", self.state), "That was the last step of the PSU-07B procedure.")
+        self.assertEqual(route_turn("go back", self.state), "Step 2 of 3: Remove the cover.")
+        self.assertEqual(route_turn("Repeat that.", self.state), "Step 2 of 3: Remove the cover.")
+        self.assertEqual(route_turn("go to step 1", self.state), "Step 1 of 3: Isolate power.")
+
+        self.state.refresh_from_db()
+        self.assertEqual(self.state.active_procedure['step'], 0)
+
+    def test_out_of_range_step_and_longer_requests_go_to_the_llm(self):
+        self.start_procedure()
+        self.assertIsNone(route_turn("step 9", self.state))
+        self.assertIsNone(route_turn("next step, but first explain why the cover matters", self.state))
+        self.assertIsNone(route_turn("The step 2 screws are stuck", self.state))
+        self.assertIsNone(route_turn("Go back to the cover, is it cracked?", self.state))
+
+    def test_steps_move_from_the_saved_position(self):
+        self.start_procedure()
+        stale = ConversationState.objects.get(pk=self.state.pk)
+        route_turn("next", self.state)
+
+        self.assertEqual(route_turn("next", stale), "Step 3 of 3: Swap the unit.")
+
+    def test_procedure_requests(self):
+        Procedure.objects.create(procedure_id='SOP-1', component_name='PSU-07B', steps=['a'])
+        result = {'status': 'success', 'data': {'procedure_id': 'SOP-1', 'steps': ['Isolate power.']}}
+
+        for text in ("Show me the procedure for PSU-07B", "How do I replace the psu 07b?",
+                     "Could you give me the steps to service the PSU-07B, please"):
+            with mock.patch('core.langchain_tools.services.call_procedure_agent', return_value=result):
+                reply = route_turn(text, self.state)
+            self.assertIn("Step 1 of 1: Isolate power.", reply, text)
+
+    def test_procedure_mentions_are_left_to_the_llm(self):
+        Procedure.objects.create(procedure_id='SOP-1', component_name='PSU-07B', steps=['a'])
+
+        with mock.patch('core.langchain_tools.services.call_procedure_agent') as call_procedure_agent:
+            self.assertIsNone(route_turn("I followed the steps for the PSU-07B but it still leaks", self.state))
+            self.assertIsNone(route_turn("Show me the procedure for PSU-07B, it keeps tripping", self.state))
+        call_procedure_agent.assert_not_called()
+
+    def test_two_components_are_left_to_the_llm(self):
+        Procedure.objects.create(procedure_id='SOP-1', component_name='PSU-07B', steps=['a'])
+        Procedure.objects.create(procedure_id='SOP-2', component_name='Valve V-12', steps=['b'])
+
+        with mock.patch('core.langchain_tools.services.call_procedure_agent') as call_procedure_agent:
+            reply = route_turn("Show me the procedure for PSU-07B and valve V-12", self.state)
+
+        self.assertIsNone(reply)
+        call_procedure_agent.assert_not_called()
+
+    def test_negated_outcome_does_not_close_the_job(self):
+        with mock.patch('core.langchain_tools.services.call_summarizer_agent') as call_summarizer_agent:
+            reply = route_turn("We're done, it was not successful", self.state)
+
+        self.assertIsNone(reply)
+        call_summarizer_agent.assert_not_called()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, Job.Status.IN_PROGRESS)
+
+    def test_plain_outcome_closes_the_job_and_reports_the_tool_result(self):
+        self.start_procedure()
+        with mock.patch('core.langchain_tools.services.call_summarizer_agent', return_value={'summary': 'ok'}):
+            reply = route_turn("We're done, it worked", self.state)
+
+        self.assertTrue(reply.startswith("SESSION ENDED"))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, Job.Status.COMPLETED_SUCCESS)
+        self.state.refresh_from_db()
+        self.assertIsNone(self.state.active_procedure)
+
+
+class LogPayloadTests(TestCase):
+
+    def setUp(self):
+        self.job = Job.objects.create()
+
+    def say(self, text):
+        return Interaction.objects.create(job=self.job, source=Interaction.Source.USER, user_text_input=text)
+
+    def test_only_new_interactions_after_the_cursor(self):
+        self.say("first")
+        cursor = build_log_payload(self.job.id)['cursor']
+        self.say("second")
+
+        payload = build_log_payload(self.job.id, after=cursor)
+        self.assertEqual([entry['message'] for entry in payload['logs']], ["second"])
+        self.assertEqual(build_log_payload(self.job.id, after=payload['cursor'])['logs'], [])
+
+    def test_row_committed_behind_a_newer_one_is_delivered(self):
+        # The reply took its timestamp first but committed after the next message was polled.
+        newer = self.say("next question")
+        cursor = build_log_payload(self.job.id)['cursor']
+        late = Interaction.objects.create(job=self.job, source=Interaction.Source.AURA, aura_text_response="late reply")
+        Interaction.objects.filter(id=late.id).update(timestamp=newer.timestamp - timedelta(seconds=1))
+
+        payload = build_log_payload(self.job.id, after=cursor)
+        self.assertEqual([entry['message'] for entry in payload['logs']], ["late reply"])
+
+
+class LogStreamTests(TestCase):
+
+    def test_wsgi_request_is_refused_so_the_page_polls(self):
+        job = Job.objects.create()
+        response = self.client.get(f"/app/api/job/{job.id}/stream/")
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(AURA_LOG_STREAM=False)
+    def test_disabled_stream_is_refused_so_the_page_polls(self):
+        job = Job.objects.create()
+        response = self.client.get(f"/app/api/job/{job.id}/stream/")
+        self.assertEqual(response.status_code, 501)
+
+
+class InteractionApiTests(TestCase):
+
+    def test_full_queue_answers_the_turn(self):
+        job = Job.objects.create()
+        with mock.patch('core.turns.submit_turn', side_effect=turns.TurnQueueFull("The turn queue is full.")):
+            response = self.client.post(f"/app/api/job/{job.id}/interact/", {'text': 'hello'})
+
+        self.assertEqual(response.status_code, 503)
+        user_interaction = Interaction.objects.get(job=job, source=Interaction.Source.USER)
+        self.assertEqual(user_interaction.turn_status, Interaction.TurnStatus.FAILED)
+        self.assertTrue(Interaction.objects.filter(source=Interaction.Source.AURA, in_reply_to=user_interaction).exists())
+
+
+class OrphanedTurnTests(TestCase):
+
+    def test_unfinished_turns_are_failed_and_answered(self):
+        job = Job.objects.create()
+        statuses = [Interaction.TurnStatus.QUEUED, Interaction.TurnStatus.RUNNING, Interaction.TurnStatus.DONE]
+        for status in statuses:
+            Interaction.objects.create(job=job, source=Interaction.Source.USER, user_text_input=status, turn_status=status)
+
+        self.assertEqual(turns.fail_orphaned_turns(), 2)
+        for turn in Interaction.objects.filter(job=job, source=Interaction.Source.USER):
+            answered = Interaction.objects.filter(source=Interaction.Source.AURA, in_reply_to=turn).exists()
+            if turn.user_text_input == Interaction.TurnStatus.DONE:
+                self.assertEqual(turn.turn_status, Interaction.TurnStatus.DONE)
+                self.assertFalse(answered)
+            else:
+                self.assertEqual(turn.turn_status, Interaction.TurnStatus.FAILED)
+                self.assertTrue(answered)
+
+
+class ImageToolTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.job = Job.objects.create()
+        self.photo = Interaction.objects.create(
+            job=self.job, source=Interaction.Source.USER, user_image_input=ContentFile(b'frame', name='frame.jpg')
+        )
+        question = Interaction.objects.create(job=self.job, source=Interaction.Source.USER, user_text_input='What is this?')
+        token = current_turn.set(TurnContext(job_id=str(self.job.id), interaction_id=str(question.id)))
+        self.addCleanup(current_turn.reset, token)
+
+    def describe(self, **args):
+        with mock.patch('core.langchain_tools._read_image_bytes', return_value=(b'frame', 'image/jpeg')) as read_image, \
+                mock.patch('core.services.call_groq_llama_vision_agent_raw', return_value={'description': 'a pump'}):
+            return describe_image_content.invoke(args), read_image
+
+    def test_without_an_id_the_latest_image_is_used(self):
+        result, read_image = self.describe()
+        self.assertEqual(result, {'description': 'a pump'})
+        self.assertEqual(read_image.call_args.args[0], self.photo)
+
+    def test_malformed_id_is_reported(self):
+        result = annotate_image_with_boxes.invoke({'interaction_id': 'xxx', 'boxes': []})
+        self.assertIn('error', result)
+
+
+class ParallelToolExecutorTests(TestCase):
+
+    class FakeToolCallingModel(GenericFakeChatModel):
+        prompts: list = []
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, *args, **kwargs):
+            self.prompts.append(messages)
+            return super()._generate(messages, *args, **kwargs)
+
+    def test_tool_calls_of_one_step_run_together(self):
+        # Each tool waits for the other, so the step only finishes if both run at once.
+        both_running = threading.Barrier(2, timeout=5)
+
+        @tool
+        def read_gauge(name: str) -> str:
+            """Reads a gauge."""
+            both_running.wait()
+            return f"{name}: 3 bar"
+
+        @tool
+        def read_valve(name: str) -> str:
+            """Reads a valve."""
+            both_running.wait()
+            return f"{name}: open"
+
+        llm = self.FakeToolCallingModel(messages=iter([
+            AIMessage(content="", tool_calls=[
+                {'name': 'read_gauge', 'args': {'name': 'G1'}, 'id': 'call-1'},
+                {'name': 'read_valve', 'args': {'name': 'V1'}, 'id': 'call-2'},
+            ]),
+            AIMessage(content="G1 reads 3 bar and V1 is open."),
+        ]))
+        prompt = ChatPromptTemplate.from_messages([("human", "{input}"), ("placeholder", "{agent_scratchpad}")])
+        executor = ParallelToolExecutor(llm, [read_gauge, read_valve], prompt)
+
+        response = executor.invoke({'input': "Check G1 and V1"})
+
+        self.assertEqual(response['output'], "G1 reads 3 bar and V1 is open.")
+        self.assertEqual(
+            [(m.tool_call_id, m.content) for m in llm.prompts[-1] if isinstance(m, ToolMessage)],
+            [('call-1', "G1: 3 bar"), ('call-2', "V1: open")],
+        )
+
+
+class RasterizeJobAnnotationsTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, AURA_ANNOTATION_BATCH_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.job = Job.objects.create()
+
+    def overlay(self, image_bytes):
+        photo = Interaction.objects.create(
+            job=self.job, source=Interaction.Source.USER, user_image_input=ContentFile(image_bytes, name='frame.jpg')
+        )
+        return Interaction.objects.create(job=self.job, source=Interaction.Source.AURA, aura_annotation={
+            'image_interaction': str(photo.id), 'width': 4, 'height': 4,
+            'boxes': [{'label': 'valve', 'confidence': 0.9, 'box': [0, 0, 2, 2]}],
+        })
+
+    def test_overlays_are_rasterized_in_batches(self):
+        overlays = [self.overlay(f"frame {i}".encode()) for i in range(3)]
+
+        def annotate(images):
+            return [
+                services.AgentInteractionError("Invalid image data.") if image_bytes == b"frame 1" else b"anno " + image_bytes
+                for image_bytes, _, _ in images
+            ]
+
+        with mock.patch('core.services.call_annotator_agent_batch_raw', side_effect=annotate) as call_batch:
+            rasterized = rasterize_job_annotations(self.job)
+
+        self.assertEqual([len(call.args[0]) for call in call_batch.call_args_list], [2, 1])
+        self.assertEqual(rasterized, [overlays[0], overlays[2]])
+        with rasterized[1].aura_annotated_image.open('rb') as f:
+            self.assertEqual(f.read(), b"anno frame 2")
+
+        # Only the one the agent could not draw is sent again.
+        with mock.patch('core.services.call_annotator_agent_batch_raw', return_value=[b"anno"]) as call_batch:
+            rasterize_job_annotations(self.job)
+        self.assertEqual([image_bytes for image_bytes, _, _ in call_batch.call_args.args[0]], [b"frame 1"])
+
+
+class DerivativeTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, AURA_IMAGE_DERIVATIVE_WIDTHS=(160,))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.name = content_storage.save('input_images/frame.jpg', ContentFile(b'frame'))
+
+    def derivatives(self):
+        directory = os.path.join(content_storage.location, DERIVATIVES_DIR)
+        return [filename for _, _, filenames in os.walk(directory) for filename in filenames]
+
+    def test_writes_missing_widths(self):
+        with mock.patch('core.derivatives.resized_variants', return_value={160: b'small'}):
+            self.assertEqual(generate_derivatives(self.name), [160])
+        self.assertEqual(len(self.derivatives()), 1)
+
+    def test_srcset_uses_the_stored_width_without_opening_the_image(self):
+        with mock.patch('core.derivatives.resized_variants', return_value={160: b'small'}):
+            generate_derivatives(self.name)
+        image = Interaction(aura_annotated_image=self.name).aura_annotated_image
+
+        with mock.patch.object(content_storage, 'open', side_effect=AssertionError("opened")):
+            self.assertTrue(responsive_image(image, 640)['srcset'].endswith(f"{image.url} 640w"))
+            self.assertNotIn(image.url, responsive_image(image)['srcset'])
+
+    def test_blob_released_during_generation_leaves_no_derivatives(self):
+        def release_then_resize(data, widths):
+            content_storage.delete(self.name)
+            return {160: b'small'}
+
+        with mock.patch('core.derivatives.resized_variants', side_effect=release_then_resize):
+            self.assertEqual(generate_derivatives(self.name), [])
+        self.assertEqual(self.derivatives(), [])
+
+
+class BlobReleaseTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, AURA_BLOB_GRACE_SECONDS=60)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.job = Job.objects.create()
+        self.name = self.save_blob(b'frame')
+
+    def save_blob(self, data, age=0):
+        name = content_storage.save('input_images/frame.jpg', ContentFile(data))
+        self.age(name, age)
+        return name
+
+    def age(self, name, seconds):
+        then = time.time() - seconds
+        os.utime(content_storage.path(name), (then, then))
+
+    def test_unreferenced_blob_is_freed_with_its_derivatives(self):
+        self.age(self.name, 120)
+        content_storage.save_exact(derivative_name(self.name, 160), ContentFile(b'small'))
+
+        self.assertTrue(release_blob(self.name))
+        self.assertFalse(content_storage.exists(self.name))
+        self.assertFalse(content_storage.exists(derivative_name(self.name, 160)))
+
+    def test_referenced_blob_is_kept(self):
+        self.age(self.name, 120)
+        Interaction.objects.create(job=self.job, source=Interaction.Source.USER, user_image_input=self.name)
+
+        self.assertFalse(release_blob(self.name))
+        self.assertTrue(content_storage.exists(self.name))
+
+    def test_blob_is_kept_during_the_grace_period(self):
+        self.assertFalse(release_blob(self.name))
+        self.assertTrue(content_storage.exists(self.name))
+
+        # Saving the same bytes again claims the blob for another grace period.
+        self.age(self.name, 120)
+        self.assertEqual(self.save_blob(b'frame'), self.name)
+        self.assertFalse(release_blob(self.name))
+        self.assertTrue(content_storage.exists(self.name))
+
+    def test_save_claiming_the_blob_before_it_is_moved_keeps_it(self):
+        self.age(self.name, 120)
+
+        def claimed_after_the_check(name):
+            self.assertEqual(self.save_blob(b'frame'), self.name)
+            return False
+
+        with mock.patch('core.storage.blob_is_claimed', side_effect=claimed_after_the_check):
+            self.assertFalse(release_blob(self.name))
+        with content_storage.open(self.name) as f:
+            self.assertEqual(f.read(), b'frame')
+
+    def test_save_after_the_blob_was_moved_writes_it_anew(self):
+        self.age(self.name, 120)
+
+        def saved_after_the_move(name):
+            # The second count runs after the blob was moved aside.
+            if not os.path.exists(content_storage.path(name)):
+                self.assertEqual(self.save_blob(b'frame'), self.name)
+            return 0
+
+        with mock.patch('core.storage.blob_ref_count', side_effect=saved_after_the_move):
+            release_blob(self.name)
+        with content_storage.open(self.name) as f:
+            self.assertEqual(f.read(), b'frame')
+        leftovers = [f for f in os.listdir(os.path.dirname(content_storage.path(self.name))) if f.endswith('.deleting')]
+        self.assertEqual(leftovers, [])
+
+    def test_gc_blobs_dry_run_only_lists(self):
+        self.age(self.name, 120)
+        kept = self.save_blob(b'other frame', age=120)
+        Interaction.objects.create(job=self.job, source=Interaction.Source.USER, user_image_input=kept)
+
+        out = StringIO()
+        call_command('gc_blobs', '--dry-run', stdout=out)
+        self.assertIn(f"Would free {self.name}", out.getvalue())
+        self.assertNotIn(kept, out.getvalue())
+        self.assertTrue(content_storage.exists(self.name))
+
+        call_command('gc_blobs', stdout=StringIO())
+        self.assertFalse(content_storage.exists(self.name))
+        self.assertTrue(content_storage.exists(kept))
@@ -0,0 +1,209 @@
+# aura/core/turns.py
+
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connections
+
+from .models import Interaction
+from .langchain_agent import create_aura_agent_executor
+from .events import job_events
+from .conversation import load_conversation_state, build_chat_history, save_active_procedure
+from .context import TurnContext, current_turn
+from .metrics import MetricsCallbackHandler, TURN_LATENCY
+from .streaming import TurnStreamCallbackHandler
+from .router import route_turn
+from .imaging import image_width
+
+
+class TurnQueueFull(Exception):
+    """Raised when the turn pool already holds as many turns as it is allowed to."""
+    pass
+
+
+# --- Agent Executor ---
+# Created lazily so that each worker process builds its own instance.
+
+_agent_executor = None
+_agent_executor_lock = threading.Lock()
+
+def get_agent_executor():
+    global _agent_executor
+    if _agent_executor is None:
+        with _agent_executor_lock:
+            if _agent_executor is None:
+                print("--- Initializing AURA LangChain Agent Executor ---")
+                _agent_executor = create_aura_agent_executor()
+                print("--- AURA Agent Executor Initialized ---")
+    return _agent_executor
+
+
+# --- Helper Functions ---
+
+def set_turn_status(interaction, status):
+    interaction.turn_status = status
+    interaction.save(update_fields=['turn_status'])
+
+
+# --- Turn Execution ---
+
+def run_turn(interaction_id):
+    """
+    Runs one agent turn for a persisted USER interaction and stores AURA's reply.
+    This is what the worker pool executes; it never raises.
+    """
+    close_old_connections()
+    user_interaction = None
+    context_token = None
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        user_interaction = Interaction.objects.select_related('job').get(id=interaction_id)
+        job = user_interaction.job
+        set_turn_status(user_interaction, Interaction.TurnStatus.RUNNING)
+        turn = TurnContext(job_id=str(job.id), interaction_id=str(user_interaction.id))
+        context_token = current_turn.set(turn)
+        print(f"--- INTERACTION START for Job {job.id} ---")
+
+        conversation = load_conversation_state(user_interaction)
+        callbacks = [MetricsCallbackHandler(), TurnStreamCallbackHandler(job.id, user_interaction.id)]
+
+        # Mechanical turns are answered without the LLM; the rest fall through.
+        aura_response_text = route_turn(user_interaction.user_text_input, conversation, callbacks)
+        if aura_response_text is None:
+            agent_input = {
+                "input": user_interaction.user_text_input or "",
+                "chat_history": build_chat_history(conversation),
+            }
+
+            print(f"Invoking AURA LangChain Agent Executor...")
+            response = get_agent_executor().invoke(agent_input, config={"callbacks": callbacks})
+            print(f"Agent Executor finished. Full response: {response}")
+
+            aura_response_text = response.get("output", "I'm sorry, I encountered an issue.")
+            if turn.active_procedure:
+                # The agent fetched a procedure; the router tracks its steps from here.
+                save_active_procedure(conversation, turn.active_procedure)
+
+        aura_interaction = Interaction(
+            job=job, source=Interaction.Source.AURA,
+            aura_text_response=aura_response_text, in_reply_to=user_interaction
+        )
+        if turn.annotated_image:
+            # The annotator tool left the JPEG bytes in the turn context.
+            aura_interaction.aura_annotated_image.save(
+                f"anno_{user_interaction.id}.jpg", ContentFile(turn.annotated_image), save=False
+            )
+            aura_interaction.aura_annotated_image_width = image_width(turn.annotated_image)
+        aura_interaction.aura_annotation = turn.annotation
+        aura_interaction.save()
+        set_turn_status(user_interaction, Interaction.TurnStatus.DONE)
+        outcome = "ok"
+
+    except Exception as e:
+        print(f"--- WORKFLOW FAILED (System Error) ---\n{traceback.format_exc()}")
+        if user_interaction is not None:
+            Interaction.objects.create(
+                job=user_interaction.job, source=Interaction.Source.AURA, in_reply_to=user_interaction,
+                aura_text_response=f"A critical system error occurred in the orchestrator: {e}"
+            )
+            set_turn_status(user_interaction, Interaction.TurnStatus.FAILED)
+    finally:
+        TURN_LATENCY.labels(outcome=outcome).observe(time.perf_counter() - started)
+        if context_token is not None:
+            current_turn.reset(context_token)
+        close_old_connections()
+
+
+def fail_orphaned_turns():
+    """
+    Fails the turns left QUEUED or RUNNING by a previous server process (the
+    pool lives in memory, so they will never finish) and answers each of them,
+    as run_turn does on failure. Run once at startup, before serving requests;
+    returns how many turns were failed.
+    """
+    orphans = Interaction.objects.filter(
+        source=Interaction.Source.USER,
+        turn_status__in=[Interaction.TurnStatus.QUEUED, Interaction.TurnStatus.RUNNING],
+    ).select_related('job')
+    count = 0
+    for user_interaction in orphans:
+        Interaction.objects.create(
+            job=user_interaction.job, source=Interaction.Source.AURA, in_reply_to=user_interaction,
+            aura_text_response="AURA was restarted before it could answer this. Please ask again."
+        )
+        set_turn_status(user_interaction, Interaction.TurnStatus.FAILED)
+        count += 1
+    return count
+
+
+# --- Worker Pool ---
+# AURA_TURN_EXECUTOR selects threads (default) or processes. Processes are
+# forked from the web process; each closes the inherited database connections
+# and lazily builds its own agent executor. What they publish on the event
+# broker (saved rows, streamed tokens) is relayed to the web process's broker,
+# where the live log streams are subscribed.
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+
+def _init_worker_process(events):
+    connections.close_all()
+    job_events.forward_to(events)
+
+def _relay_worker_events(events):
+    while True:
+        job_id, message = events.get()
+        job_events.publish(job_id, message)
+
+def get_turn_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = settings.AURA_TURN_WORKERS
+                if settings.AURA_TURN_EXECUTOR == 'process':
+                    context = multiprocessing.get_context('fork')
+                    events = context.SimpleQueue()
+                    threading.Thread(
+                        target=_relay_worker_events, args=(events,), name='aura-turn-events', daemon=True
+                    ).start()
+                    _pool = ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=context,
+                        initializer=_init_worker_process,
+                        initargs=(events,),
+                    )
+                else:
+                    _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='aura-turn')
+                # Turns running plus turns waiting for a worker.
+                _slots = threading.BoundedSemaphore(workers + settings.AURA_TURN_QUEUE_SIZE)
+    return _pool
+
+def submit_turn(interaction):
+    """
+    Queues a USER interaction for execution and returns immediately.
+    Raises TurnQueueFull when the pool is saturated.
+    """
+    pool = get_turn_pool()
+    if not _slots.acquire(blocking=False):
+        raise TurnQueueFull("All AURA workers are busy. Please try again shortly.")
+
+    def turn_finished(future):
+        _slots.release()
+        # Also covers a worker process that died before its writes were relayed.
+        job_events.publish(interaction.job_id)
+
+    try:
+        future = pool.submit(run_turn, interaction.id)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(turn_finished)
+    return future
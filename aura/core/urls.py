@@ -17,11 +17,19 @@ urlpatterns = [
     
     # The log polling API remains the same (it will now poll the Interaction model)
     path('api/job/<uuid:job_id>/log/', views.job_detail_log_api, name='job_detail_log_api'),
+
+    # Push channel for the same log (Server-Sent Events); the page falls back to polling.
+    path('api/job/<uuid:job_id>/stream/', views.job_log_stream, name='job_log_stream'),
     
     # --- ADD THIS NEW ENDPOINT ---
     # This is the main endpoint for all back-and-forth conversation
     path('api/job/<uuid:job_id>/interact/', views.handle_interaction_api, name='handle_interaction_api'),
 
+    # Annotated JPEG of an AURA reply, rendered on demand from its overlay.
+    path('api/interaction/<uuid:interaction_id>/annotated_image/', views.annotated_image, name='annotated_image'),
+    # Every annotated JPEG of a session, rasterized in batches where needed.
+    path('api/job/<uuid:job_id>/annotated_images/', views.job_annotated_images, name='job_annotated_images'),
+
     path('job/<uuid:job_id>/end/<str:outcome>/', views.end_session, name='end_session'),
     path('job/<uuid:job_id>/delete/', views.delete_session, name='delete_session'),
 
@@ -1,25 +1,25 @@
 # Aura/core/views.py
 
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
-from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.conf import settings
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from langchain_core.messages import HumanMessage, AIMessage
 from .models import Job, Interaction
 from . import services
-from .langchain_agent import create_aura_agent_executor
+from . import turns
+from .events import job_events
+from .imaging import normalized_derivative
+from .annotations import overlay_payload, rasterize_annotation, rasterize_job_annotations
+from .derivatives import responsive_image
+from .storage import is_immutable
+from django.views.static import serve
+from asgiref.sync import sync_to_async
+import asyncio
 import json
-import base64
-import traceback
-import os
 from .models import Procedure
 
-# --- Create a single, global instance of our agent executor ---
-print("--- Initializing AURA LangChain Agent Executor ---")
-aura_agent_executor = create_aura_agent_executor()
-print("--- AURA Agent Executor Initialized ---")
-
 # --- Helper Functions ---
 
 def log_interaction(job, source, text=None, image=None, intent=None, annotated_image=None):
@@ -35,18 +35,6 @@ def log_interaction(job, source, text=None, image=None, intent=None, annotated_i
     )
     return interaction
 
-def save_base64_image_to_field(field, base64_str, filename):
-    """Decodes a base64 string and saves it to a Django ImageField."""
-    if not base64_str or "data:image" not in base64_str:
-        return
-    try:
-        format, imgstr = base64_str.split(';base64,') 
-        ext = format.split('/')[-1] 
-        data = ContentFile(base64.b64decode(imgstr), name=f'{filename}.{ext}')
-        field.save(data.name, data, save=True)
-    except Exception as e:
-        print(f"Error saving base64 image: {e}")
-
 
 # --- Main Page Views ---
 
@@ -113,95 +101,255 @@ def delete_session(request, job_id):
 
 # --- API Views ---
 
-@api_view(['GET'])
-def job_detail_log_api(request, job_id):
-    """API endpoint to fetch the conversational log for the live UI."""
-    job = get_object_or_404(Job, id=job_id)
-    interactions = job.interactions.all().order_by('timestamp')
+def serialize_log_entries(interactions):
+    """Flattens Interactions into UI log entries and finds the newest annotated image and overlay."""
     log_entries = []
-    latest_annotated_image_url = None
+    latest_annotated = None
+    latest_overlay = None
 
     for interaction in interactions:
         if interaction.user_text_input:
-            log_entries.append({'source': 'USER', 'message': interaction.user_text_input, 'timestamp': interaction.timestamp.isoformat()})
+            log_entries.append({'source': 'USER', 'message': interaction.user_text_input, 'timestamp': interaction.timestamp.isoformat(), 'turn_id': str(interaction.id)})
         if interaction.aura_text_response:
-            log_entries.append({'source': 'AURA', 'message': interaction.aura_text_response, 'timestamp': interaction.timestamp.isoformat()})
-        if interaction.aura_annotated_image and interaction.aura_annotated_image.url:
-            latest_annotated_image_url = interaction.aura_annotated_image.url
-            
-    return JsonResponse({
-        'status': job.get_status_display(), 
+            log_entries.append({'source': 'AURA', 'message': interaction.aura_text_response, 'timestamp': interaction.timestamp.isoformat(), 'reply_to': str(interaction.in_reply_to_id) if interaction.in_reply_to_id else None})
+        if interaction.aura_annotation:
+            latest_overlay = interaction
+        elif interaction.aura_annotated_image and interaction.aura_annotated_image.url:
+            latest_annotated = interaction
+    return (
+        log_entries,
+        responsive_image(
+            latest_annotated.aura_annotated_image, latest_annotated.aura_annotated_image_width
+        ) if latest_annotated else None,
+        overlay_payload(latest_overlay) if latest_overlay else None,
+    )
+
+def build_log_payload(job_id, after=None):
+    """
+    Builds the log API payload for a job.
+
+    Without a cursor, the full log is returned. With `after` (the `cursor` value
+    of a previous payload), only interactions committed after it are returned,
+    and `status` / `latest_annotated_image(_url)` / `latest_annotation` are only
+    included when they changed.
+    The cursor is the `seq` of the newest interaction, which follows commit
+    order, so a row that commits behind a newer one is still delivered.
+    `turns` always lists the job's turns that are still queued or running.
+    Interactions are read before the job, and every status change is followed
+    by an interaction, so new rows always come with the current status.
+    """
+    interactions = Interaction.objects.filter(job_id=job_id)
+    if after is not None:
+        interactions = interactions.filter(seq__gt=after)
+    interactions = list(interactions.order_by('seq'))
+    pending_turns = Interaction.objects.filter(
+        job_id=job_id, turn_status__in=[Interaction.TurnStatus.QUEUED, Interaction.TurnStatus.RUNNING]
+    ).order_by('seq').values_list('id', 'turn_status')
+    job = get_object_or_404(Job, id=job_id)
+
+    log_entries, latest_annotated_image, latest_annotation = serialize_log_entries(interactions)
+    payload = {
         'logs': log_entries,
-        'latest_annotated_image_url': latest_annotated_image_url
-    })
+        'cursor': interactions[-1].seq if interactions else after,
+        'turns': [{'turn_id': str(turn_id), 'status': status} for turn_id, status in pending_turns],
+    }
+    if after is None or interactions:
+        payload['status'] = job.get_status_display()
+    if after is None or latest_annotated_image:
+        # The full-size URL, plus its resized copies in `latest_annotated_image`.
+        payload['latest_annotated_image_url'] = latest_annotated_image['url'] if latest_annotated_image else None
+        payload['latest_annotated_image'] = latest_annotated_image
+    if after is None or latest_annotation:
+        payload['latest_annotation'] = latest_annotation
+    return payload
+
+def parse_log_cursor(value):
+    """The `seq` in a log cursor, or None if it is not one."""
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor >= 0 else None
+
+@api_view(['GET'])
+def job_detail_log_api(request, job_id):
+    """
+    API endpoint to fetch the conversational log for the live UI.
+    Pass `?after=<cursor>` to only receive what is new since the last poll.
+    """
+    after = request.query_params.get('after')
+    cursor = None
+    if after:
+        cursor = parse_log_cursor(after)
+        if cursor is None:
+            return Response({"error": "Invalid 'after' cursor."}, status=400)
+    return JsonResponse(build_log_payload(job_id, after=cursor))
+
+def coalesce_stream_messages(messages):
+    """
+    Splits broker messages into "re-read the database" (any `None`) and the
+    turn progress events (core.streaming), merging consecutive tokens.
+    """
+    reload = False
+    events = []
+    for message in messages:
+        if message is None:
+            reload = True
+        elif (message['type'] == 'token' and events and events[-1]['type'] == 'token'
+              and events[-1]['turn_id'] == message['turn_id']):
+            events[-1] = {**events[-1], 'text': events[-1]['text'] + message['text']}
+        else:
+            events.append(message)
+    return reload, events
+
+async def job_log_stream(request, job_id):
+    """
+    Server-Sent Events stream of the job log, served over ASGI.
+
+    Emits the same payloads as `job_detail_log_api` (first the full log, then
+    only the deltas) whenever the job or one of its interactions is written.
+    Running turns also send `turn` events (tool progress and reply tokens, see
+    core.streaming) as they happen.
+    An idle stream costs nothing but a wake-up every AURA_LOG_STREAM_HEARTBEAT
+    seconds, which also re-reads the database to catch writes made by other
+    processes. Browsers resume with the `Last-Event-ID` header on reconnect.
+
+    Under WSGI (runserver, gunicorn) the endless stream would be consumed to
+    completion by the handler and the request would just hang, so it answers
+    501 instead, which makes the page's EventSource give up and poll. So does
+    a server running several web workers with AURA_LOG_STREAM off, since
+    events only reach the stream of the worker that made them.
+    """
+    if not settings.AURA_LOG_STREAM:
+        return HttpResponse(
+            "The live log stream is disabled; poll the log API instead.",
+            status=501, content_type='text/plain',
+        )
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(
+            "The live log stream needs an ASGI server; poll the log API instead.",
+            status=501, content_type='text/plain',
+        )
+    if not await Job.objects.filter(id=job_id).aexists():
+        raise Http404("No Job matches the given query.")
+
+    after = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    cursor = parse_log_cursor(after) if after else None
+
+    async def event_stream():
+        nonlocal cursor
+        subscription = job_events.subscribe(job_id)
+        _, queue = subscription
+        last_turns = None
+        reload = True
+        try:
+            while True:
+                if reload:
+                    payload = await sync_to_async(build_log_payload)(job_id, after=cursor)
+                    changed = payload['logs'] or any(
+                        key in payload for key in ('status', 'latest_annotated_image_url', 'latest_annotation')
+                    )
+                    if cursor is None or changed or payload['turns'] != last_turns:
+                        last_turns = payload['turns']
+                        yield f"id: {payload['cursor'] or ''}\ndata: {json.dumps(payload)}\n\n"
+                    cursor = payload['cursor']
+
+                try:
+                    messages = [await asyncio.wait_for(queue.get(), timeout=settings.AURA_LOG_STREAM_HEARTBEAT)]
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    messages = [None]
+                while not queue.empty():
+                    messages.append(queue.get_nowait())
+                # Bursts of writes coalesce into a single re-read; progress
+                # events of running turns are forwarded without touching the database.
+                reload, turn_events = coalesce_stream_messages(messages)
+                for event in turn_events:
+                    yield f"event: turn\ndata: {json.dumps(event)}\n\n"
+        finally:
+            job_events.unsubscribe(job_id, subscription)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @api_view(['POST'])
 def handle_interaction_api(request, job_id):
-    """The main orchestrator view that bridges the UI to the LangChain Agent."""
+    """
+    Persists the technician's turn and hands it to the turn worker pool.
+    Answers 202 with the turn id right away; progress shows up in the log API.
+    """
     job = get_object_or_404(Job, id=job_id)
-    
+
+    user_text = request.data.get('text', '')
+    image_file = request.FILES.get('image')
+
+    user_interaction = Interaction.objects.create(
+        job=job, source=Interaction.Source.USER,
+        user_text_input=user_text, user_image_input=image_file,
+        user_image_normalized=normalized_derivative(image_file),
+        turn_status=Interaction.TurnStatus.QUEUED
+    )
+
     try:
-        user_text = request.data.get('text', '')
-        image_file = request.FILES.get('image')
-        
-        user_interaction = Interaction.objects.create(
-            job=job, source=Interaction.Source.USER, 
-            user_text_input=user_text, user_image_input=image_file
+        turns.submit_turn(user_interaction)
+    except turns.TurnQueueFull as e:
+        # Answered like a failed turn, so the log never shows an unanswered message.
+        Interaction.objects.create(
+            job=job, source=Interaction.Source.AURA, in_reply_to=user_interaction,
+            aura_text_response="I'm handling too many requests right now. Please try again in a moment."
         )
-        print(f"--- INTERACTION START for Job {job_id} ---")
+        user_interaction.turn_status = Interaction.TurnStatus.FAILED
+        user_interaction.save(update_fields=['turn_status'])
+        return Response({"status": "busy", "turn_id": str(user_interaction.id), "message": str(e)}, status=503)
 
-        chat_history = []
-        # Get all interactions EXCEPT the one we just created
-        previous_interactions = job.interactions.exclude(id=user_interaction.id).order_by('timestamp')
+    return Response({"status": "accepted", "turn_id": str(user_interaction.id)}, status=202)
 
-        for inter in previous_interactions:
-            if inter.user_text_input:
-                chat_history.append(HumanMessage(content=inter.user_text_input))
-            if inter.aura_text_response:
-                chat_history.append(AIMessage(content=inter.aura_text_response))
-        
-        final_input_string = user_text
-
-        if user_interaction.user_image_input:
-            # We are now explicitly telling the LLM the ID it MUST use.
-            final_input_string += f"\n\n[SYSTEM CONTEXT: An image has been provided for this turn. To analyze it, you MUST call the `identify_objects_in_image` tool with this exact ID: '{user_interaction.id}']"
-
-        # 3. Prepare the main input for the agent executor
-        agent_input = {
-            "input": user_text, 
-            "chat_history": chat_history,
-            # --- THIS IS THE FIX ---
-            # Pass the interaction_id at the top level of the input.
-            # The agent can now access this value.
-            #"interaction_id": str(user_interaction.id)
-        }
-        # if user_interaction.user_image_input:
-        #     agent_input["input"] += f"\n\n[CONTEXT: An image was provided for this turn. The interaction ID is: {user_interaction.id}]"
+@api_view(['GET'])
+def annotated_image(request, interaction_id):
+    """
+    Redirects to the annotated JPEG of an AURA interaction. Overlay annotations
+    are rasterized by the Annotator Agent on the first request (e.g. an export)
+    and the stored image is reused after that.
+    """
+    interaction = get_object_or_404(Interaction, id=interaction_id, source=Interaction.Source.AURA)
+    if not interaction.aura_annotated_image and not interaction.aura_annotation:
+        raise Http404("This interaction has no annotation.")
+    try:
+        image = rasterize_annotation(interaction)
+    except Interaction.DoesNotExist:
+        raise Http404("The annotated image is no longer available.")
+    except services.AgentInteractionError as e:
+        return Response({"error": f"The annotation could not be rendered: {e}"}, status=502)
+    return redirect(image.url)
 
-        print(f"Invoking AURA LangChain Agent Executor...")
-        response = aura_agent_executor.invoke(agent_input)
-        print(f"Agent Executor finished. Full response: {response}")
-        
-        aura_response_text = response.get("output", "I'm sorry, I encountered an issue.")
-        
-        annotated_image_b64 = None
-        if 'intermediate_steps' in response:
-            for action, observation in response['intermediate_steps']:
-                if action.tool == 'annotate_image_with_boxes' and isinstance(observation, dict):
-                    annotated_image_b64 = observation.get('annotated_image_base64')
-
-        aura_interaction = Interaction(job=job, source=Interaction.Source.AURA, aura_text_response=aura_response_text)
-        if annotated_image_b64:
-            save_base64_image_to_field(aura_interaction.aura_annotated_image, annotated_image_b64, f"anno_{user_interaction.id}")
-        aura_interaction.save()
-        
-        return Response({"status": "ok"})
+@api_view(['GET'])
+def job_annotated_images(request, job_id):
+    """
+    Lists the annotated JPEGs of a whole session, e.g. for its report. Overlays
+    not rasterized yet are rendered first, in batches, by the Annotator Agent.
+    """
+    job = get_object_or_404(Job, id=job_id)
+    try:
+        interactions = rasterize_job_annotations(job)
+    except services.AgentInteractionError as e:
+        return Response({"error": f"The annotations could not be rendered: {e}"}, status=502)
+    return Response({"images": [
+        {'interaction_id': str(interaction.id), 'url': interaction.aura_annotated_image.url}
+        for interaction in interactions
+    ]})
 
-    except Exception as e:
-        error_message = f"A critical system error occurred in the orchestrator: {e}"
-        print(f"--- WORKFLOW FAILED (System Error) ---\n{traceback.format_exc()}")
-        Interaction.objects.create(job=job, source=Interaction.Source.AURA, aura_text_response=error_message)
-        return Response({"status": "error", "message": str(e)}, status=500)
+def serve_media(request, path):
+    """
+    Serves MEDIA_ROOT like django.views.static.serve, but lets browsers cache
+    content-addressed files (uploads, annotations and their derivatives) for
+    good: a given URL always returns the same bytes.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_immutable(path):
+        response['Cache-Control'] = f'public, max-age={settings.AURA_MEDIA_CACHE_MAX_AGE}, immutable'
+    return response
 
 # --- ADD THIS NEW VIEW FUNCTION ---
 @api_view(['GET']) # This view only needs to handle GET requests
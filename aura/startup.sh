@@ -6,7 +6,28 @@
 echo "Applying database migrations..."
 python manage.py migrate
 
-# Start Gunicorn server
-echo "Starting Gunicorn server..."
-gunicorn aura.wsgi:application --bind 0.0.0.0:8000
+# Turns are queued in memory; the ones the previous process left unfinished
+# are failed and answered so the page does not wait for them forever.
+python manage.py fail_orphaned_turns
+
+# Metrics from every web and turn worker process are aggregated through this
+# directory; it must be emptied on each start.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/aura-metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Start the ASGI server. The live log stream (Server-Sent Events) needs an
+# async server; WSGI would pin one worker thread per connected browser.
+# Its events are delivered in-process, so it also needs a single worker
+# (see AURA_LOG_STREAM in settings.py).
+WEB_WORKERS="${AURA_WEB_WORKERS:-1}"
+case "$(echo "${AURA_LOG_STREAM-true}" | tr '[:upper:]' '[:lower:]')" in
+    1|true|yes)
+        if [ "$WEB_WORKERS" -gt 1 ]; then
+            echo "AURA_LOG_STREAM is on, so starting 1 web worker instead of $WEB_WORKERS (set AURA_LOG_STREAM=false to poll instead)."
+            WEB_WORKERS=1
+        fi
+        ;;
+esac
+echo "Starting Uvicorn server..."
+uvicorn aura.asgi:application --host 0.0.0.0 --port 8000 --workers "$WEB_WORKERS"
 